@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Compares two benchmark result files written by run.py:
+
+    $ python benchmarks/compare.py before.json after.json
+
+Benchmarks are compared by their minimum time, which is the least noisy
+statistic for repeated runs. Validation stages are compared by their p50 and
+p95 wall times. The exit status is 1 if anything is slower than --threshold,
+ignoring differences smaller than --min-delta which are usually noise.
+"""
+
+# stdlib
+from __future__ import print_function
+import sys
+import json
+import argparse
+
+
+def _load(fn):
+    with open(fn) as f:
+        return json.load(f)
+
+
+def _change(old, new):
+    """Return the percentage change from `old` to `new`, or None."""
+    if not old or new is None:
+        return None
+
+    return (new - old) / old * 100.0
+
+
+def _row(name, old, new, threshold, min_delta, scale=1.0, unit="s"):
+    """Return a (line, regressed) tuple comparing two values."""
+    change = _change(old, new)
+
+    if change is not None and abs(new - old) < min_delta:
+        change = 0.0
+
+    def fmt(value):
+        if value is None:
+            return "%10s" % "-"
+        return "%9.3f%s" % (value * scale, unit)
+
+    if change is None:
+        mark, pct = "", "%8s" % "-"
+    else:
+        mark = "  SLOWER" if change > threshold else ""
+        mark = "  faster" if change < -threshold else mark
+        pct  = "%+7.1f%%" % change
+
+    line = "%-32s %s %s %s%s" % (name, fmt(old), fmt(new), pct, mark)
+    return line, mark == "  SLOWER"
+
+
+def compare(base, head, threshold=5.0, min_delta=0.0005):
+    """Return a (lines, regressed) tuple comparing the run.py documents
+    `base` and `head`.
+    """
+    lines = [
+        "base: %s (%s)" % (base['meta'].get('commit'), base['meta']['time']),
+        "head: %s (%s)" % (head['meta'].get('commit'), head['meta']['time'])
+    ]
+
+    if base['meta'].get('corpus') != head['meta'].get('corpus'):
+        lines.append("warning: the runs used different corpora")
+
+    lines.append("")
+    lines.append("%-32s %10s %10s %8s" % ("benchmark (min)", "base", "head",
+                                          "change"))
+    regressed = False
+    old_benches = base['benchmarks']
+    new_benches = head['benchmarks']
+
+    for name in sorted(set(old_benches) | set(new_benches)):
+        old = old_benches.get(name, {}).get('min')
+        new = new_benches.get(name, {}).get('min')
+        line, slower = _row(name, old, new, threshold, min_delta)
+        lines.append(line)
+        regressed = regressed or slower
+
+    old_stages = base.get('stages') or {}
+    new_stages = head.get('stages') or {}
+    stages     = [x for x in old_stages if x in new_stages
+                  and x not in ("documents", "versions")]
+
+    if stages:
+        lines.append("")
+        lines.append("%-32s %10s %10s %8s" % ("stage (wall)", "base", "head",
+                                              "change"))
+
+    for stage in sorted(stages):
+        for pct in ("p50", "p95"):
+            old = old_stages[stage]['wall'][pct]
+            new = new_stages[stage]['wall'][pct]
+            name = "%s %s" % (stage, pct)
+            line, slower = _row(name, old, new, threshold, min_delta / 10,
+                                1000.0, "ms")
+            lines.append(line)
+            regressed = regressed or slower
+
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("base", help="The run.py results to compare against.")
+    parser.add_argument("head", help="The run.py results to compare.")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="Percentage change reported as slower or faster. "
+                             "Default: %(default)s.")
+    parser.add_argument("--min-delta", type=float, default=0.0005,
+                        help="Smallest difference in seconds reported as a "
+                             "change. Stage percentiles use a tenth of it. "
+                             "Default: %(default)s.")
+    args = parser.parse_args(argv)
+
+    lines, regressed = compare(_load(args.base), _load(args.head),
+                               args.threshold, args.min_delta)
+    print("\n".join(lines))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""
+Generates deterministic synthetic STIX 1.x corpora for the benchmarks.
+
+The same options and seed always produce byte-identical files, so timings
+taken on two commits are measured against the same input:
+
+    $ python benchmarks/corpus.py /tmp/corpus --count 2000 --seed 1
+
+Each document is a STIX_Package holding enough Indicators to reach a size
+drawn from a log-normal distribution. A fraction of documents are given a
+defect and a fraction of files are plain, non-STIX XML so sniffing has
+something to reject. A manifest.json describing every file is written next
+to the corpus.
+"""
+
+# stdlib
+from __future__ import print_function
+import os
+import sys
+import json
+import random
+import argparse
+
+
+# STIX version => Indicator component version
+INDICATOR_VERSIONS = {
+    "1.0": "2.0",
+    "1.0.1": "2.0.1",
+    "1.1": "2.1",
+    "1.1.1": "2.1.1",
+    "1.2": "2.2"
+}
+
+# Versions which have the timestamp attribute on packages and indicators.
+TIMESTAMP_VERSIONS = ("1.1", "1.1.1", "1.2")
+
+# Defect name => description. See document().
+DEFECTS = {
+    'schema': "an element the STIX schemas do not allow",
+    'malformed': "a truncated, not well-formed document",
+    'best_practices': "indicators without ids or titles"
+}
+
+DEFAULT_VERSIONS = "1.2=6,1.1.1=3,1.0=1"
+DEFAULT_DEFECTS = "schema=2,malformed=1,best_practices=2"
+
+_NAMESPACES = (
+    'xmlns:stix="http://stix.mitre.org/stix-1" '
+    'xmlns:indicator="http://stix.mitre.org/Indicator-2" '
+    'xmlns:stixCommon="http://stix.mitre.org/common-1" '
+    'xmlns:example="http://example.com" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+)
+
+_WORDS = (
+    "actor", "beacon", "campaign", "command", "control", "domain", "dropper",
+    "exfiltration", "hash", "implant", "infrastructure", "lateral", "loader",
+    "malware", "network", "observed", "payload", "phishing", "registry",
+    "sample", "server", "staging", "traffic", "victim", "watchlist"
+)
+
+
+def parse_weights(text):
+    """Parse a "name=weight,name=weight" string into a list of
+    (name, weight) tuples.
+    """
+    weights = []
+
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        weights.append((name.strip(), float(weight or 1)))
+
+    return weights
+
+
+def _choose(rng, weights):
+    """Return a name from the (name, weight) `weights` list."""
+    total = sum(x[1] for x in weights)
+    point = rng.random() * total
+
+    for name, weight in weights:
+        point -= weight
+
+        if point < 0:
+            return name
+
+    return weights[-1][0]
+
+
+def _randint(rng, a, b):
+    """Return an integer in [a, b].
+
+    random.randint() and random.choice() changed between Python 2 and 3, so
+    only rng.random() is used to keep corpora identical across both.
+    """
+    return a + int(rng.random() * (b - a + 1))
+
+
+def _word(rng):
+    return _WORDS[_randint(rng, 0, len(_WORDS) - 1)]
+
+
+def _uuid(rng):
+    """Return a deterministic UUID-formatted string."""
+    h = "%032x" % rng.getrandbits(128)
+    return "-".join((h[:8], h[8:12], h[12:16], h[16:20], h[20:]))
+
+
+def _timestamp(rng):
+    """Return a deterministic ISO 8601 timestamp in 2015."""
+    return "2015-%02d-%02dT%02d:%02d:%02dZ" % (
+        _randint(rng, 1, 12), _randint(rng, 1, 28), _randint(rng, 0, 23),
+        _randint(rng, 0, 59), _randint(rng, 0, 59)
+    )
+
+
+def _sentence(rng, count):
+    return " ".join(_word(rng) for _ in range(count))
+
+
+def _indicator(rng, version, defect):
+    """Return the XML for a single Indicator."""
+    attrs = ['xsi:type="indicator:IndicatorType"']
+
+    if defect != "best_practices":
+        attrs.append('id="example:indicator-%s"' % _uuid(rng))
+
+    if version in TIMESTAMP_VERSIONS:
+        attrs.append('timestamp="%s"' % _timestamp(rng))
+
+    attrs.append('version="%s"' % INDICATOR_VERSIONS[version])
+    body = []
+
+    if defect != "best_practices":
+        body.append("<indicator:Title>%s</indicator:Title>" % _sentence(rng, 3))
+
+    body.append(
+        "<indicator:Description>%s</indicator:Description>" %
+        _sentence(rng, _randint(rng, 10, 40))
+    )
+
+    return "    <stix:Indicator %s>\n      %s\n    </stix:Indicator>\n" % (
+        " ".join(attrs), "\n      ".join(body)
+    )
+
+
+def document(rng, version, size, defect=None):
+    """Return the text of a STIX document of roughly `size` bytes.
+
+    Args:
+        rng: A random.Random instance.
+        version: A STIX version from INDICATOR_VERSIONS.
+        size: The approximate document size in bytes.
+        defect: None or a DEFECTS key.
+    """
+    attrs = ['id="example:Package-%s"' % _uuid(rng), 'version="%s"' % version]
+
+    if version in TIMESTAMP_VERSIONS:
+        attrs.append('timestamp="%s"' % _timestamp(rng))
+
+    head = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<stix:STIX_Package %s %s>\n'
+        '  <stix:STIX_Header>\n'
+        '    <stix:Title>%s</stix:Title>\n'
+        '  </stix:STIX_Header>\n'
+        '  <stix:Indicators>\n'
+    ) % (_NAMESPACES, " ".join(attrs), _sentence(rng, 4))
+
+    tail  = '  </stix:Indicators>\n</stix:STIX_Package>\n'
+    parts = [head]
+    total = len(head) + len(tail)
+
+    while True:
+        indicator = _indicator(rng, version, defect)
+        parts.append(indicator)
+        total += len(indicator)
+
+        if total >= size:
+            break
+
+    if defect == "schema":
+        parts.append("    <stix:Bogus_Element>%s</stix:Bogus_Element>\n" %
+                     _sentence(rng, 2))
+
+    parts.append(tail)
+    text = "".join(parts)
+
+    if defect == "malformed":
+        text = text[:int(len(text) * rng.uniform(0.3, 0.9))]
+
+    return text
+
+
+def non_stix(rng, size):
+    """Return the text of a non-STIX XML document of roughly `size` bytes."""
+    items = []
+    total = 0
+
+    while total < size:
+        item = "  <item>%s</item>\n" % _sentence(rng, 8)
+        items.append(item)
+        total += len(item)
+
+    return '<?xml version="1.0"?>\n<catalog>\n%s</catalog>\n' % "".join(items)
+
+
+def generate(outdir, count=1000, size_median=8192, size_sigma=1.0,
+             versions=DEFAULT_VERSIONS, defect_rate=0.05,
+             defects=DEFAULT_DEFECTS, non_stix_rate=0.05, per_dir=500,
+             seed=0):
+    """Write a synthetic corpus to `outdir` and return its manifest.
+
+    Args:
+        outdir: The output directory. It is created if necessary.
+        count: The number of files to write.
+        size_median: The median document size in bytes.
+        size_sigma: The sigma of the log-normal size distribution.
+        versions: A "version=weight,..." string of STIX versions.
+        defect_rate: The fraction of STIX documents with a defect.
+        defects: A "defect=weight,..." string of DEFECTS.
+        non_stix_rate: The fraction of files which are not STIX documents.
+        per_dir: The number of files in each subdirectory.
+        seed: The random seed.
+
+    Returns:
+        A dictionary with the generation options and a ``files`` list of
+        {path, stix_version, defect, size} dictionaries. Paths are relative
+        to `outdir`.
+    """
+    rng     = random.Random(seed)
+    weights = parse_weights(versions)
+    kinds   = parse_weights(defects)
+    files   = []
+
+    for name, _ in weights:
+        if name not in INDICATOR_VERSIONS:
+            raise ValueError("Unsupported STIX version: %s" % name)
+
+    for name, _ in kinds:
+        if name not in DEFECTS:
+            raise ValueError("Unknown defect: %s" % name)
+
+    for idx in range(count):
+        size = int(rng.lognormvariate(0, size_sigma) * size_median)
+        size = max(size, 512)
+
+        if rng.random() < non_stix_rate:
+            version, defect = None, None
+            text = non_stix(rng, size)
+        else:
+            version = _choose(rng, weights)
+            defect  = _choose(rng, kinds) if rng.random() < defect_rate else None
+            text    = document(rng, version, size, defect)
+
+        relpath = os.path.join("%04d" % (idx // per_dir), "doc-%06d.xml" % idx)
+        path    = os.path.join(outdir, relpath)
+        dirname = os.path.dirname(path)
+
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        with open(path, "wb") as f:
+            f.write(text.encode("utf-8"))
+
+        files.append({
+            'path': relpath.replace(os.sep, "/"),
+            'stix_version': version,
+            'defect': defect,
+            'size': len(text)
+        })
+
+    manifest = {
+        'options': {
+            'count': count,
+            'size_median': size_median,
+            'size_sigma': size_sigma,
+            'versions': versions,
+            'defect_rate': defect_rate,
+            'defects': defects,
+            'non_stix_rate': non_stix_rate,
+            'per_dir': per_dir,
+            'seed': seed
+        },
+        'files': files
+    }
+
+    with open(os.path.join(outdir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True,
+                  separators=(",", ": "))
+
+    return manifest
+
+
+def add_arguments(parser):
+    """Add the corpus generation options to the ArgumentParser `parser`."""
+    parser.add_argument("--count", type=int, default=1000,
+                        help="Number of files. Default: %(default)s.")
+    parser.add_argument("--size-median", type=int, default=8192,
+                        help="Median document size in bytes. "
+                             "Default: %(default)s.")
+    parser.add_argument("--size-sigma", type=float, default=1.0,
+                        help="Sigma of the log-normal size distribution. "
+                             "Default: %(default)s.")
+    parser.add_argument("--versions", default=DEFAULT_VERSIONS,
+                        help="STIX version mix. Default: %(default)s.")
+    parser.add_argument("--defect-rate", type=float, default=0.05,
+                        help="Fraction of documents with a defect. "
+                             "Default: %(default)s.")
+    parser.add_argument("--defects", default=DEFAULT_DEFECTS,
+                        help="Defect mix (%s). Default: %%(default)s." %
+                             ", ".join(sorted(DEFECTS)))
+    parser.add_argument("--non-stix-rate", type=float, default=0.05,
+                        help="Fraction of files that are not STIX. "
+                             "Default: %(default)s.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed. Default: %(default)s.")
+
+
+def options(args):
+    """Return generate() keyword arguments for the parsed `args`."""
+    return {
+        'count': args.count,
+        'size_median': args.size_median,
+        'size_sigma': args.size_sigma,
+        'versions': args.versions,
+        'defect_rate': args.defect_rate,
+        'defects': args.defects,
+        'non_stix_rate': args.non_stix_rate,
+        'seed': args.seed
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("outdir", help="The output directory.")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.outdir, **options(args))
+    total    = sum(x['size'] for x in manifest['files'])
+
+    print("Wrote %d files (%.1f MB) to %s" % (
+        len(manifest['files']), total / (1024.0 * 1024.0), args.outdir
+    ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
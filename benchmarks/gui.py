@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Benchmarks the Qt model/view layer with synthetic rows.
+
+FilesTableView and ResultsWidget are driven directly, without the main
+window, and the timings are written in the same JSON format as run.py so
+they can be compared with compare.py:
+
+    $ xvfb-run -a python benchmarks/gui.py --rows 10000 --rows 100000 -o gui.json
+
+cutiestix uses PyQt4, and Qt 4 has no "offscreen" platform plugin; that
+arrived with the Qt 5 platform abstraction. On a headless Linux box run the
+benchmarks under a virtual X server such as xvfb-run, as above. The widgets
+are shown and painted synchronously with repaint(), so the timings include
+real painting on the virtual display.
+"""
+
+# stdlib
+from __future__ import print_function
+import os
+import sys
+import json
+import argparse
+import collections
+from timeit import default_timer as timer
+
+# external
+from PyQt4 import QtGui
+
+# internal
+import run
+from cutiestix import ingest
+from cutiestix import models
+from cutiestix import storage
+from cutiestix import widgets
+from cutiestix import settings
+from cutiestix import validation
+
+
+VERSIONS = ("1.0", "1.1.1", "1.2")
+
+# Rows inserted per add_many() call, matching an ingestion batch.
+INSERT_BATCH = 1000
+
+# Rows per notify_updated_many() call. At the default NOTIFY_INTERVAL a
+# fast pool delivers batches of about this size.
+NOTIFY_BATCH = 200
+
+# Rows notified one at a time with notify_updated().
+NOTIFY_SINGLE = 1000
+
+# Scroll positions painted by the scroll benchmarks.
+SCROLL_STEPS = 50
+
+# Window size used for every widget.
+WIDTH, HEIGHT = 1280, 768
+
+
+def documents(count):
+    """Return `count` synthetic ingest.Document objects."""
+    return [
+        ingest.Document("/bench/%04d/doc-%07d.xml" % (idx // 1000, idx),
+                        VERSIONS[idx % len(VERSIONS)], 1024 + idx % 65536)
+        for idx in range(count)
+    ]
+
+
+def file_results(idx):
+    """Return synthetic results for the file table row `idx`. Rows cycle
+    through valid, invalid and error results so every color is painted.
+    """
+    if idx % 7 == 6:
+        return Exception("Synthetic error")
+
+    results = validation.ValidationResults()
+    results.xml = validation.DetachedResults(idx % 3 != 2)
+
+    if idx % 2:
+        results.best_practices = validation.DetachedBestPracticeResults(
+            idx % 4 != 1
+        )
+
+    return results
+
+
+def schema_results(count):
+    """Return XML Schema results holding `count` errors."""
+    errors = [
+        validation.DetachedError(idx, "Element '{http://stix.mitre.org/"
+                                      "stix-1}Bogus_%d': This element is not "
+                                      "expected." % (idx % 50))
+        for idx in range(count)
+    ]
+    return validation.DetachedResults(False, errors)
+
+
+def best_practice_results(count, groups=20):
+    """Return Best Practice results holding `count` warnings spread over
+    `groups` collections.
+    """
+    per   = max(1, count // groups)
+    colls = []
+
+    for cidx in range(groups):
+        warns = [
+            validation.DetachedWarning(
+                id="example:indicator-%d" % idx,
+                idref=None,
+                line=idx,
+                tag="{http://stix.mitre.org/stix-1}Indicator",
+                message="Missing timestamp %d" % (idx % 10)
+            )
+            for idx in range(cidx * per, (cidx + 1) * per)
+        ]
+        colls.append(validation.DetachedWarningCollection(
+            "Synthetic Check %02d" % cidx, warns
+        ))
+
+    return validation.DetachedBestPracticeResults(False, colls)
+
+
+class Bench(object):
+    """Shows a widget for the duration of a benchmark and times sections
+    of it.
+    """
+
+    def __init__(self, app, widget):
+        self.app = app
+        self.widget = widget
+        self.widget.resize(WIDTH, HEIGHT)
+        self.widget.show()
+        self.app.processEvents()
+
+    def time(self, func, *args):
+        """Return the seconds taken by `func(*args)` and by processing the
+        events it posted.
+        """
+        start = timer()
+        func(*args)
+        self.app.processEvents()
+        return timer() - start
+
+    def scroll(self, view):
+        """Return the seconds taken to scroll `view` through SCROLL_STEPS
+        positions, painting the viewport synchronously at each one.
+        """
+        bar   = view.verticalScrollBar()
+        start = timer()
+
+        for step in range(SCROLL_STEPS):
+            bar.setValue(bar.maximum() * step // (SCROLL_STEPS - 1))
+            view.viewport().repaint()
+
+        return timer() - start
+
+    def close(self):
+        self.widget.close()
+        self.widget.deleteLater()
+        self.app.processEvents()
+
+
+def bench_files(app, rows, backend):
+    """Return a dictionary of name => seconds for the file table."""
+    settings.TABLE_STORAGE = backend
+
+    docs  = documents(rows)
+    view  = widgets.FilesTableView(None)
+    bench = Bench(app, view)
+    model = view.source_model
+    times = collections.OrderedDict()
+
+    def insert():
+        for idx in range(0, rows, INSERT_BATCH):
+            model.add_many(docs[idx:idx + INSERT_BATCH])
+
+    times['insert'] = bench.time(insert)
+
+    items = model.items()
+    keys  = [item.key() for item in items]
+
+    for idx, item in enumerate(items):
+        item.results = file_results(idx)
+
+    def notify_many():
+        for idx in range(0, rows, NOTIFY_BATCH):
+            model.notify_updated_many(keys[idx:idx + NOTIFY_BATCH])
+            view.viewport().repaint()
+
+    def notify_single():
+        for key in keys[-NOTIFY_SINGLE:]:
+            model.notify_updated(key)
+
+    times['notify_many'] = bench.time(notify_many)
+    times['notify_single'] = bench.time(notify_single)
+    times['resize_columns'] = bench.time(view._resize_columns)
+    times['scroll'] = bench.scroll(view)
+
+    bench.close()
+    return times
+
+
+def bench_results(app, model, results, query):
+    """Return a dictionary of name => seconds for a ResultsWidget using
+    the table `model` class, showing `results` and filtered with `query`.
+    """
+    widget = widgets.ResultsWidget(model)
+    bench  = Bench(app, widget)
+    table  = widget.table_results
+    times  = collections.OrderedDict()
+
+    def open_tab():
+        widget.set_results("/bench/results.xml", results)
+        table.viewport().repaint()
+
+    def filter_rows():
+        widget.edit_filter.setText(query)
+        widget._apply_filter()
+        table.viewport().repaint()
+
+    times['open'] = bench.time(open_tab)
+    times['scroll'] = bench.scroll(table)
+    times['filter'] = bench.time(filter_rows)
+
+    bench.close()
+    return times
+
+
+def suites(rows, backends):
+    """Yield (prefix, callable) pairs. Each callable takes the QApplication
+    and returns a dictionary of name => seconds.
+    """
+    for backend in backends:
+        yield ("files.%s" % backend,
+               lambda app, b=backend: bench_files(app, rows, b))
+
+    yield ("results.xml", lambda app: bench_results(
+        app, models.ValidationResultsTableModel, schema_results(rows),
+        "line:1 bogus_1"
+    ))
+
+    yield ("results.best_practices", lambda app: bench_results(
+        app, models.BestPracticeResultsTableModel,
+        best_practice_results(rows), "id:example:indicator-1 timestamp"
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="cutiestix GUI benchmarks")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="Write the results to FILE as JSON.")
+    parser.add_argument("--rows", type=int, action="append", metavar="N",
+                        help="Number of synthetic rows. May be repeated. "
+                             "Default: 10000, 100000 and 500000.")
+    parser.add_argument("--backend", action="append",
+                        choices=sorted(storage.STORAGES),
+                        help="File table storage. May be repeated. "
+                             "Default: every storage.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per benchmark. Default: %(default)s.")
+    args = parser.parse_args(argv)
+
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        sys.stderr.write("No X display: run under xvfb-run (Qt 4 has no "
+                         "offscreen platform).\n")
+        return 2
+
+    app      = QtGui.QApplication([sys.argv[0]])
+    counts   = args.rows or [10000, 100000, 500000]
+    backends = args.backend or sorted(storage.STORAGES)
+    results  = collections.OrderedDict()
+
+    for rows in counts:
+        for prefix, suite in suites(rows, backends):
+            runs = collections.defaultdict(list)
+
+            for _ in range(args.repeat):
+                for name, seconds in suite(app).items():
+                    runs[name].append(seconds)
+
+            for name, times in runs.items():
+                label = "%s.%s[%d]" % (prefix, name, rows)
+                results[label] = run.summarize(label, times, rows)
+
+    doc = {
+        'meta': run.metadata(
+            suite="gui",
+            rows=counts,
+            backends=backends,
+            repeat=args.repeat
+        ),
+        'benchmarks': results,
+        'stages': None
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
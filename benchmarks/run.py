@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""
+Runs the cutiestix benchmark suite and writes the timings as JSON.
+
+A synthetic corpus is generated with corpus.py unless an existing one is
+given with --corpus. Each benchmark is run --repeat times and every run is
+recorded, so results from two commits can be compared with compare.py:
+
+    $ python benchmarks/run.py --count 2000 -o before.json
+    $ git checkout my-branch
+    $ python benchmarks/run.py --count 2000 -o after.json
+    $ python benchmarks/compare.py before.json after.json
+
+The on-disk result and sniff caches are disabled so every run does the full
+amount of work.
+"""
+
+# stdlib
+from __future__ import print_function
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import collections
+from timeit import default_timer as timer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+# internal
+import corpus
+from cutiestix import ingest
+from cutiestix import utils
+from cutiestix import reports
+from cutiestix import storage
+from cutiestix import version
+from cutiestix import settings
+from cutiestix import validation
+
+try:
+    from cutiestix import models
+except ImportError:
+    models = None  # PyQt4 is not installed
+
+
+class Context(object):
+    """State shared between benchmarks. Later benchmarks use the output of
+    earlier ones, e.g. the reports benchmarks write the validation results.
+    """
+
+    def __init__(self, root, processes=1):
+        self.root = root
+        self.processes = processes
+        self.entries = []    # ingest.walk() tuples
+        self.documents = []  # ingest.Document objects
+        self.results = []    # (ValidationTask, results) tuples
+        self.stats = None    # validation.RunStats of the last validation
+
+
+def bench_walk(ctx):
+    ctx.entries = list(ingest.walk([ctx.root]))
+    return len(ctx.entries)
+
+
+def bench_sniff(ctx):
+    for fn, _, _ in ctx.entries:
+        utils.sniff(fn)
+
+    return len(ctx.entries)
+
+
+def bench_ingest(ctx):
+    scanner = ingest.Scanner()
+    ctx.documents = [doc for batch in scanner.scan([ctx.root]) for doc in batch]
+    return len(ctx.documents)
+
+
+def bench_validate(ctx):
+    tasks = [validation.ValidationTask.from_document(idx, doc)
+             for idx, doc in enumerate(ctx.documents)]
+    stats = validation.RunStats()
+    run   = validation.run(tasks, processes=ctx.processes, stats=stats)
+
+    ctx.results = list(run)
+    ctx.stats = stats
+    return len(ctx.results)
+
+
+def _bench_report(fmt):
+    def bench(ctx):
+        stream = io.BytesIO() if sys.version_info[0] < 3 else io.StringIO()
+        writer = reports.get_writer(fmt, stream)
+
+        for task, results in ctx.results:
+            writer.write(task, results)
+
+        writer.close()
+        return len(ctx.results)
+
+    return bench
+
+
+def _bench_storage(name):
+    def bench(ctx):
+        store = storage.get_storage(name)
+        store.extend(ctx.documents)
+        return len(store)
+
+    return bench
+
+
+def _bench_model(name):
+    def bench(ctx):
+        model = models.ValidateTableModel(None, backend=name)
+        model.add_many(ctx.documents)
+        return model.rowCount()
+
+    return bench
+
+
+def benchmarks():
+    """Return an OrderedDict of benchmark name => callable in run order.
+
+    Each callable takes a Context and returns the number of items it
+    processed.
+    """
+    benches = collections.OrderedDict([
+        ('ingest.walk', bench_walk),
+        ('ingest.sniff', bench_sniff),
+        ('ingest.scan', bench_ingest),
+        ('validation.run', bench_validate)
+    ])
+
+    for fmt in sorted(reports.WRITERS):
+        benches['report.%s' % fmt] = _bench_report(fmt)
+
+    for name in sorted(storage.STORAGES):
+        benches['storage.%s' % name] = _bench_storage(name)
+
+        if models is not None:
+            benches['model.%s' % name] = _bench_model(name)
+
+    return benches
+
+
+def _git_commit():
+    """Return the git commit of the working tree, or None."""
+    try:
+        out = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR,
+            stderr=open(os.devnull, "w")
+        )
+        return out.decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(**extra):
+    """Return a dictionary describing the benchmark environment, updated
+    with `extra`.
+    """
+    meta = {
+        'commit': _git_commit(),
+        'cutiestix': version.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+
+    meta.update(extra)
+    return meta
+
+
+def summarize(name, times, count):
+    """Print and return the result dictionary for a benchmark which
+    processed `count` items in each of the `times` runs.
+    """
+    ordered = sorted(times)
+    result  = {
+        'items': count,
+        'times': times,
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2]
+    }
+
+    print("%-24s %8d items  min %8.3fs  median %8.3fs" % (
+        name, count, result['min'], result['median']
+    ))
+
+    return result
+
+
+def run(ctx, repeat=3, only=None):
+    """Run the benchmarks and return a dictionary of name => result.
+
+    If `only` is a list of name prefixes, other benchmarks are not timed.
+    They still run once if a selected benchmark comes after them, since
+    later benchmarks work on the output of earlier ones.
+    """
+    results  = collections.OrderedDict()
+    benches  = list(benchmarks().items())
+    selected = [not only or any(x.startswith(p) for p in only)
+                for x, _ in benches]
+
+    for idx, (name, bench) in enumerate(benches):
+        if not selected[idx]:
+            if any(selected[idx + 1:]):
+                bench(ctx)
+            continue
+
+        times = []
+
+        for _ in range(repeat):
+            start = timer()
+            count = bench(ctx)
+            times.append(timer() - start)
+
+        results[name] = summarize(name, times, count)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="cutiestix benchmarks")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="Write the results to FILE as JSON.")
+    parser.add_argument("--corpus", metavar="DIR",
+                        help="Benchmark an existing corpus instead of "
+                             "generating one.")
+    parser.add_argument("--keep-corpus", action="store_true",
+                        help="Do not delete the generated corpus.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per benchmark. Default: %(default)s.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Validation processes. Default: %(default)s.")
+    parser.add_argument("--best-practices", action="store_true",
+                        help="Validate STIX Best Practices.")
+    parser.add_argument("--only", action="append", metavar="PREFIX",
+                        help="Only run benchmarks whose name starts with "
+                             "PREFIX. May be repeated.")
+    corpus.add_arguments(parser.add_argument_group("corpus generation"))
+    args = parser.parse_args(argv)
+
+    settings.RESULT_CACHE = False
+    settings.SNIFF_CACHE = False
+    settings.VALIDATE_STIX_BEST_PRACTICES = args.best_practices
+
+    root     = args.corpus
+    manifest = None
+
+    if root is None:
+        root = tempfile.mkdtemp(prefix="cutiestix-bench-")
+        print("Generating corpus in %s" % root)
+        manifest = corpus.generate(root, **corpus.options(args))
+
+    ctx = Context(root, processes=args.processes)
+
+    try:
+        results = run(ctx, repeat=args.repeat, only=args.only)
+    finally:
+        if args.corpus is None and not args.keep_corpus:
+            shutil.rmtree(root)
+
+    doc = {
+        'meta': metadata(
+            corpus=manifest['options'] if manifest else args.corpus,
+            repeat=args.repeat,
+            processes=args.processes,
+            best_practices=args.best_practices
+        ),
+        'benchmarks': results,
+        'stages': ctx.stats.timings.as_dict() if ctx.stats else None
+    }
+
+    if ctx.stats:
+        print(ctx.stats.timings.summary())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
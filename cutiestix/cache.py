@@ -0,0 +1,667 @@
+"""
+This module contains caches which let cutiestix avoid repeating expensive
+work across the documents in a validation run.
+
+The validator caches are process-wide. Each validation worker process builds
+its own copy the first time it needs an entry. The ResultCache and
+SniffCache are persisted to disk and survive across runs.
+"""
+
+# stdlib
+import os
+import sys
+import logging
+import hashlib
+import sqlite3
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# internal
+from . import utils
+
+
+LOG = logging.getLogger(__name__)
+
+# Errors raised when a cache database cannot be opened, read or written.
+# OSError covers an unusable utils.cache_dir().
+DATABASE_ERRORS = (sqlite3.Error, OSError)
+
+# The encoding of byte string paths.
+_FS_ENCODING = sys.getfilesystemencoding() or "utf-8"
+
+
+def _stat(path):
+    """Return a (size, mtime) tuple for `path` or (None, None) if `path` is
+    None or cannot be stat'd.
+    """
+    if not path:
+        return None, None
+
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime
+    except OSError:
+        return None, None
+
+
+def _db_path(path):
+    """Return the filesystem `path` in a form SQLite can bind.
+
+    Python 2 walks directories as byte strings, and SQLite refuses to bind
+    non-ASCII byte strings as TEXT, so they are decoded with the filesystem
+    encoding. A path which cannot be decoded, or which carries undecodable
+    bytes as surrogates on Python 3, is bound as a BLOB instead.
+    """
+    if isinstance(path, bytes):
+        try:
+            return path.decode(_FS_ENCODING)
+        except UnicodeDecodeError:
+            return sqlite3.Binary(path)
+
+    try:
+        path.encode("utf-8")
+    except UnicodeEncodeError:
+        return sqlite3.Binary(path.encode(_FS_ENCODING, "surrogateescape"))
+
+    return path
+
+
+def _mtime(path):
+    """Return the modification time of `path` or None if `path` is None or
+    cannot be stat'd.
+    """
+    if not path:
+        return None
+
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class _ValidatorCache(object):
+    """Base class for caches of compiled stix-validator validator objects.
+
+    Subclasses must implement _key() and _build().
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, *args):
+        """Return the cache key for the get() arguments."""
+        raise NotImplementedError()
+
+    def _build(self, *args):
+        """Build and return the validator for the get() arguments."""
+        raise NotImplementedError()
+
+    def _path(self, key):
+        """Return the filesystem path that the cache `key` was built from."""
+        raise NotImplementedError()
+
+    def get(self, *args):
+        """Return a cached validator for the arguments, building it if
+        necessary.
+        """
+        key = self._key(*args)
+
+        with self._lock:
+            try:
+                validator = self._cache[key]
+                self.hits += 1
+            except KeyError:
+                LOG.debug("%s miss: %s", self.__class__.__name__, key)
+                validator = self._cache[key] = self._build(*args)
+                self.misses += 1
+
+        return validator
+
+    def invalidate(self, path=None):
+        """Remove every entry built from `path`. If `path` is None, remove
+        every entry.
+        """
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+                return
+
+            for key in list(self._cache):
+                if self._path(key) == path:
+                    del self._cache[key]
+
+    def clear(self):
+        """Remove every cache entry and reset the hit/miss counters."""
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return a dictionary of hit, miss and size counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache)
+        }
+
+
+class SchemaCache(_ValidatorCache):
+    """Caches stix-validator XML Schema validators.
+
+    Building a validator maps every schema in the schema directory to its
+    target namespace, so the validator is built once per
+    (schema directory, schema directory mtime) and reused by every document
+    which shares that key. A validator is not tied to a STIX version; the
+    version is passed to each validate() call.
+    """
+
+    def _key(self, version, schema_dir=None):
+        return schema_dir, _mtime(schema_dir)
+
+    def _path(self, key):
+        return key[0]
+
+    def _build(self, version, schema_dir=None):
+        import sdv.validators
+        return sdv.validators.STIXSchemaValidator(schema_dir=schema_dir)
+
+
+class ProfileCache(_ValidatorCache):
+    """Caches stix-validator STIX Profile validators.
+
+    Building a profile validator reads the Excel profile and generates its
+    Schematron rules, so the validator is built once per
+    (profile path, profile size, profile mtime) and reused by every
+    document which shares that key.
+    """
+
+    def _key(self, profile):
+        size, mtime = _stat(profile)
+        return profile, size, mtime
+
+    def _path(self, key):
+        return key[0]
+
+    def _build(self, profile):
+        import sdv.validators
+        return sdv.validators.STIXProfileValidator(profile)
+
+
+def schema_fingerprint(schema_dir):
+    """Return a hex SHA-1 fingerprint of the XML Schemas under the
+    `schema_dir` tree.
+
+    The fingerprint covers the relative path, size and mtime of every
+    ``.xsd`` file, so editing, adding or removing a schema anywhere in the
+    tree changes it. Directory mtimes alone only reflect changes to their
+    direct entries.
+    """
+    entries = []
+
+    for root, _, files in os.walk(schema_dir):
+        for name in files:
+            if not name.lower().endswith(".xsd"):
+                continue
+
+            path = os.path.join(root, name)
+            size, mtime = _stat(path)
+            entries.append((os.path.relpath(path, schema_dir), size, mtime))
+
+    entries.sort()
+    return hashlib.sha1(repr(entries).encode("utf-8")).hexdigest()
+
+
+def digest(fn, blocksize=1 << 20):
+    """Return the hex SHA-1 digest of the contents of the file `fn`."""
+    sha1 = hashlib.sha1()
+
+    with open(fn, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+class ResultCache(object):
+    """A persistent, on-disk cache of validation results.
+
+    Results are keyed by the document content hash, STIX version, enabled
+    validation types, external schema directory fingerprint, STIX Profile
+    fingerprint and stix-validator version. Documents which have not changed
+    since they were last validated with the same options do not need to be
+    validated again.
+
+    Schema directories are fingerprinted once per instance, so a cache
+    should be created for each run.
+
+    The underlying SQLite connection is opened by open() or by the first
+    thread to use the cache. Instances must not be shared across threads.
+    If the database cannot be read or written once it is open, a warning is
+    logged and the cache disables itself for the rest of its lifetime.
+
+    Args:
+        filename: The cache database filename. Defaults to ``results.db``
+            in utils.cache_dir().
+    """
+
+    # Bump this if the pickled results format changes.
+    FORMAT = 1
+
+    # Commit after this many put() calls.
+    COMMIT_INTERVAL = 100
+
+    def __init__(self, filename=None):
+        self._filename = filename
+        self._conn = None
+        self._pending = {}
+        self._fingerprints = {}    # schema_dir => schema_fingerprint()
+        self._uncommitted = 0
+        self.disabled = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def filename(self):
+        """The cache database filename."""
+        if self._filename:
+            return self._filename
+
+        return os.path.join(utils.cache_dir(), "results.db")
+
+    def _connect(self):
+        """Return the SQLite connection, opening it if necessary."""
+        if self._conn is not None:
+            return self._conn
+
+        conn = sqlite3.connect(self.filename)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, data BLOB)"
+        )
+        self._conn = conn
+        return conn
+
+    def _disable(self, ex):
+        """Log the database error `ex` and stop using the cache."""
+        LOG.warn("Result cache disabled: %s", str(ex))
+        self.disabled = True
+        self._pending.clear()
+
+        if self._conn is None:
+            return
+
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+
+        self._conn = None
+
+    def open(self):
+        """Open the cache database now rather than on first use, so a cache
+        which cannot be used can be reported before a run starts.
+
+        Returns:
+            This ResultCache.
+
+        Raises:
+            sqlite3.Error, OSError: If the database cannot be opened.
+        """
+        self._connect()
+        return self
+
+    def _schema_fingerprint(self, schema_dir):
+        """Return the schema_fingerprint() of `schema_dir`, computing it on
+        first use.
+        """
+        try:
+            return self._fingerprints[schema_dir]
+        except KeyError:
+            fingerprint = schema_fingerprint(schema_dir)
+            self._fingerprints[schema_dir] = fingerprint
+            return fingerprint
+
+    def key(self, task):
+        """Return the cache key for the validation.ValidationTask `task`.
+
+        Raises:
+            IOError: If the task document cannot be read.
+        """
+        import sdv
+
+        schemas = None
+        profile = None
+
+        if task.schemas:
+            schemas = task.schemas, self._schema_fingerprint(task.schemas)
+
+        if task.validate_stix_profile:
+            profile = (task.profile,) + _stat(task.profile)
+
+        parts = (
+            self.FORMAT,
+            sdv.__version__,
+            digest(task.filename),
+            task.stix_version,
+            bool(task.validate_best_practices),
+            bool(task.validate_stix_profile),
+            schemas,
+            profile
+        )
+
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def get(self, task):
+        """Return the cached results for the `task` or None if the task has
+        no cached results.
+        """
+        if self.disabled:
+            return None
+
+        try:
+            key = self.key(task)
+        except (IOError, OSError) as ex:
+            LOG.debug("Cannot compute result cache key: %s", str(ex))
+            return None
+
+        results = self.lookup(key)
+
+        if results is None:
+            self._pending[task.key] = key
+
+        return results
+
+    def lookup(self, key):
+        """Return the cached results stored under the key() `key` or None
+        if there are none.
+        """
+        if self.disabled:
+            return None
+
+        try:
+            row = self._connect().execute(
+                "SELECT data FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        except DATABASE_ERRORS as ex:
+            self._disable(ex)
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        try:
+            results = pickle.loads(bytes(row[0]))
+        except Exception as ex:
+            LOG.warn("Discarding unreadable cached results: %s", str(ex))
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return results
+
+    def put(self, task, results, key=None):
+        """Store the `results` for the `task`.
+
+        Args:
+            task: A validation.ValidationTask.
+            results: A picklable ValidationResults object. See
+                validation.detach().
+            key: The task's key(), if it has already been computed.
+        """
+        key = self._pending.pop(task.key, None) or key
+
+        if self.disabled:
+            return
+
+        try:
+            key = key or self.key(task)
+        except (IOError, OSError) as ex:
+            LOG.debug("Cannot compute result cache key: %s", str(ex))
+            return
+
+        data = pickle.dumps(results, 2)
+
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO results (key, data) VALUES (?, ?)",
+                (key, sqlite3.Binary(data))
+            )
+        except DATABASE_ERRORS as ex:
+            self._disable(ex)
+            return
+
+        self._uncommitted += 1
+
+        if self._uncommitted >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        """Write pending results to disk."""
+        if self._conn is not None and self._uncommitted:
+            try:
+                self._conn.commit()
+            except sqlite3.Error as ex:
+                self._disable(ex)
+
+        self._uncommitted = 0
+
+    def clear(self):
+        """Remove every cached result."""
+        conn = self._connect()
+        conn.execute("DELETE FROM results")
+        conn.commit()
+        self._pending.clear()
+        self._uncommitted = 0
+
+    def close(self):
+        """Commit pending results and close the database connection."""
+        if self._conn is None:
+            return
+
+        self.commit()
+
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+        self._pending.clear()
+
+    def stats(self):
+        """Return a dictionary of hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class SniffCache(object):
+    """A persistent, on-disk cache of utils.sniff() results.
+
+    Entries map an absolute path to the size and modification time the file
+    had when it was sniffed. A file whose size and mtime have not changed is
+    not read again, so re-ingesting an unchanged tree only costs a stat()
+    per file.
+
+    The cache may be shared by several threads. Like the ResultCache, it
+    disables itself if the database cannot be read or written, and files
+    are then sniffed without it.
+
+    Args:
+        filename: The cache database filename. Defaults to ``sniff.db`` in
+            utils.cache_dir().
+    """
+
+    # Commit after this many put() calls.
+    COMMIT_INTERVAL = 500
+
+    def __init__(self, filename=None):
+        self._filename = filename
+        self._conn = None
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self.disabled = False
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """Return the SQLite connection, opening it if necessary. Callers
+        must hold the lock.
+        """
+        if self._conn is not None:
+            return self._conn
+
+        filename = self._filename
+
+        if not filename:
+            filename = os.path.join(utils.cache_dir(), "sniff.db")
+
+        conn = sqlite3.connect(filename, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sniff "
+            "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "is_stix INTEGER, version TEXT, namespace TEXT)"
+        )
+        self._conn = conn
+        return conn
+
+    def _disable(self, ex):
+        """Log the database error `ex` and stop using the cache. Callers
+        must hold the lock.
+        """
+        LOG.warn("Sniff cache disabled: %s", str(ex))
+        self.disabled = True
+
+        if self._conn is None:
+            return
+
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+
+        self._conn = None
+
+    def open(self):
+        """Open the cache database now rather than on first use.
+
+        Returns:
+            This SniffCache.
+
+        Raises:
+            sqlite3.Error, OSError: If the database cannot be opened.
+        """
+        with self._lock:
+            self._connect()
+
+        return self
+
+    def get(self, path, size, mtime_ns):
+        """Return the cached utils.SniffResult for `path` or None if the
+        file has not been sniffed or has changed since it was.
+        """
+        with self._lock:
+            if self.disabled:
+                return None
+
+            try:
+                row = self._connect().execute(
+                    "SELECT is_stix, version, namespace FROM sniff "
+                    "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (_db_path(path), size, mtime_ns)
+                ).fetchone()
+            except DATABASE_ERRORS as ex:
+                self._disable(ex)
+                return None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        is_stix, version, namespace = row
+        return utils.SniffResult(bool(is_stix), version, namespace, size)
+
+    def put(self, path, size, mtime_ns, result):
+        """Store the utils.SniffResult `result` for `path`."""
+        with self._lock:
+            if self.disabled:
+                return
+
+            try:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO sniff "
+                    "(path, size, mtime_ns, is_stix, version, namespace) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (_db_path(path), size, mtime_ns, int(result.is_stix),
+                     result.version, result.namespace)
+                )
+
+                self._uncommitted += 1
+
+                if self._uncommitted >= self.COMMIT_INTERVAL:
+                    self._conn.commit()
+                    self._uncommitted = 0
+            except DATABASE_ERRORS as ex:
+                self._disable(ex)
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sniff")
+            conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """Commit pending entries and close the database connection."""
+        with self._lock:
+            if self._conn is None:
+                return
+
+            try:
+                self._conn.commit()
+            except sqlite3.Error as ex:
+                self._disable(ex)
+                return
+
+            self._conn.close()
+            self._conn = None
+            self._uncommitted = 0
+
+    def stats(self):
+        """Return a dictionary of hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# Process-wide caches
+SCHEMAS  = SchemaCache()
+PROFILES = ProfileCache()
+
+
+def validator_counts(since=None):
+    """Return the hit and miss counters of this process's validator caches.
+
+    Args:
+        since: An optional dictionary returned by an earlier call. If given,
+            the counts since that call are returned.
+
+    Returns:
+        A dictionary which maps ``schemas`` and ``profiles`` to dictionaries
+        of ``hits`` and ``misses`` counts.
+    """
+    counts = {
+        'schemas': {'hits': SCHEMAS.hits, 'misses': SCHEMAS.misses},
+        'profiles': {'hits': PROFILES.hits, 'misses': PROFILES.misses}
+    }
+
+    for name, previous in (since or {}).items():
+        for counter in previous:
+            counts[name][counter] -= previous[counter]
+
+    return counts
@@ -0,0 +1,303 @@
+"""
+This module contains the headless, command-line batch validator.
+
+It runs the same ingestion, scheduling, caching and validation pipeline as
+the GUI but has no Qt dependency, so it can be used on machines without a
+display:
+
+    $ cutiestix-validate.py --processes 0 --best-practices path/to/corpus
+
+Results are streamed as each document is validated. The exit status is one
+of the EXIT_* values below.
+"""
+
+# stdlib
+import sys
+import logging
+import argparse
+import multiprocessing
+
+# internal
+from . import cache
+from . import ingest
+from . import reports
+from . import tracing
+from . import version
+from . import settings
+from . import validation
+
+
+LOG = logging.getLogger(__name__)
+
+# Exit status codes
+EXIT_SUCCESS   = 0    # Every document was valid.
+EXIT_INVALID   = 1    # At least one document was invalid.
+EXIT_ERROR     = 3    # At least one document could not be validated.
+EXIT_NO_INPUT  = 4    # No STIX documents were found.
+EXIT_CANCELLED = 130  # The run was interrupted.
+
+
+def init_logging(level=logging.INFO):
+    """Initialize Python logging. Log messages are written to stderr so they
+    do not mix with results written to stdout.
+    """
+    fmt = "[%(asctime)s] [%(levelname)s] %(message)s"
+    logging.basicConfig(level=level, format=fmt, stream=sys.stderr)
+
+
+def _get_argparser():
+    """Create and return an ArgumentParser for the batch validator."""
+    desc = "cutiestix v%s batch validator" % (version.__version__)
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="STIX documents or directories containing STIX documents."
+    )
+
+    parser.add_argument(
+        "--best-practices",
+        action="store_true",
+        default=settings.VALIDATE_STIX_BEST_PRACTICES,
+        help="Validate STIX Best Practices."
+    )
+
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        default=settings.STIX_PROFILE_FILENAME,
+        help="Validate against this STIX Profile (.xlsx)."
+    )
+
+    parser.add_argument(
+        "--schema-dir",
+        metavar="DIR",
+        default=settings.XML_SCHEMA_DIR,
+        help="Validate against the XML Schemas in this directory instead of "
+             "the schemas bundled with stix-validator."
+    )
+
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.VALIDATION_PROCESSES,
+        help="The number of validation processes. A value less than 1 uses "
+             "one process per CPU. Default: %(default)s."
+    )
+
+    parser.add_argument(
+        "--scheduler",
+        default=settings.VALIDATION_SCHEDULER,
+        choices=sorted(validation.SCHEDULERS),
+        help="The order in which documents are validated. "
+             "Default: %(default)s."
+    )
+
+    parser.add_argument(
+        "--ingest-threads",
+        type=int,
+        default=settings.INGEST_THREADS,
+        help="The number of threads used to find STIX documents. "
+             "Default: %(default)s."
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Do not read or write the on-disk result and sniff caches."
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        default=settings.CACHE_DIR,
+        help="The on-disk cache directory. Default: ~/.cutiestix."
+    )
+
+    parser.add_argument(
+        "--output", "-o",
+        metavar="FILE",
+        default=None,
+        help="Write results to FILE instead of stdout."
+    )
+
+    parser.add_argument(
+        "--format", "-f",
+        default="text",
+        choices=sorted(reports.WRITERS),
+        help="The report format. Default: %(default)s."
+    )
+
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help="Print per-stage timing percentiles to stderr when the run "
+             "finishes."
+    )
+
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=settings.TRACE_FILENAME,
+        help="Write a Trace Event Format timeline of the run to FILE."
+    )
+
+    parser.add_argument(
+        "--log-level",
+        default="WARN",
+        help="The logging output level.",
+        choices=["DEBUG", "INFO", "WARN", "ERROR"]
+    )
+
+    return parser
+
+
+def apply_settings(args):
+    """Copy the parsed command-line `args` into the global settings so the
+    ingestion and validation code sees them.
+    """
+    settings.VALIDATE_STIX_BEST_PRACTICES = args.best_practices
+    settings.VALIDATE_STIX_PROFILE        = bool(args.profile)
+    settings.STIX_PROFILE_FILENAME        = args.profile
+    settings.VALIDATE_EXTERNAL_SCHEMAS    = bool(args.schema_dir)
+    settings.XML_SCHEMA_DIR               = args.schema_dir
+    settings.VALIDATION_PROCESSES         = args.processes
+    settings.VALIDATION_SCHEDULER         = args.scheduler
+    settings.INGEST_THREADS               = args.ingest_threads
+    settings.RESULT_CACHE                 = not args.no_cache
+    settings.SNIFF_CACHE                  = not args.no_cache
+    settings.CACHE_DIR                    = args.cache_dir
+    settings.TRACE_FILENAME               = args.trace
+
+
+def find_documents(paths):
+    """Return a list of the ingest.Document objects found in `paths`."""
+    scanner   = ingest.Scanner()
+    documents = []
+
+    for batch in scanner.scan(paths):
+        documents.extend(batch)
+
+    LOG.info("Found %d STIX documents in %d XML files",
+             scanner.found, scanner.scanned)
+    return documents
+
+
+def _result_cache():
+    """Return an open cache.ResultCache if result caching is enabled and the
+    cache can be opened, otherwise None.
+    """
+    if not settings.RESULT_CACHE:
+        return None
+
+    try:
+        return cache.ResultCache().open()
+    except cache.DATABASE_ERRORS as ex:
+        LOG.warn("Result cache unavailable: %s", str(ex))
+        return None
+
+
+def validate(documents, writer, stats=None):
+    """Validate the `documents`, writing results to `writer` as each document
+    completes.
+
+    Args:
+        documents: A list of ingest.Document objects.
+        writer: A reports.ReportWriter.
+        stats: An optional validation.RunStats which is updated as the run
+            progresses.
+
+    Returns:
+        A dictionary mapping validation.status() values to document counts.
+    """
+    tasks  = [validation.ValidationTask.from_document(idx, doc)
+              for idx, doc in enumerate(documents)]
+    counts = {'valid': 0, 'invalid': 0, 'error': 0}
+    store  = _result_cache()
+
+    results = validation.run(
+        tasks,
+        processes=validation.process_count(),
+        store=store,
+        stats=stats
+    )
+
+    try:
+        for task, result in results:
+            status = validation.status(result)
+            counts[status] += 1
+
+            if status == "error":
+                LOG.warn("Error validating %s: %s", task.filename, result)
+
+            writer.write(task, result)
+    finally:
+        if store:
+            LOG.debug("Result cache stats: %s", store.stats())
+            store.close()
+
+    return counts
+
+
+def exit_status(counts):
+    """Return the process exit status for the validate() `counts`."""
+    if counts['error']:
+        return EXIT_ERROR
+
+    if counts['invalid']:
+        return EXIT_INVALID
+
+    return EXIT_SUCCESS
+
+
+def main(argv=None):
+    """Run the batch validator.
+
+    Returns:
+        The process exit status.
+    """
+    # Required for validation worker processes in frozen Windows builds.
+    multiprocessing.freeze_support()
+
+    parser = _get_argparser()
+    args   = parser.parse_args(argv)
+
+    init_logging(args.log_level)
+    apply_settings(args)
+
+    stats  = validation.RunStats()
+    stream = open(args.output, "w") if args.output else sys.stdout
+    writer = reports.get_writer(args.format, stream)
+
+    if settings.TRACE_FILENAME:
+        tracing.start(settings.TRACE_FILENAME)
+
+    try:
+        documents = find_documents(args.paths)
+
+        if not documents:
+            LOG.error("No STIX documents found.")
+            return EXIT_NO_INPUT
+
+        counts = validate(documents, writer, stats)
+    except KeyboardInterrupt:
+        LOG.error("Interrupted. %s", stats.summary())
+        return EXIT_CANCELLED
+    finally:
+        writer.close()
+        tracing.stop()
+
+        if args.output:
+            stream.close()
+
+    LOG.info(stats.summary())
+
+    if args.timings:
+        sys.stderr.write(stats.timings.summary() + "\n")
+
+    LOG.info("%(valid)d valid, %(invalid)d invalid, %(error)d errors", counts)
+    return exit_status(counts)
@@ -8,33 +8,36 @@ from PyQt4 import QtGui
 
 # internal
 from . import utils
+from . import storage
 
 
 class ResultsDelegate(QtGui.QStyledItemDelegate):
     """A validation result delegate.
 
-    This is used to render the stix-validator ValidationResults object which
-    is attached to model items during validation.
+    This is used to render the validation status code which the
+    ValidateTableModel reports for its "Results" column.
 
     If an exception occurred during validition, the word "Error" will be
     presented.
     """
 
+    # storage.STATUS_* code => display text
+    STATUS_TEXT = {
+        storage.STATUS_PENDING: "",
+        storage.STATUS_VALID: "Valid",
+        storage.STATUS_INVALID: "Invalid",
+        storage.STATUS_ERROR: "Error"
+    }
+
     def displayText(self, value, locale=None):
-        """Return the text to display for a stix-validator ValidationResults
-        object that is attached to a model item after validation..
+        """Return the text to display for the validation status code of a
+        model item.
         """
         if value is None:
             return ""
 
-        value   = value.toPyObject()
-
-        if isinstance(value, Exception):
-            result = "Error"
-        else:
-            results = value.xml, value.profile, value.best_practices
-            invalid = any(getattr(x, 'is_valid', None) is False for x in results)
-            result  = "Invalid" if invalid else "Valid"
+        status = value.toPyObject()
+        result = self.STATUS_TEXT.get(status, "")
 
         return super(ResultsDelegate, self).displayText(result, locale)
 
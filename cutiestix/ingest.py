@@ -0,0 +1,261 @@
+"""
+This module contains the file ingestion pipeline which finds STIX documents
+on disk.
+
+Nothing in here depends on Qt. Directory walking and file sniffing are meant
+to run off of the GUI thread:
+
+>>> scanner = Scanner()
+>>> for batch in scanner.scan(["path/to/corpus"]):
+>>>     for doc in batch:
+>>>         print doc.filename, doc.stix_version
+"""
+
+# stdlib
+import os
+import time
+import logging
+import collections
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# internal
+from . import cache
+from . import utils
+from . import tracing
+from . import settings
+
+
+LOG = logging.getLogger(__name__)
+
+
+# A STIX document discovered during ingestion.
+Document = collections.namedtuple(
+    "Document", ["filename", "stix_version", "size"]
+)
+
+
+def is_xml(fn):
+    """Return True if the filename `fn` has an XML file extension."""
+    return fn.lower().endswith(".xml")
+
+
+def mtime_ns(st):
+    """Return the modification time of the stat result `st` in integer
+    nanoseconds.
+    """
+    try:
+        return st.st_mtime_ns
+    except AttributeError:
+        return int(st.st_mtime * 1e9)
+
+
+def _entries(dirname):
+    """Yield a (path, is_dir, stat) tuple for each entry in `dirname`. The
+    stat value is None for directories.
+
+    Symbolic links to directories are not followed.
+    """
+    if scandir is not None:
+        for entry in scandir(dirname):
+            if entry.is_dir(follow_symlinks=False):
+                yield entry.path, True, None
+            elif entry.is_file():
+                yield entry.path, False, entry.stat()
+        return
+
+    for name in os.listdir(dirname):
+        path = os.path.join(dirname, name)
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            yield path, True, None
+        elif os.path.isfile(path):
+            yield path, False, os.stat(path)
+
+
+def walk(paths, cancelled=None):
+    """Yield a (filename, size, mtime_ns) tuple for every XML file found in
+    `paths`.
+
+    Args:
+        paths: A filename, dirname, or list of filenames/dirnames. Directories
+            are traversed recursively.
+        cancelled: An optional callable. Walking stops as soon as it returns
+            True.
+    """
+    if not utils.is_iterable(paths):
+        paths = [paths]
+
+    cancelled = cancelled or (lambda: False)
+    dirs = []
+
+    for path in paths:
+        path = os.path.abspath(path)
+
+        if os.path.isdir(path):
+            dirs.append(path)
+        elif is_xml(path) and os.path.isfile(path):
+            st = os.stat(path)
+            yield path, st.st_size, mtime_ns(st)
+
+    while dirs and not cancelled():
+        dirname = dirs.pop()
+
+        try:
+            with tracing.span("scandir", "ingest", path=dirname):
+                entries = list(_entries(dirname))
+        except OSError as ex:
+            LOG.warn("Cannot read directory %s: %s", dirname, str(ex))
+            continue
+
+        for path, isdir, st in entries:
+            if isdir:
+                dirs.append(path)
+            elif is_xml(path):
+                yield path, st.st_size, mtime_ns(st)
+
+
+def sniff(entry, store=None):
+    """Return a Document for the (filename, size, mtime_ns) `entry` if it is
+    a STIX document, otherwise None.
+
+    Args:
+        entry: A tuple yielded by walk().
+        store: An optional cache.SniffCache which is checked before the file
+            is read and updated afterwards.
+    """
+    fn, size, mtime = entry
+    result = store.get(fn, size, mtime) if store else None
+
+    if result is None:
+        try:
+            result = utils.sniff(fn)
+        except (IOError, OSError) as ex:
+            LOG.debug("Cannot sniff %s: %s", fn, str(ex))
+            return None
+
+        if store:
+            store.put(fn, size, mtime, result)
+
+    if not result.is_stix:
+        return None
+
+    return Document(fn, result.version, result.size)
+
+
+class Scanner(object):
+    """Walks directories and sniffs the XML files it finds on a pool of
+    threads, yielding discovered STIX documents in batches.
+
+    Args:
+        threads: The number of sniffing threads. Defaults to
+            ``settings.INGEST_THREADS``.
+        batch_size: The maximum number of documents in a batch.
+        interval: The maximum number of seconds between batches. Batches
+            may be empty if no STIX documents were found in that time, which
+            lets callers report progress while scanning large trees.
+        store: A cache.SniffCache. If None and ``settings.SNIFF_CACHE`` is
+            True, the default on-disk sniff cache is used.
+    """
+
+    def __init__(self, threads=None, batch_size=1000, interval=0.25,
+                 store=None):
+        self._threads = threads or settings.INGEST_THREADS
+        self._batch_size = batch_size
+        self._interval = interval
+        self._store = store
+        self._cancelled = False
+
+        #: The number of XML files examined so far.
+        self.scanned = 0
+
+        #: The number of STIX documents found so far.
+        self.found = 0
+
+    def cancel(self):
+        """Stop scanning. This may be called from any thread."""
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def _walk(self, paths):
+        """Walk the `paths`, counting each XML file found."""
+        for entry in walk(paths, cancelled=lambda: self._cancelled):
+            self.scanned += 1
+            yield entry
+
+    def _sniff(self, entry):
+        """Sniff the walk() `entry` using the scanner's sniff cache."""
+        with tracing.span("sniff", "ingest", filename=entry[0]):
+            return sniff(entry, self._store)
+
+    def _open_store(self):
+        """Open the default sniff cache if one was not provided and sniff
+        caching is enabled.
+
+        Returns:
+            True if the scanner opened the cache and must close it.
+        """
+        if self._store is not None or not settings.SNIFF_CACHE:
+            return False
+
+        try:
+            self._store = cache.SniffCache().open()
+            return True
+        except cache.DATABASE_ERRORS as ex:
+            LOG.warn("Sniff cache unavailable: %s", str(ex))
+            return False
+
+    def scan(self, paths):
+        """Find the STIX documents in `paths`.
+
+        Args:
+            paths: A filename, dirname, or list of filenames/dirnames.
+
+        Yields:
+            Lists of Document objects.
+        """
+        owned = self._open_store()
+        pool  = ThreadPool(self._threads)
+        batch = []
+        last  = time.time()
+
+        try:
+            sniffed = pool.imap_unordered(self._sniff, self._walk(paths), 16)
+
+            for doc in sniffed:
+                if self._cancelled:
+                    break
+
+                if doc is not None:
+                    self.found += 1
+                    batch.append(doc)
+
+                now = time.time()
+
+                if len(batch) >= self._batch_size or now - last >= self._interval:
+                    yield batch
+                    batch = []
+                    last  = now
+        finally:
+            pool.terminate()
+            pool.join()
+
+            if self._store:
+                LOG.debug("Sniff cache stats: %s", self._store.stats())
+
+            if owned:
+                self._store.close()
+                self._store = None
+
+        if batch:
+            yield batch
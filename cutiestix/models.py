@@ -5,6 +5,7 @@ This module contains model code for cutiestix.
 # stdlib
 import os
 import logging
+import itertools
 
 # external
 from PyQt4 import QtCore, QtGui
@@ -12,7 +13,16 @@ from PyQt4.QtCore import Qt
 
 # internal
 from . import utils
+from . import ingest
+from . import search
 from . import settings
+from . import storage
+from . import validation
+from .storage import IndexedModelItem
+
+# Re-exported for code which imported these from models before they moved.
+from .storage import ValidateTableItem
+from .validation import ValidationResults
 
 
 LOG = logging.getLogger(__name__)
@@ -58,161 +68,114 @@ VALIDATION_COLORS = {
 }
 
 
-class IndexedModelItem(object):
-    """Used for model row data that can be accessed by column number or
-    attribute name.
-
-    This is useful in QAbstractTableModel data() and setData() methods which
-    are passed QModelIndex objects, and thus refer to columns and rows by
-    index values.
-
-    Example:
-        >>> class Foo(IndexedModelItem):
-        >>>     _attrs = ("foo", "bar")
-        >>>
-        >>> f = Foo(foo=True, bar=False)
-        >>> print f[0]
-        True
-        >>> print f.foo
-        True
-        >>> print f[1]
-        False
-        >>> print f.bar
-        False
-    """
-
-    _attrs = tuple()  # Index-accessible attributes
+class BestPracticeResultsTableItem(IndexedModelItem):
+    """Used for BestPracticeResultsTableModel entries."""
+    _attrs = ("title", "line", "tag", "id", "idref", "message")
+    __slots__ = _attrs
 
-    def __init__(self, **kwargs):
-        super(IndexedModelItem, self).__init__()
 
-        for attr in self._attrs:
-            setattr(self, attr, kwargs.get(attr))
+class IncrementalTableModel(QtCore.QAbstractTableModel):
+    """Base class for table models which build their rows in batches as a
+    view scrolls down, rather than all at once.
 
-    def __getitem__(self, index):
-        """Return the value for the `index`.
+    Subclasses pass reset() an iterable of rows and the total number of
+    rows. Rows are pulled from the iterable FETCH_SIZE at a time through
+    the canFetchMore()/fetchMore() protocol, so showing a huge report only
+    costs the rows which have been scrolled into view.
 
-        Args:
-            index: A integer index.
+    Rows can be filtered with filter(). Subclasses which support filtering
+    implement _show_all(), _search_index() and _row_at().
+    """
 
-        Returns:
-            The value associated with the index.
+    # The number of rows built per fetchMore() call.
+    FETCH_SIZE = 500
 
-        Raises:
-            TypeError: If `index` cannot be translated to an int.
-            ValueError: If `index` cannot be translated to an int.
-        """
-        index = int(index)
-        attr  = self._attrs[index]
-        return getattr(self, attr)
+    def __init__(self, parent):
+        super(IncrementalTableModel, self).__init__(parent)
+        self._data = []
+        self._pending = iter(())
+        self._total = 0
 
-    def __setitem__(self, index, value):
-        """Set the `value` for the `index`.
+    def reset(self, rows=(), total=0):
+        """Replace the model rows.
 
         Args:
-            index: An integer index.
-            value: A value.
-
-        Returns:
-            The value associated with the index.
-
-        Raises:
-            TypeError: If `index` cannot be translated to an int.
-            ValueError: If `index` cannot be translated to an int.
+            rows: An iterable of rows. It is consumed lazily.
+            total: The number of rows `rows` will yield.
         """
-        index = int(index)
-        attr  = self._attrs[index]
-        setattr(self, attr, value)
-
-
-class BestPracticeResultsTableItem(IndexedModelItem):
-    """Used for BestPracticeResultsTableModel entries."""
-    _attrs = ("title", "line", "tag", "id", "idref", "message")
-
+        self.beginResetModel()
+        self._pending = iter(rows)
+        self._total = total
+        self._data = []
+        self._data = self._take(self.FETCH_SIZE)
+        self.endResetModel()
 
-class ValidateTableItem(IndexedModelItem, QtCore.QObject):
-    """Used for ValidationTableModel entries.
+    def _take(self, count):
+        """Return a list of up to `count` rows pulled from the pending
+        rows.
+        """
+        rows = list(itertools.islice(self._pending, count))
 
-    Signals:
-        SIGNAL_RESULTS_UPDATED (str): Emitted when results have been updated.
-    """
-    _attrs = ("filename", "stix_version", "validate_best_practices",
-              "validate_stix_profile", "results")
+        if len(rows) < count:
+            # The row iterable came up short of the advertised total.
+            self._total = len(self._data) + len(rows)
 
-    SIGNAL_RESULTS_UPDATED = QtCore.pyqtSignal(str)
+        return rows
 
-    def __init__(self, parent=None):
-        QtCore.QObject.__init__(self, parent)
+    def rowCount(self, index=None):
+        return len(self._data)
 
-        IndexedModelItem.__init__(
-            self,
-            filename=None,
-            stix_version=None,
-            validate_stix_profile=settings.VALIDATE_STIX_PROFILE,
-            validate_best_practices=settings.VALIDATE_STIX_BEST_PRACTICES,
-            results=None
-        )
+    def canFetchMore(self, index=None):
+        if index is not None and index.isValid():
+            return False
 
-        self.__key = str(id(self))
+        return len(self._data) < self._total
 
-    def key(self):
-        """Return a key for this item. This is the str(id(self)).
+    def fetchMore(self, index=None):
+        if not self.canFetchMore(index):
+            return
 
-        This can be used for lookup within a table model.
+        count = min(self.FETCH_SIZE, self._total - len(self._data))
+        rows  = self._take(count)
 
-        Note:
-            Initially this returned ``id(self)`` but was changed due to integer
-            overflow issues that can occur between 64bit Python and Qt when
-            emitting integer data.
+        if not rows:
+            return
 
-            I could have gotten around this by defining my signals as
-            ``pyqtSignal('long long')`` but found that out after using
-            ``str`` everywhere.
-        """
-        return self.__key
+        first = len(self._data)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+        self._data.extend(rows)
+        self.endInsertRows()
 
-    def notify(self):
-        """Notify observers that the results have changed.
+    def _show_all(self):
+        """Reset the model to show every row."""
+        raise NotImplementedError()
 
-        Emits:
-            SIGNAL_RESULTS_UPDATED (str): The key() of the item that has been
-            updated.
+    def _search_index(self):
+        """Return the search.ResultsIndex for the model rows, building it if
+        necessary.
         """
-        key = self.key()
-        LOG.debug("Sending id(self): %s", key)
-        self.SIGNAL_RESULTS_UPDATED.emit(key)
+        raise NotImplementedError()
 
-    @classmethod
-    def from_file(cls, fn):
-        """Return a ValidateTableItem instance for the input filename.
+    def _row_at(self, row):
+        """Build and return the unfiltered row number `row`."""
+        raise NotImplementedError()
 
-        Args:
-            fn: A filename.
+    def filter(self, query):
+        """Show only the rows which match the search `query`. See
+        search.ResultsIndex.search() for the query syntax.
 
-        Returns:
-            A ValidateTableItem object.
+        The search index is built on the first non-empty query and reused
+        until the model is updated. An empty query shows every row.
         """
-        item = cls()
-        item.filename = os.path.abspath(fn)
-        item.stix_version = utils.stix_version(fn)
-
-        return item
-
-
-class ValidationResults(object):
-    """Holds validation results.
-
-    This is used by ValidationTableItem for storing validation results.
-    """
-    __slots__ = ("xml", "best_practices", "profile")
+        if not (query or "").strip():
+            self._show_all()
+            return
 
-    def __init__(self):
-        self.xml = None
-        self.best_practices = None
-        self.profile = None
+        rows = self._search_index().search(query)
+        self.reset((self._row_at(x) for x in rows), len(rows))
 
 
-class ValidationResultsTableModel(QtCore.QAbstractTableModel):
+class ValidationResultsTableModel(IncrementalTableModel):
     """Table model for storing XML and Profile validation errors.
 
     The underlying data is a list of stix-validator
@@ -224,21 +187,29 @@ class ValidationResultsTableModel(QtCore.QAbstractTableModel):
 
     def __init__(self, parent):
         super(ValidationResultsTableModel, self).__init__(parent)
-        self._data = []
+        self._errors = []
+        self._index = None
 
     def update(self, results):
         """Set the model data to the errors found on `results`.
 
         If `results` is None, clear the model data.
         """
-        self.beginResetModel()
+        self._errors = [] if results is None else results.errors
+        self._index = None
+        self._show_all()
 
-        if results is None:
-            self._data = []
-        else:
-            self._data = results.errors
+    def _show_all(self):
+        self.reset(self._errors, len(self._errors))
 
-        self.endResetModel()
+    def _search_index(self):
+        if self._index is None:
+            self._index = search.ResultsIndex.from_errors(self._errors)
+
+        return self._index
+
+    def _row_at(self, row):
+        return self._errors[row]
 
     def clear(self):
         """Reset the model data."""
@@ -275,14 +246,11 @@ class ValidationResultsTableModel(QtCore.QAbstractTableModel):
 
         return None
 
-    def rowCount(self, index=None):
-        return len(self._data)
-
     def columnCount(self, index=None):
         return len(self.COLUMNS)
 
 
-class BestPracticeResultsTableModel(QtCore.QAbstractTableModel):
+class BestPracticeResultsTableModel(IncrementalTableModel):
     """Table model for storing STIX Best Practice warnings.
 
     The underlying data is a list of stix-validator BestPracticeWarning objects.
@@ -293,54 +261,65 @@ class BestPracticeResultsTableModel(QtCore.QAbstractTableModel):
 
     def __init__(self, parent):
         super(BestPracticeResultsTableModel, self).__init__(parent)
-        self._data = []
+        self._results = None
+        self._warnings = None  # (title, warning) rows for the search index
+        self._index = None
 
     def _parse_results(self, results):
-        """Parse the results and set the internal data.
+        """Parse the results.
 
         Args:
             results: A stix-validator BestPracticeResults object.
 
         Returns:
-            A list of BestPracticeTableItem objects.
+            A generator of BestPracticeTableItem objects. Items are built as
+            the generator is consumed.
         """
-        data = []
-
-        for collection in sorted(results, key=lambda x: x.name):
-            title = collection.name
-            warns = [x for x in collection]
-
-            for warn in warns:
-                warndict = {k: warn[k] for k in warn.core_keys}
-                item     = BestPracticeResultsTableItem(title=title, **warndict)
-                data.append(item)
-
-        return data
+        warns = validation.best_practice_warnings(results)
+        return (BestPracticeResultsTableItem(**x) for x in warns)
 
     def update(self, results):
         """Parse the `results` and populate the model.
 
+        Only the first FETCH_SIZE rows are built here; the rest are built as
+        the view asks for them.
+
         Args:
             results: A BestPracticeResults object.
         """
-        self.beginResetModel()
+        if results is not None and not results.errors:
+            results = None
 
-        if results is None:
-            self._data = []
-        elif not results.errors:
-            self._data = []
-        else:
-            self._data = self._parse_results(results)
+        self._results = results
+        self._warnings = None
+        self._index = None
+        self._show_all()
 
-        self.endResetModel()
+    def _show_all(self):
+        if self._results is None:
+            self.reset()
+            return
+
+        total = sum(len(x) for x in self._results)
+        self.reset(self._parse_results(self._results), total)
+
+    def _search_index(self):
+        if self._index is None:
+            collections = sorted(self._results or (), key=lambda x: x.name)
+            self._warnings = [(c.name, w) for c in collections for w in c]
+            self._index = search.ResultsIndex.from_warnings(self._warnings)
+
+        return self._index
+
+    def _row_at(self, row):
+        title, warn = self._warnings[row]
+        warndict = dict((k, warn[k]) for k in warn.core_keys)
+        return BestPracticeResultsTableItem(title=title, **warndict)
 
     def clear(self):
         """Clear the model data."""
         self.update(None)
 
-    def rowCount(self, index=None):
-        return len(self._data)
-
     def columnCount(self, index=None):
         return len(self.COLUMNS)
 
@@ -367,48 +346,87 @@ class BestPracticeResultsTableModel(QtCore.QAbstractTableModel):
 
 
 class ValidateTableModel(QtCore.QAbstractTableModel):
-    """A table model that holds information about items to be validated."""
+    """A table model that holds information about items to be validated.
+
+    Rows are held by a storage backend (see storage.STORAGES) which keeps an
+    index of item key() values to row numbers, so item lookups and update
+    notifications do not have to scan the table.
+
+    Args:
+        parent: A QObject parent.
+        backend: A storage.STORAGES name. If None,
+            ``settings.TABLE_STORAGE`` is used.
+    """
 
     COLUMNS = ("Filename", "STIX Version", "Best Practices Validate",
                "STIX Profile Validate", "Results")
     COLUMN_INDEXES = dict(enumerate(COLUMNS))
 
-    def __init__(self, parent):
+    # The VALIDATION_COLORS key for each column. The "Results" column just
+    # uses the xml validation colors.
+    COLUMN_COLORS = ("xml", "xml", "best_practices", "profile", "xml")
+
+    def __init__(self, parent, backend=None):
         super(ValidateTableModel, self).__init__(parent)
-        self._data = []
+        self._storage = storage.get_storage(backend)
+
+    def _row(self, itemid):
+        """Return the row for the item with the key() `itemid` or None if
+        the model does not hold the item.
+        """
+        return self._storage.row(itemid)
 
     def clear(self):
         """Clears the model data."""
         self.update(None)
 
-    def _get_item(self, fn):
-        """Build and return a ValidateTableItem for the filename `fn`.
-
-        Wire up the ValidateTableItem signals so that the model is notified
-        of result updates.
+    def _get_document(self, fn):
+        """Return an ingest.Document for the filename or ingest.Document
+        `fn`.
         """
-        item = ValidateTableItem.from_file(fn)
-        item.SIGNAL_RESULTS_UPDATED.connect(self._notify_updated)
-        return item
+        if isinstance(fn, ingest.Document):
+            return fn
+
+        sniffed = utils.sniff(fn)
+        return ingest.Document(os.path.abspath(fn), sniffed.version, sniffed.size)
 
     def update(self, files):
         self.beginResetModel()
+        self._storage.clear()
 
-        if files is None:
-            self._data = []
-        else:
-            self._data = [self._get_item(fn) for fn in files]
+        if files is not None:
+            self._storage.extend(self._get_document(fn) for fn in files)
 
         self.endResetModel()
 
     def add(self, file):
-        idx = len(self._data)
-        self.beginInsertRows(QtCore.QModelIndex(), idx, idx)
-        self._data.append(self._get_item(file))
+        """Add a row for the filename `file`."""
+        self.add_many([file])
+
+    def add_many(self, files):
+        """Add a row for each filename in `files`.
+
+        All the rows are inserted under a single beginInsertRows() and
+        endInsertRows() pair, so views are notified once per call rather
+        than once per file.
+
+        Args:
+            files: A list of filenames or ingest.Document objects.
+        """
+        documents = [self._get_document(fn) for fn in files]
+
+        if not documents:
+            return
+
+        first = len(self._storage)
+        last  = first + len(documents) - 1
+
+        self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        self._storage.extend(documents)
         self.endInsertRows()
 
     def rowCount(self, index=None):
-        return len(self._data)
+        return len(self._storage)
 
     def columnCount(self, index=None):
         return len(self.COLUMNS)
@@ -421,40 +439,24 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         color. If no results are set, return None (system defaults will be
         used).
 
+        The color is chosen from the status cached by the storage backend
+        when the results arrived, so painting never inspects the results.
+
         Args:
             index: A QModelIndex object.
             key: The VALIDATION_COLORS key (either 'bg' or 'fg').
 
         """
-        row  = index.row()
-        col  = index.column()
-        item = self._data[row]
+        col    = index.column()
+        status = self._storage.status(index.row(), col)
 
-        if not item.results:
+        if status == storage.STATUS_PENDING:
             return None
-        elif isinstance(item.results, Exception):
+        elif status == storage.STATUS_ERROR:
             return VALIDATION_COLORS["exception"][key]
 
-        xml = item.results.xml
-        best_practices = item.results.best_practices
-        profile = item.results.profile
-
-        # For the "Results" column
-        total = xml, profile, best_practices
-        valid = all(getattr(x, 'is_valid', True) is True for x in total)
-
-        if col == 2 and best_practices:
-            is_valid = best_practices.is_valid
-            return VALIDATION_COLORS["best_practices"][is_valid][key]
-        elif col == 3 and profile:
-            is_valid = profile.is_valid
-            return VALIDATION_COLORS["profile"][is_valid][key]
-        elif col == 4:
-            # Just use the xml validation colors
-            return VALIDATION_COLORS['xml'][valid][key]
-        else:
-            is_valid = xml.is_valid
-            return VALIDATION_COLORS["xml"][is_valid][key]
+        valid = status == storage.STATUS_VALID
+        return VALIDATION_COLORS[self.COLUMN_COLORS[col]][valid][key]
 
     def _bgcolor(self, index):
         """Return the background color to paint for the item at `index`.
@@ -479,16 +481,18 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         row = index.row()
         col = index.column()
 
-        if role == Qt.DisplayRole:
-            return self._data[row][col]
+        if role == Qt.DisplayRole and col == storage.COL_RESULTS:
+            return self._storage.status(row, col)
+        elif role == Qt.DisplayRole:
+            return self._storage.value(row, col)
         elif role == Qt.EditRole:
-            return self._data[row][col]
+            return self._storage.value(row, col)
         elif role == Qt.BackgroundRole:
             return self._bgcolor(index)
         elif role == Qt.ForegroundRole:
             return self._fgcolor(index)
         elif role  == Qt.UserRole:
-            return self._data[row]
+            return self._storage.item(row)
 
         return None
 
@@ -520,7 +524,7 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         value = utils.str2bool(value.toPyObject())
 
         # Set the value
-        self._data[row][col] = value
+        self._storage.set_value(row, col, value)
 
         # Emit the change notification
         self.dataChanged.emit(index, index)
@@ -549,36 +553,73 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         if hasattr(item, "toPyObject"):
             item = item.toPyObject()
 
-        if item not in self._data:
+        row = self._row(item.key())
+
+        if row is None:
             LOG.warn("Attempting to remove something I don't have...")
         else:
-            row = self._data.index(item)
             self.removeRow(row)
 
     def remove_items(self, items):
         """Remove the `items` from the model if it they are currently held by
         the model.
 
+        Contiguous rows are removed together and the row index is rebuilt
+        once after all the items have been removed.
+
         Args:
             items: A list of ValidateTableItem items.
         """
+        rows = set()
+
         for item in items:
-            self.remove_item(item)
+            if hasattr(item, "toPyObject"):
+                item = item.toPyObject()
+
+            row = self._row(item.key())
+
+            if row is None:
+                LOG.warn("Attempting to remove something I don't have...")
+            else:
+                rows.add(row)
+
+        if not rows:
+            return
+
+        # Remove runs of contiguous rows, starting from the bottom so the
+        # rows we have yet to remove do not shift.
+        rows = sorted(rows, reverse=True)
+        last = first = rows[0]
+
+        for row in rows[1:]:
+            if row == first - 1:
+                first = row
+                continue
+
+            self._remove_range(first, last - first + 1)
+            last = first = row
+
+        self._remove_range(first, last - first + 1)
+        self._storage.reindex(first)
+
+    def _remove_range(self, row, count, parent=QtCore.QModelIndex()):
+        """Remove `count` rows starting at `row` without reindexing the rows
+        which follow them.
+        """
+        self.beginRemoveRows(parent, row, row + count - 1)
+        self._storage.remove(row, count)
+        self.endRemoveRows()
 
     def removeRow(self, row, parent=QtCore.QModelIndex()):
         """Remove the item found at the `row` from the model."""
-        self.beginRemoveRows(parent, row, row)
-        del self._data[row]
-        self.endRemoveRows()
+        self.removeRows(row, 1, parent)
+        return True
 
     def removeRows(self, row, count, parent=QtCore.QModelIndex()):
         """Remove the items starting at `row` and ending at `row` + count."""
-        self.beginRemoveRows(parent, row, row + count)
-
-        for idx in xrange(row, row + count):
-            del self._data[idx]
-
-        self.endRemoveRows()
+        self._remove_range(row, count, parent)
+        self._storage.reindex(row)
+        return True
 
     def headerData(self, column, orientation, role=None):
         if role != Qt.DisplayRole:
@@ -592,51 +633,74 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         return None
 
     def items(self):
-        """Return the model items."""
-        return self._data
+        """Return the model items. These are ValidateTableItem objects or,
+        for column storage, storage.ColumnRow objects.
+        """
+        return self._storage.items()
 
     def reset_results(self):
         """Resets the results on all the items in the model."""
         LOG.debug("Resetting model item results.")
 
-        if not self._data:
-            return
+        rows = len(self._storage)
 
-        for item in self._data:
-            item.results = None
+        if not rows:
+            return
 
-        cols  = len(self.COLUMNS)
-        rows  = len(self._data)
+        self._storage.fill(storage.COL_RESULTS, None)
 
-        start = self.index(0, cols)
-        end   = self.index(rows, cols)
+        start = self.index(0, 0)
+        end   = self.index(rows - 1, len(self.COLUMNS) - 1)
         self.dataChanged.emit(start, end)
 
     @QtCore.pyqtSlot(str)
-    def _notify_updated(self, itemid):
+    def notify_updated(self, itemid):
         """Notify the view that the row for the given `itemid` needs to be
-        redrawn since its results have changed..
+        redrawn since its results have changed.
         """
-        items = self._data
-        idx   = next(x for x, item in enumerate(items) if item.key() == itemid)
+        idx = self._row(itemid)
+
+        if idx is None:
+            LOG.debug("Ignoring update for removed item %s", itemid)
+            return
+
+        self._storage.refresh(idx)
         start = self.index(idx, 0)
-        end   = self.index(idx, len(self.COLUMNS))
+        end   = self.index(idx, len(self.COLUMNS) - 1)
+        self.dataChanged.emit(start, end)
+
+    def notify_updated_many(self, itemids):
+        """Notify the view that the rows for the `itemids` need to be
+        redrawn.
+
+        A single dataChanged signal covering every affected row is emitted.
+
+        Args:
+            itemids: A list of ValidateTableItem key() values.
+        """
+        rows = [self._row(x) for x in itemids]
+        rows = [x for x in rows if x is not None]
+
+        if not rows:
+            return
+
+        for row in rows:
+            self._storage.refresh(row)
+
+        start = self.index(min(rows), 0)
+        end   = self.index(max(rows), len(self.COLUMNS) - 1)
         self.dataChanged.emit(start, end)
 
     def enable_best_practices(self, enabled=True):
         """Enable/Disable best practices validation for all items in the
         model.
         """
-        for item in self._data:
-            item.validate_best_practices = enabled
-
+        self._storage.fill(storage.COL_BEST_PRACTICES, enabled)
         self.reset_results()
 
     def enable_profile(self, enabled=True):
         """Enable/Disable profile validation for all items in the model."""
-        for item in self._data:
-            item.validate_stix_profile = enabled
-
+        self._storage.fill(storage.COL_PROFILE, enabled)
         self.reset_results()
 
     def lookup(self, itemid):
@@ -648,7 +712,9 @@ class ValidateTableModel(QtCore.QAbstractTableModel):
         Raises:
             KeyError: If no model items have a key() which matches `itemid`.
         """
-        try:
-            return next(item for item in self._data if item.key() == itemid)
-        except StopIteration:
+        row = self._row(itemid)
+
+        if row is None:
             raise KeyError("Unknown itemid: %s" % itemid)
+
+        return self._storage.item(row)
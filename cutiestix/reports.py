@@ -0,0 +1,279 @@
+"""
+This module contains report writers which stream validation results to a
+file as each document completes.
+
+Writers hold no per-document state, so memory use is constant regardless of
+the number of documents validated:
+
+>>> with open("report.jsonl", "w") as f:
+>>>     writer = get_writer("jsonl", f)
+>>>     for task, results in validation.run(tasks):
+>>>         writer.write(task, results)
+>>>     writer.close()
+"""
+
+# stdlib
+import csv
+import json
+import logging
+from xml.sax.saxutils import escape, quoteattr
+
+# internal
+from . import validation
+
+
+LOG = logging.getLogger(__name__)
+
+# The keys of each records() dictionary, in CSV column order.
+RECORD_FIELDS = ("filename", "stix_version", "status", "stage", "line",
+                 "message", "title", "tag", "id", "idref")
+
+
+def _text(value):
+    """Return `value` as a native string. Unicode values are UTF-8 encoded
+    under Python 2 and None becomes an empty string.
+    """
+    if value is None:
+        return ""
+
+    if isinstance(value, str):
+        return value
+
+    try:
+        return value.encode("utf-8")
+    except AttributeError:
+        return str(value)
+
+
+def _errors(results):
+    """Return a list of {line, message} dictionaries for the XML Schema or
+    STIX Profile validation `results`.
+    """
+    return [{'line': x.line, 'message': x.message} for x in results.errors]
+
+
+def records(task, results):
+    """Yield a flat dictionary for each problem found in the `results` for
+    the validation.ValidationTask `task`.
+
+    Every record has the keys in RECORD_FIELDS. A document which has no
+    problems yields a single record with an empty ``stage``.
+    """
+    status = validation.status(results)
+    base   = {
+        'filename': task.filename,
+        'stix_version': task.stix_version,
+        'status': status
+    }
+
+    def record(**kwargs):
+        rec = dict.fromkeys(RECORD_FIELDS)
+        rec.update(base)
+        rec.update(kwargs)
+        return rec
+
+    if status == "error":
+        yield record(stage="error", message=str(results))
+        return
+
+    found = False
+
+    for stage in ("xml", "profile"):
+        stage_results = getattr(results, stage)
+
+        if stage_results is None or stage_results.is_valid:
+            continue
+
+        for error in stage_results.errors:
+            found = True
+            yield record(stage=stage, line=error.line, message=error.message)
+
+    bp = results.best_practices
+
+    if bp is not None and not bp.is_valid:
+        for warn in validation.best_practice_warnings(bp):
+            found = True
+            yield record(stage="best_practices", **warn)
+
+    if not found:
+        yield record()
+
+
+class ReportWriter(object):
+    """Base class for report writers.
+
+    Subclasses implement write() and may override open() and close() to
+    write a header and footer.
+
+    Args:
+        stream: A writable file-like object. Writers do not close it.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.open()
+
+    def open(self):
+        """Write anything that must precede the first result."""
+        pass
+
+    def write(self, task, results):
+        """Write the `results` for the validation.ValidationTask `task`.
+
+        Args:
+            task: A validation.ValidationTask.
+            results: A ValidationResults object or the Exception raised
+                while validating the task document.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """Write anything that must follow the last result and flush the
+        stream.
+        """
+        self._stream.flush()
+
+
+class TextWriter(ReportWriter):
+    """Writes one status line per document followed by an indented line per
+    validation problem.
+    """
+
+    def write(self, task, results):
+        status = validation.status(results)
+        lines  = ["%s: %s" % (status.upper(), _text(task.filename))]
+
+        for rec in records(task, results):
+            if not rec['stage']:
+                continue
+
+            if rec['stage'] == "error":
+                lines.append("    error: %s" % _text(rec['message']))
+            elif rec['stage'] == "best_practices":
+                detail = rec['message'] or rec['tag']
+                lines.append("    best practices: %s: line %s: %s" % (
+                    _text(rec['title']), _text(rec['line']), _text(detail)
+                ))
+            else:
+                lines.append("    %s: line %s: %s" % (
+                    rec['stage'], _text(rec['line']), _text(rec['message'])
+                ))
+
+        self._stream.write("\n".join(lines) + "\n")
+        self._stream.flush()
+
+
+class JsonLinesWriter(ReportWriter):
+    """Writes one JSON object per document, one document per line."""
+
+    def _stage(self, results):
+        if results is None:
+            return None
+
+        return {'valid': results.is_valid, 'errors': _errors(results)}
+
+    def write(self, task, results):
+        status = validation.status(results)
+        doc    = {
+            'filename': task.filename,
+            'stix_version': task.stix_version,
+            'status': status
+        }
+
+        if status == "error":
+            doc['error'] = str(results)
+        else:
+            bp = results.best_practices
+            doc['xml'] = self._stage(results.xml)
+            doc['profile'] = self._stage(results.profile)
+            doc['best_practices'] = None
+
+            if bp is not None:
+                doc['best_practices'] = {
+                    'valid': bp.is_valid,
+                    'warnings': list(validation.best_practice_warnings(bp))
+                }
+
+        self._stream.write(json.dumps(doc, sort_keys=True, default=str) + "\n")
+        self._stream.flush()
+
+
+class CsvWriter(ReportWriter):
+    """Writes one CSV row per validation problem, or a single row for a
+    document with no problems. Columns are given by RECORD_FIELDS.
+    """
+
+    def open(self):
+        self._writer = csv.writer(self._stream)
+        self._writer.writerow(RECORD_FIELDS)
+
+    def write(self, task, results):
+        for rec in records(task, results):
+            self._writer.writerow([_text(rec[x]) for x in RECORD_FIELDS])
+
+        self._stream.flush()
+
+
+class JUnitWriter(ReportWriter):
+    """Writes a JUnit XML report with one testcase per document.
+
+    Invalid documents are reported as failures and documents which could not
+    be validated as errors. Because results are streamed, the testsuite
+    element does not carry the optional tests/failures/errors counts.
+    """
+
+    def open(self):
+        self._stream.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._stream.write('<testsuites>\n<testsuite name="cutiestix">\n')
+
+    def write(self, task, results):
+        status = validation.status(results)
+        name   = quoteattr(_text(task.filename))
+        cls    = quoteattr("stix-%s" % _text(task.stix_version))
+        out    = ['  <testcase classname=%s name=%s>' % (cls, name)]
+
+        if status == "error":
+            out.append('    <error message=%s/>' % quoteattr(_text(results)))
+        elif status == "invalid":
+            lines = []
+
+            for rec in records(task, results):
+                detail = rec['message'] or rec['tag']
+                lines.append("%s: line %s: %s" % (
+                    rec['stage'], _text(rec['line']), _text(detail)
+                ))
+
+            out.append('    <failure message="%d problems">%s</failure>' % (
+                len(lines), escape("\n".join(lines))
+            ))
+
+        out.append('  </testcase>\n')
+        self._stream.write("\n".join(out))
+        self._stream.flush()
+
+    def close(self):
+        self._stream.write('</testsuite>\n</testsuites>\n')
+        super(JUnitWriter, self).close()
+
+
+# Report format name => ReportWriter class
+WRITERS = {
+    'text': TextWriter,
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'junit': JUnitWriter
+}
+
+
+def get_writer(fmt, stream):
+    """Return a ReportWriter for the format `fmt` which writes to `stream`.
+
+    Raises:
+        KeyError: If `fmt` is not a known report format.
+    """
+    try:
+        cls = WRITERS[fmt]
+    except KeyError:
+        raise KeyError("Unknown report format: %s" % fmt)
+
+    return cls(stream)
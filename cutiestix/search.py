@@ -0,0 +1,237 @@
+"""
+This module contains the search index used to filter validation results.
+
+A ResultsIndex is built once per set of results. After that each query is
+answered from the index, so filtering stays interactive for reports with
+hundreds of thousands of rows. Nothing in here depends on Qt.
+
+Queries are whitespace-separated terms, and every term must match:
+
+* ``field:value`` matches rows whose field starts with ``value``. The fields
+  are given by ResultsIndex.FIELDS.
+* Any other term matches rows whose message contains a word starting with
+  that term.
+
+>>> index = ResultsIndex.from_errors(results.xml.errors)
+>>> index.search("line:12 unexpected")
+[12, 40, 41]
+"""
+
+# stdlib
+import re
+import bisect
+import logging
+import collections
+
+
+LOG = logging.getLogger(__name__)
+
+# Splits message text into indexable words.
+_RE_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Return the set of lowercase words in `text`."""
+    if not text:
+        return set()
+
+    return set(_RE_TOKEN.findall(_lower(text)))
+
+
+def _lower(value):
+    """Return `value` as a lowercase string."""
+    try:
+        return value.lower()
+    except AttributeError:
+        return str(value).lower()
+
+
+class _PrefixMap(object):
+    """Maps string keys to lists of postings and finds every key which
+    starts with a prefix.
+    """
+
+    def __init__(self):
+        self.postings = collections.defaultdict(list)
+        self._keys = None  # sorted keys, built on first lookup
+
+    def keys(self, prefix):
+        """Return a list of every key which starts with `prefix`."""
+        if self._keys is None:
+            self._keys = sorted(self.postings)
+
+        keys  = self._keys
+        start = bisect.bisect_left(keys, prefix)
+        end   = start
+
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+
+        return keys[start:end]
+
+    def lookup(self, prefix):
+        """Return the set of postings for every key which starts with
+        `prefix`.
+        """
+        postings = self.postings
+        matched  = set()
+
+        for key in self.keys(prefix):
+            matched.update(postings[key])
+
+        return matched
+
+
+class ResultsIndex(object):
+    """An index over the rows of a validation report.
+
+    Each searchable field is indexed the first time it is searched, with a
+    single pass over the rows, and reused for every later query.
+
+    Message text is indexed in two levels. Rows are first grouped by their
+    exact message, since validation messages mostly come from a small set of
+    templates. An inverted word index is then built over only the distinct
+    messages. The other FIELDS each get a map from lowercase value to rows.
+
+    Args:
+        rows: A sequence of report rows.
+        getters: A dictionary mapping ``message`` and any of the FIELDS to a
+            callable which returns that value for a row, or None.
+    """
+
+    # Fields which can be searched with a "field:value" query term.
+    FIELDS = ("title", "tag", "id", "idref", "line")
+
+    def __init__(self, rows, getters):
+        self._rows = rows
+        self._getters = getters
+        self._maps = {}     # field => _PrefixMap of value => rows
+        self._words = None  # _PrefixMap of word => messages
+
+    def __len__(self):
+        return len(self._rows)
+
+    @classmethod
+    def from_errors(cls, errors):
+        """Return a ResultsIndex for a list of XML Schema or STIX Profile
+        validation errors. Rows are positions in `errors`.
+        """
+        getters = {
+            'message': lambda x: x.message,
+            'line': lambda x: x.line
+        }
+
+        return cls(errors, getters)
+
+    @classmethod
+    def from_warnings(cls, warnings):
+        """Return a ResultsIndex for a list of (collection name, warning)
+        tuples, where each warning is a stix-validator BestPracticeWarning or
+        a validation.DetachedWarning. Rows are positions in `warnings`.
+        """
+        def getter(key):
+            return lambda x: x[1].get(key)
+
+        getters = dict((x, getter(x)) for x in ("message",) + cls.FIELDS)
+        getters['title'] = lambda x: x[0]
+
+        return cls(warnings, getters)
+
+    def _map(self, field):
+        """Return the _PrefixMap for `field`, building it if necessary.
+
+        Values are lowercased, except for messages which are kept intact
+        so they can be tokenized later.
+        """
+        try:
+            return self._maps[field]
+        except KeyError:
+            pass
+
+        prefixmap = _PrefixMap()
+        postings  = prefixmap.postings
+        getter    = self._getters.get(field)
+        values    = map(getter, self._rows) if getter else ()
+        lower     = field != "message"
+
+        for row, value in enumerate(values):
+            if value is None:
+                continue
+
+            if lower:
+                value = _lower(value)
+
+            postings[value].append(row)
+
+        self._maps[field] = prefixmap
+        return prefixmap
+
+    def _word_index(self):
+        """Return the word => messages map, building it if necessary."""
+        if self._words is not None:
+            return self._words
+
+        words = _PrefixMap()
+
+        for message in self._map("message").postings:
+            for word in tokenize(message):
+                words.postings[word].append(message)
+
+        self._words = words
+        return words
+
+    def _word_rows(self, prefix):
+        """Return the set of rows whose message has a word starting with
+        `prefix`.
+        """
+        messages = self._map("message").postings
+        rows     = set()
+
+        for message in self._word_index().lookup(prefix):
+            rows.update(messages[message])
+
+        return rows
+
+    def _term_rows(self, term):
+        """Return the set of rows which match the query `term`, or None if
+        the term has no words to match, e.g. ``-``.
+        """
+        name, sep, value = term.partition(":")
+
+        if sep and name in self.FIELDS:
+            return self._map(name).lookup(value)
+
+        rows = None
+
+        # A term like "foo-bar" holds several words, all of which must match.
+        for word in sorted(tokenize(term)):
+            matched = self._word_rows(word)
+            rows = matched if rows is None else rows & matched
+
+            if not rows:
+                break
+
+        return rows
+
+    def search(self, query):
+        """Return a sorted list of the rows which match every term in the
+        `query`. Terms without any words are ignored, and a query with no
+        other terms matches every row.
+        """
+        rows = None
+
+        for term in _lower(query or "").split():
+            matched = self._term_rows(term)
+
+            if matched is None:
+                continue
+
+            rows = matched if rows is None else rows & matched
+
+            if not rows:
+                return []
+
+        if rows is None:
+            return list(range(len(self._rows)))
+
+        return sorted(rows)
@@ -9,3 +9,46 @@ VALIDATE_STIX_PROFILE = False
 # Files to use in validation
 STIX_PROFILE_FILENAME = None
 XML_SCHEMA_DIR = None
+
+# Number of worker processes used for validation. A value of 1 validates
+# documents in the worker thread; a value less than 1 uses one process per CPU.
+VALIDATION_PROCESSES = 1
+
+# The order in which documents are validated: "table", "largest-first" or
+# "smallest-first". See validation.SCHEDULERS.
+VALIDATION_SCHEDULER = "table"
+
+# Seconds between batched validation progress updates sent to the GUI. If 0,
+# the GUI is notified as each document is validated.
+NOTIFY_INTERVAL = 0.05
+
+# If set, validation results are written to this file as each document
+# completes, using REPORT_FORMAT: "text", "jsonl", "csv" or "junit". See
+# reports.WRITERS.
+REPORT_FILENAME = None
+REPORT_FORMAT = "jsonl"
+
+# How the main table stores its rows: "rows" (one record per file) or
+# "columns" (one array per column). See storage.STORAGES.
+TABLE_STORAGE = "rows"
+
+# Reuse validation results for documents that have not changed since they
+# were last validated with the same options.
+RESULT_CACHE = True
+
+# Remember which files are STIX documents so unchanged files are not read
+# again when they are added a second time.
+SNIFF_CACHE = True
+
+# Directory for on-disk caches. If None, ~/.cutiestix is used.
+CACHE_DIR = None
+
+# Number of threads used to sniff files while adding them.
+INGEST_THREADS = 8
+
+# If set, a Trace Event Format timeline of validation, ingestion and GUI
+# updates is written to this file. See tracing.py.
+TRACE_FILENAME = None
+
+# The maximum number of events kept in memory while tracing.
+TRACE_MAX_EVENTS = 2000000
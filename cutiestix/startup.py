@@ -0,0 +1,156 @@
+"""
+This module contains the startup-time instrumentation for the GUI.
+
+An ImportTimer records how long every module import takes, and mark()
+records when each startup milestone (imports done, window built, first
+paint) is reached. The launcher prints both with --import-times. Nothing in
+here depends on Qt, and it should be imported before anything it measures.
+
+>>> timer = ImportTimer()
+>>> timer.install()
+>>> from cutiestix import window
+>>> timer.uninstall()
+>>> print(timer.report())
+"""
+
+# stdlib
+import sys
+from timeit import default_timer as timer
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+
+# The timer() value when this module was imported. Milestones are relative
+# to it.
+STARTED = timer()
+
+# (label, seconds since STARTED) tuples recorded by mark().
+MILESTONES = []
+
+
+class ImportTimer(object):
+    """Times module imports by wrapping ``__import__``.
+
+    Every import statement which loads new modules is recorded with its
+    self time, which excludes imports nested inside it, and its cumulative
+    time. Imports of modules that are already loaded are not recorded; their
+    cost is counted in the self time of the importing module.
+
+    Attributes:
+        records: A list of (module, self seconds, cumulative seconds, depth)
+            tuples in the order the imports finished.
+    """
+
+    def __init__(self):
+        self.records = []
+
+        self._import = None
+        self._stack = []    # [child seconds, modules] per import in progress
+        self._known = set()
+        self._count = 0     # len(sys.modules) when _known was last updated
+
+    def install(self):
+        """Start timing imports."""
+        if self._import is not None:
+            return
+
+        self._known = set(sys.modules)
+        self._count = len(sys.modules)
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """Stop timing imports."""
+        if self._import is None:
+            return
+
+        builtins.__import__ = self._import
+        self._import = None
+
+    def _claim(self):
+        """Assign modules added to sys.modules since the last call to the
+        innermost import in progress.
+
+        A module is added to sys.modules before its body runs, so this is
+        called when each import starts as well as when it finishes.
+        """
+        if len(sys.modules) == self._count:
+            return
+
+        loaded = [x for x in sys.modules if x not in self._known]
+        self._count = len(sys.modules)
+        self._known.update(loaded)
+
+        if self._stack:
+            # Python 2 stores None for failed implicit relative imports.
+            modules = self._stack[-1][1]
+            modules.extend(x for x in loaded if sys.modules[x] is not None)
+
+    def _timed_import(self, *args, **kwargs):
+        self._claim()
+        self._stack.append([0.0, []])
+        start = timer()
+
+        try:
+            return self._import(*args, **kwargs)
+        finally:
+            elapsed = timer() - start
+            self._claim()
+            children, modules = self._stack.pop()
+
+            if modules:
+                self._record(modules, elapsed, children)
+
+    def _record(self, modules, elapsed, children):
+        """Record an import which loaded the list of `modules`."""
+        if self._stack:
+            self._stack[-1][0] += elapsed
+
+        # A package and its submodule may be loaded by one statement, e.g.
+        # "import sdv.utils". Report the shortest name and a count.
+        names = sorted(modules, key=len)
+        name  = names[0]
+
+        if len(names) > 1:
+            name = "%s (+%d)" % (name, len(names) - 1)
+
+        self.records.append((name, elapsed - children, elapsed,
+                             len(self._stack)))
+
+    def total(self):
+        """Return the seconds spent in top-level imports."""
+        return sum(x[2] for x in self.records if x[3] == 0)
+
+    def report(self, limit=30):
+        """Return a table of the `limit` slowest imports by self time."""
+        lines = [
+            "imports: %.1f ms in %d statements" % (self.total() * 1000.0,
+                                                   len(self.records)),
+            "%10s %10s  %s" % ("self ms", "cumul ms", "module")
+        ]
+
+        ranked = sorted(self.records, key=lambda x: x[1], reverse=True)
+
+        for name, own, cumulative, _ in ranked[:limit]:
+            lines.append("%10.1f %10.1f  %s" % (own * 1000.0,
+                                                cumulative * 1000.0, name))
+
+        return "\n".join(lines)
+
+
+def mark(label):
+    """Record that the startup milestone `label` has been reached."""
+    MILESTONES.append((label, timer() - STARTED))
+
+
+def report():
+    """Return a table of the milestones recorded by mark()."""
+    lines = ["%10s  %s" % ("ms", "milestone")]
+
+    for label, seconds in MILESTONES:
+        lines.append("%10.1f  %s" % (seconds * 1000.0, label))
+
+    return "\n".join(lines)
@@ -0,0 +1,582 @@
+"""
+This module contains the row storage used by ValidateTableModel.
+
+Two storage backends are available (see STORAGES):
+
+* ``rows``: A list of ValidateTableItem records, one per table row.
+* ``columns``: Parallel arrays holding each column of the table, with
+  validation results kept in a side table. Cell reads are list/array
+  lookups and bulk operations such as enabling best practice validation for
+  every row are single column writes.
+
+Nothing in here depends on Qt.
+"""
+
+# stdlib
+import os
+import logging
+from array import array
+
+# internal
+from . import utils
+from . import settings
+
+
+LOG = logging.getLogger(__name__)
+
+# Status codes
+STATUS_PENDING = 0  # No validation results.
+STATUS_VALID   = 1
+STATUS_INVALID = 2
+STATUS_ERROR   = 3  # An exception was raised during validation.
+
+# Table column numbers
+COL_FILENAME       = 0
+COL_STIX_VERSION   = 1
+COL_BEST_PRACTICES = 2
+COL_PROFILE        = 3
+COL_RESULTS        = 4
+
+# Each row caches a status code per column, packed two bits per code into a
+# single byte. These are the bit offsets of each column's code. The filename
+# and STIX version columns both show the XML validation status.
+_SHIFTS = (0, 0, 2, 4, 6)
+
+# The packed status of a row whose validation raised an exception.
+_PACKED_ERROR = 0xFF
+
+
+def _stage_code(results):
+    """Return the status code for the results of a single validation stage."""
+    return STATUS_VALID if results.is_valid else STATUS_INVALID
+
+
+def pack_status(results):
+    """Return the packed per-column status byte for validation `results`,
+    which may be None, a ValidationResults object or an Exception.
+
+    Columns with results for their own validation stage get the status of
+    that stage. The best practice and profile columns fall back to the XML
+    validation status when their stage has no results, and the results
+    column holds the overall status.
+    """
+    if results is None:
+        return 0
+    elif isinstance(results, Exception):
+        return _PACKED_ERROR
+    elif results.xml is None:
+        return 0
+
+    stages  = results.xml, results.profile, results.best_practices
+    valid   = all(getattr(x, 'is_valid', True) is True for x in stages)
+    xml     = _stage_code(results.xml)
+    bp      = _stage_code(results.best_practices) if results.best_practices else xml
+    profile = _stage_code(results.profile) if results.profile else xml
+    overall = STATUS_VALID if valid else STATUS_INVALID
+
+    return xml | (bp << 2) | (profile << 4) | (overall << 6)
+
+
+def unpack_status(packed, col=COL_RESULTS):
+    """Return the STATUS_* code for the column `col` from the pack_status()
+    byte `packed`.
+    """
+    return (packed >> _SHIFTS[col]) & 0x3
+
+
+class IndexedModelItem(object):
+    """Used for model row data that can be accessed by column number or
+    attribute name.
+
+    This is useful in QAbstractTableModel data() and setData() methods which
+    are passed QModelIndex objects, and thus refer to columns and rows by
+    index values.
+
+    Example:
+        >>> class Foo(IndexedModelItem):
+        >>>     _attrs = ("foo", "bar")
+        >>>
+        >>> f = Foo(foo=True, bar=False)
+        >>> print f[0]
+        True
+        >>> print f.foo
+        True
+        >>> print f[1]
+        False
+        >>> print f.bar
+        False
+
+    Subclasses should declare ``__slots__`` (usually equal to ``_attrs``) so
+    instances do not carry a per-instance ``__dict__``.
+    """
+    __slots__ = ()
+
+    _attrs = tuple()  # Index-accessible attributes
+
+    def __init__(self, **kwargs):
+        super(IndexedModelItem, self).__init__()
+
+        for attr in self._attrs:
+            setattr(self, attr, kwargs.get(attr))
+
+    def __getitem__(self, index):
+        """Return the value for the `index`.
+
+        Args:
+            index: A integer index.
+
+        Returns:
+            The value associated with the index.
+
+        Raises:
+            TypeError: If `index` cannot be translated to an int.
+            ValueError: If `index` cannot be translated to an int.
+        """
+        index = int(index)
+        attr  = self._attrs[index]
+        return getattr(self, attr)
+
+    def __setitem__(self, index, value):
+        """Set the `value` for the `index`.
+
+        Args:
+            index: An integer index.
+            value: A value.
+
+        Returns:
+            The value associated with the index.
+
+        Raises:
+            TypeError: If `index` cannot be translated to an int.
+            ValueError: If `index` cannot be translated to an int.
+        """
+        index = int(index)
+        attr  = self._attrs[index]
+        setattr(self, attr, value)
+
+
+
+class ValidateTableItem(IndexedModelItem):
+    """Used for ValidationTableModel entries.
+
+    Items are plain slotted records so that a table with hundreds of
+    thousands of rows stays small. They do not notify anyone when their
+    results change; whoever sets the results tells the ValidateTableModel
+    via notify_updated() or notify_updated_many().
+    """
+    _attrs = ("filename", "stix_version", "validate_best_practices",
+              "validate_stix_profile", "results")
+    __slots__ = _attrs + ("size", "status")
+
+    def __init__(self):
+        IndexedModelItem.__init__(
+            self,
+            filename=None,
+            stix_version=None,
+            validate_stix_profile=settings.VALIDATE_STIX_PROFILE,
+            validate_best_practices=settings.VALIDATE_STIX_BEST_PRACTICES,
+            results=None
+        )
+
+        self.size = None
+        self.status = 0  # See pack_status()
+
+    def key(self):
+        """Return a key for this item. This is the str(id(self)).
+
+        This can be used for lookup within a table model.
+
+        Note:
+            Initially this returned ``id(self)`` but was changed due to integer
+            overflow issues that can occur between 64bit Python and Qt when
+            emitting integer data.
+
+            I could have gotten around this by defining my signals as
+            ``pyqtSignal('long long')`` but found that out after using
+            ``str`` everywhere.
+
+            The key is built on demand rather than stored so that each item
+            does not carry its own string.
+        """
+        return str(id(self))
+
+    @classmethod
+    def from_file(cls, fn):
+        """Return a ValidateTableItem instance for the input filename.
+
+        Args:
+            fn: A filename.
+
+        Returns:
+            A ValidateTableItem object.
+        """
+        sniffed = utils.sniff(fn)
+
+        item = cls()
+        item.filename = os.path.abspath(fn)
+        item.stix_version = sniffed.version
+        item.size = sniffed.size
+
+        return item
+
+    @classmethod
+    def from_document(cls, doc):
+        """Return a ValidateTableItem instance for a STIX document found
+        during ingestion.
+
+        Args:
+            doc: An ingest.Document.
+
+        Returns:
+            A ValidateTableItem object.
+        """
+        item = cls()
+        item.filename = doc.filename
+        item.stix_version = doc.stix_version
+        item.size = doc.size
+
+        return item
+
+
+
+class RowStorage(object):
+    """Stores table rows as a list of ValidateTableItem records.
+
+    The storage keeps an index of item key() values to row numbers so item
+    lookups do not have to scan the table.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._index = {}  # item.key() => row
+
+    def __len__(self):
+        return len(self._items)
+
+    def reindex(self, start=0):
+        """Rebuild the key => row index for every row from `start` onward."""
+        index = self._index
+        items = self._items
+
+        for row in range(start, len(items)):
+            index[items[row].key()] = row
+
+    def row(self, key):
+        """Return the row for the `key` or None if there is no such row."""
+        return self._index.get(str(key))
+
+    def key(self, row):
+        """Return the key for the `row`."""
+        return self._items[row].key()
+
+    def item(self, row):
+        """Return the ValidateTableItem for the `row`."""
+        return self._items[row]
+
+    def items(self):
+        """Return a list of the ValidateTableItem for every row."""
+        return self._items
+
+    def value(self, row, col):
+        """Return the value of the cell at (`row`, `col`)."""
+        return self._items[row][col]
+
+    def set_value(self, row, col, value):
+        """Set the value of the cell at (`row`, `col`)."""
+        self._items[row][col] = value
+
+        if col == COL_RESULTS:
+            self.refresh(row)
+
+    def status(self, row, col=COL_RESULTS):
+        """Return the cached STATUS_* code for the cell at (`row`, `col`)."""
+        return unpack_status(self._items[row].status, col)
+
+    def refresh(self, row):
+        """Update the cached status for the `row` from its results. Call this
+        after results have been set on a row item.
+        """
+        item = self._items[row]
+        item.status = pack_status(item.results)
+
+    def extend(self, documents):
+        """Append a row for each ingest.Document in `documents`."""
+        first = len(self._items)
+        self._items.extend(ValidateTableItem.from_document(x) for x in documents)
+        self.reindex(first)
+
+    def remove(self, row, count):
+        """Remove `count` rows starting at `row`.
+
+        The rows which follow the removed rows are not reindexed. Call
+        reindex() once all removals are done.
+        """
+        for item in self._items[row:row + count]:
+            self._index.pop(item.key(), None)
+
+        del self._items[row:row + count]
+
+    def fill(self, col, value):
+        """Set the value of every cell in the column `col` to `value`."""
+        for item in self._items:
+            item[col] = value
+
+        if col == COL_RESULTS:
+            for row in range(len(self._items)):
+                self.refresh(row)
+
+    def clear(self):
+        """Remove every row."""
+        self._items = []
+        self._index = {}
+
+
+class ColumnRow(object):
+    """A view of a single ColumnStorage row which can be used in place of a
+    ValidateTableItem.
+
+    Rows are identified by a row id which does not change when rows are
+    inserted or removed around them. The results of a row may be set from
+    any thread, even after the row has been removed.
+    """
+    __slots__ = ("_storage", "_id")
+
+    def __init__(self, storage, rowid):
+        self._storage = storage
+        self._id = rowid
+
+    def key(self):
+        """Return the key of this row. See ValidateTableItem.key()."""
+        return str(self._id)
+
+    def _row(self):
+        row = self._storage._index.get(self._id)
+
+        if row is None:
+            raise KeyError("Row has been removed: %s" % self._id)
+
+        return row
+
+    def __getitem__(self, index):
+        return self._storage.value(self._row(), int(index))
+
+    def __setitem__(self, index, value):
+        self._storage.set_value(self._row(), int(index), value)
+
+    @property
+    def filename(self):
+        return self._storage._filenames[self._row()]
+
+    @property
+    def stix_version(self):
+        return self._storage._versions[self._row()]
+
+    @property
+    def validate_best_practices(self):
+        return bool(self._storage._best_practices[self._row()])
+
+    @property
+    def validate_stix_profile(self):
+        return bool(self._storage._profile[self._row()])
+
+    @property
+    def size(self):
+        size = self._storage._sizes[self._row()]
+        return None if size < 0 else int(size)
+
+    @property
+    def results(self):
+        return self._storage._results.get(self._id)
+
+    @results.setter
+    def results(self, value):
+        self._storage._set_results(self._id, value)
+
+
+class ColumnStorage(object):
+    """Stores table rows as parallel column arrays.
+
+    Row ids, filenames and STIX versions are held in lists, sizes in an
+    array and the validation flags and packed row status in bytearrays. Validation results
+    are kept in a side table keyed by row id since most rows have no results
+    until they are validated.
+    """
+
+    def __init__(self):
+        self._next = 0
+        self.clear()
+
+    def clear(self):
+        """Remove every row."""
+        # A C long is 32 bits on Windows and Python 2 has no 'q' typecode,
+        # so sizes are stored as doubles, which hold integers exactly up to
+        # 2**53. Row ids are never reused and are kept in a list.
+        self._ids = []
+        self._filenames = []
+        self._versions = []
+        self._sizes = array('d')
+        self._best_practices = bytearray()
+        self._profile = bytearray()
+        self._status = bytearray()
+        self._results = {}  # row id => results
+        self._index = {}    # row id => row
+
+    def __len__(self):
+        return len(self._ids)
+
+    def reindex(self, start=0):
+        """Rebuild the row id => row index for every row from `start`
+        onward.
+        """
+        rows = range(start, len(self._ids))
+        self._index.update(zip(self._ids[start:], rows))
+
+    def row(self, key):
+        """Return the row for the `key` or None if there is no such row."""
+        # PyQt4 passes keys through str signals as QStrings, which int()
+        # does not accept.
+        try:
+            return self._index.get(int(str(key)))
+        except (TypeError, ValueError):
+            return None
+
+    def key(self, row):
+        """Return the key for the `row`."""
+        return str(self._ids[row])
+
+    def item(self, row):
+        """Return a ColumnRow for the `row`."""
+        return ColumnRow(self, self._ids[row])
+
+    def items(self):
+        """Return a list of ColumnRow objects, one for each row."""
+        return [ColumnRow(self, x) for x in self._ids]
+
+    def value(self, row, col):
+        """Return the value of the cell at (`row`, `col`)."""
+        if col == COL_FILENAME:
+            return self._filenames[row]
+        elif col == COL_STIX_VERSION:
+            return self._versions[row]
+        elif col == COL_BEST_PRACTICES:
+            return bool(self._best_practices[row])
+        elif col == COL_PROFILE:
+            return bool(self._profile[row])
+        elif col == COL_RESULTS:
+            return self._results.get(self._ids[row])
+
+        raise IndexError("Invalid column: %s" % col)
+
+    def set_value(self, row, col, value):
+        """Set the value of the cell at (`row`, `col`)."""
+        if col == COL_FILENAME:
+            self._filenames[row] = value
+        elif col == COL_STIX_VERSION:
+            self._versions[row] = value
+        elif col == COL_BEST_PRACTICES:
+            self._best_practices[row] = bool(value)
+        elif col == COL_PROFILE:
+            self._profile[row] = bool(value)
+        elif col == COL_RESULTS:
+            self._set_results(self._ids[row], value)
+            self.refresh(row)
+        else:
+            raise IndexError("Invalid column: %s" % col)
+
+    def _set_results(self, rowid, results):
+        """Set the `results` for the row with the id `rowid`. This does not
+        touch the row index, so it is safe to call from a worker thread.
+        """
+        if results is None:
+            self._results.pop(rowid, None)
+        elif rowid in self._index:
+            self._results[rowid] = results
+
+    def status(self, row, col=COL_RESULTS):
+        """Return the cached STATUS_* code for the cell at (`row`, `col`)."""
+        return unpack_status(self._status[row], col)
+
+    def refresh(self, row):
+        """Update the cached status for the `row` from its results. Call this
+        after results have been set through a ColumnRow.
+        """
+        results = self._results.get(self._ids[row])
+        self._status[row] = pack_status(results)
+
+    def extend(self, documents):
+        """Append a row for each ingest.Document in `documents`."""
+        documents = list(documents)
+        count     = len(documents)
+        first     = len(self._ids)
+        start     = self._next
+
+        self._next += count
+        self._ids.extend(range(start, start + count))
+        self._filenames.extend(x.filename for x in documents)
+        self._versions.extend(x.stix_version for x in documents)
+        self._sizes.extend(-1 if x.size is None else x.size for x in documents)
+
+        best_practices = settings.VALIDATE_STIX_BEST_PRACTICES
+        profile        = settings.VALIDATE_STIX_PROFILE
+
+        self._best_practices.extend(bytearray([bool(best_practices)]) * count)
+        self._profile.extend(bytearray([bool(profile)]) * count)
+        self._status.extend(bytearray(count))
+        self.reindex(first)
+
+    def remove(self, row, count):
+        """Remove `count` rows starting at `row`.
+
+        The rows which follow the removed rows are not reindexed. Call
+        reindex() once all removals are done.
+        """
+        end = row + count
+
+        for rowid in self._ids[row:end]:
+            self._index.pop(rowid, None)
+            self._results.pop(rowid, None)
+
+        for column in (self._ids, self._filenames, self._versions, self._sizes,
+                       self._best_practices, self._profile, self._status):
+            del column[row:end]
+
+    def fill(self, col, value):
+        """Set the value of every cell in the column `col` to `value`."""
+        count = len(self._ids)
+
+        if col == COL_BEST_PRACTICES:
+            self._best_practices[:] = bytearray([bool(value)]) * count
+        elif col == COL_PROFILE:
+            self._profile[:] = bytearray([bool(value)]) * count
+        elif col == COL_RESULTS and value is None:
+            self._results.clear()
+            self._status[:] = bytearray(count)
+        else:
+            for row in range(count):
+                self.set_value(row, col, value)
+
+
+# Storage backend name => storage class
+STORAGES = {
+    'rows': RowStorage,
+    'columns': ColumnStorage
+}
+
+
+def get_storage(name=None):
+    """Return a new storage backend.
+
+    Args:
+        name: A STORAGES key. If None, ``settings.TABLE_STORAGE`` is used.
+
+    Raises:
+        KeyError: If `name` is not a known storage backend.
+    """
+    name = name or settings.TABLE_STORAGE
+
+    try:
+        cls = STORAGES[name]
+    except KeyError:
+        raise KeyError("Unknown table storage: %s" % name)
+
+    return cls()
@@ -0,0 +1,232 @@
+"""
+Tests for the on-disk sniff and result caches.
+"""
+
+# stdlib
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# internal
+from cutiestix import cache
+from cutiestix import ingest
+from cutiestix import utils
+from cutiestix import validation
+
+try:
+    import sdv
+except ImportError:
+    sdv = None
+
+
+STIX_PACKAGE = (
+    b'<stix:STIX_Package xmlns:stix="http://stix.mitre.org/stix-1" '
+    b'version="1.2"/>'
+)
+
+
+def write(path, data=STIX_PACKAGE):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def scan(directory, store):
+    """Scan the `directory` with the sniff cache `store` and return the
+    Documents found.
+    """
+    scanner = ingest.Scanner(threads=1, store=store)
+    return [doc for batch in scanner.scan([directory]) for doc in batch]
+
+
+class SniffCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.docs = os.path.join(self.tmpdir, "docs")
+        self.filename = os.path.join(self.tmpdir, "sniff.db")
+        os.mkdir(self.docs)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def rescan(self):
+        """Scan the docs directory twice with fresh SniffCache instances and
+        return the stores of both scans.
+        """
+        stores = []
+
+        for _ in range(2):
+            store = cache.SniffCache(self.filename).open()
+            self.assertEqual(len(scan(self.docs, store)), 1)
+            store.close()
+            stores.append(store)
+
+        return stores
+
+    def test_round_trip(self):
+        path   = os.path.join(self.docs, "doc.xml")
+        ns     = "http://stix.mitre.org/stix-1"
+        result = utils.SniffResult(True, "1.2", ns, 100)
+
+        store = cache.SniffCache(self.filename).open()
+        store.put(path, 100, 12345, result)
+        store.close()
+
+        store = cache.SniffCache(self.filename).open()
+        self.assertEqual(store.get(path, 100, 12345), result)
+        self.assertEqual(store.get(path, 101, 12345), None)
+        self.assertEqual(store.get(path, 100, 12346), None)
+        self.assertEqual(store.stats(), {'hits': 1, 'misses': 2})
+        store.close()
+
+    def test_changed_file_sniffed_again(self):
+        path = os.path.join(self.docs, "doc.xml")
+        write(path)
+        self.rescan()
+
+        write(path, STIX_PACKAGE.replace(b'"1.2"', b'"1.1.1"'))
+        store = cache.SniffCache(self.filename).open()
+        docs  = scan(self.docs, store)
+        store.close()
+
+        self.assertEqual(store.stats(), {'hits': 0, 'misses': 1})
+        self.assertEqual(docs[0].stix_version, "1.1.1")
+
+    def test_unusable_database(self):
+        write(self.filename, b"not a database" * 100)
+        write(os.path.join(self.docs, "doc.xml"))
+
+        store = cache.SniffCache(self.filename)
+        self.assertEqual(len(scan(self.docs, store)), 1)
+        self.assertTrue(store.disabled)
+
+    def test_non_ascii_path(self):
+        name = u"r\xe9sum\xe9.xml"
+
+        try:
+            # Python 2 walks byte string paths when given a byte string.
+            if sys.version_info[0] < 3:
+                name = name.encode(sys.getfilesystemencoding())
+            else:
+                name.encode(sys.getfilesystemencoding())
+        except (UnicodeError, TypeError):
+            self.skipTest("The filesystem encoding cannot represent %r" % name)
+
+        write(os.path.join(self.docs, name))
+        first, second = self.rescan()
+
+        self.assertEqual(first.stats(), {'hits': 0, 'misses': 1})
+        self.assertEqual(second.stats(), {'hits': 1, 'misses': 0})
+        self.assertFalse(second.disabled)
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "results.db")
+        self.document = os.path.join(self.tmpdir, "doc.xml")
+        write(self.document)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def task(self, **kwargs):
+        return validation.ValidationTask(1, self.document, "1.2", **kwargs)
+
+    def test_round_trip(self):
+        results = validation.ValidationResults()
+        results.xml = validation.DetachedResults(True)
+
+        store = cache.ResultCache(self.filename).open()
+        store.put(self.task(), results, "key")
+        store.close()
+
+        store  = cache.ResultCache(self.filename).open()
+        cached = store.lookup("key")
+
+        self.assertTrue(cached.xml.is_valid)
+        self.assertEqual(store.lookup("other"), None)
+        self.assertEqual(store.stats(), {'hits': 1, 'misses': 1})
+        store.close()
+
+    def test_unusable_database(self):
+        write(self.filename, b"not a database" * 100)
+        store = cache.ResultCache(self.filename)
+
+        self.assertEqual(store.lookup("key"), None)
+        self.assertTrue(store.disabled)
+
+    @unittest.skipIf(sdv is None, "stix-validator is not installed")
+    def test_key_changes(self):
+        store = cache.ResultCache(self.filename)
+        key   = store.key(self.task())
+
+        self.assertEqual(store.key(self.task()), key)
+        self.assertNotEqual(store.key(self.task(validate_best_practices=True)),
+                            key)
+
+        write(self.document, STIX_PACKAGE + b"\n")
+        self.assertNotEqual(store.key(self.task()), key)
+
+
+class SchemaFingerprintTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.nested = os.path.join(self.tmpdir, "stix", "1.2")
+        os.makedirs(self.nested)
+        write(os.path.join(self.nested, "stix_core.xsd"), b"<xs:schema/>")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_nested_schema_edit(self):
+        before = cache.schema_fingerprint(self.tmpdir)
+        write(os.path.join(self.nested, "stix_core.xsd"), b"<xs:schema />")
+        self.assertNotEqual(cache.schema_fingerprint(self.tmpdir), before)
+
+    def test_nested_schema_added(self):
+        before = cache.schema_fingerprint(self.tmpdir)
+        write(os.path.join(self.nested, "stix_common.xsd"), b"<xs:schema/>")
+        self.assertNotEqual(cache.schema_fingerprint(self.tmpdir), before)
+
+    def test_other_files_ignored(self):
+        before = cache.schema_fingerprint(self.tmpdir)
+        write(os.path.join(self.nested, "README.txt"), b"schemas")
+        self.assertEqual(cache.schema_fingerprint(self.tmpdir), before)
+
+    def test_computed_once_per_cache(self):
+        store  = cache.ResultCache(os.path.join(self.tmpdir, "results.db"))
+        before = store._schema_fingerprint(self.tmpdir)
+
+        write(os.path.join(self.nested, "stix_core.xsd"), b"<xs:schema />")
+        self.assertEqual(store._schema_fingerprint(self.tmpdir), before)
+
+        store = cache.ResultCache(os.path.join(self.tmpdir, "results.db"))
+        self.assertNotEqual(store._schema_fingerprint(self.tmpdir), before)
+
+
+class FakeSchemaCache(cache.SchemaCache):
+    def _build(self, version, schema_dir=None):
+        return object()
+
+
+class SchemaCacheTests(unittest.TestCase):
+    def test_shared_by_versions(self):
+        schemas = FakeSchemaCache()
+        built   = schemas.get("1.2")
+
+        self.assertIs(schemas.get("1.1.1"), built)
+        self.assertIs(schemas.get("1.2"), built)
+        self.assertEqual(schemas.misses, 1)
+
+    def test_invalidate(self):
+        schemas = FakeSchemaCache()
+        built   = schemas.get("1.2", "/schemas")
+
+        schemas.invalidate("/schemas")
+        self.assertIsNot(schemas.get("1.2", "/schemas"), built)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Tests for the streaming report writers.
+"""
+
+# stdlib
+import csv
+import json
+import unittest
+import xml.etree.ElementTree as ET
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# internal
+from cutiestix import reports
+from cutiestix import validation
+
+
+def task(filename, version="1.2"):
+    return validation.ValidationTask(filename, filename, version)
+
+
+def valid():
+    results = validation.ValidationResults()
+    results.xml = validation.DetachedResults(True)
+    return results
+
+
+def invalid():
+    results = validation.ValidationResults()
+    results.xml = validation.DetachedResults(True)
+    results.profile = validation.DetachedResults(False, [
+        validation.DetachedError(7, "Missing required field."),
+        validation.DetachedError(9, "Field <Title> & <Description>.")
+    ])
+
+    warning = validation.DetachedWarning(
+        id="example:Package-1", idref=None, tag="stix:STIX_Package", line=2,
+        message=None
+    )
+    collection = validation.DetachedWarningCollection("Missing Titles",
+                                                      [warning])
+    results.best_practices = validation.DetachedBestPracticeResults(
+        False, [collection]
+    )
+
+    return results
+
+
+# (task, results) pairs covering every document status.
+DOCUMENTS = [
+    (task("valid.xml"), valid()),
+    (task("invalid & <odd>.xml", "1.1.1"), invalid()),
+    (task("broken.xml"), Exception("Cannot parse broken.xml"))
+]
+
+
+def report(fmt):
+    """Return the `fmt` report written for the DOCUMENTS."""
+    stream = StringIO()
+    writer = reports.get_writer(fmt, stream)
+
+    for document, results in DOCUMENTS:
+        writer.write(document, results)
+
+    writer.close()
+    return stream.getvalue()
+
+
+class RecordsTests(unittest.TestCase):
+
+    def test_valid(self):
+        records = list(reports.records(*DOCUMENTS[0]))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['status'], "valid")
+        self.assertEqual(records[0]['stage'], None)
+        self.assertEqual(sorted(records[0]), sorted(reports.RECORD_FIELDS))
+
+    def test_invalid(self):
+        records = list(reports.records(*DOCUMENTS[1]))
+        stages  = [(x['stage'], x['line']) for x in records]
+
+        self.assertEqual(stages, [("profile", 7), ("profile", 9),
+                                  ("best_practices", 2)])
+        self.assertEqual(records[2]['title'], "Missing Titles")
+        self.assertEqual(records[2]['tag'], "stix:STIX_Package")
+
+    def test_error(self):
+        records = list(reports.records(*DOCUMENTS[2]))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['stage'], "error")
+        self.assertEqual(records[0]['message'], "Cannot parse broken.xml")
+
+
+class WriterTests(unittest.TestCase):
+
+    def test_unknown_format(self):
+        self.assertRaises(KeyError, reports.get_writer, "yaml", StringIO())
+
+    def test_text(self):
+        lines = report("text").splitlines()
+
+        self.assertEqual(lines, [
+            "VALID: valid.xml",
+            "INVALID: invalid & <odd>.xml",
+            "    profile: line 7: Missing required field.",
+            "    profile: line 9: Field <Title> & <Description>.",
+            "    best practices: Missing Titles: line 2: stix:STIX_Package",
+            "ERROR: broken.xml",
+            "    error: Cannot parse broken.xml"
+        ])
+
+    def test_jsonl(self):
+        docs = [json.loads(x) for x in report("jsonl").splitlines()]
+
+        self.assertEqual([x['status'] for x in docs],
+                         ["valid", "invalid", "error"])
+        self.assertEqual(docs[0]['xml'], {'valid': True, 'errors': []})
+        self.assertEqual(docs[0]['profile'], None)
+        self.assertEqual(docs[1]['stix_version'], "1.1.1")
+        self.assertEqual(len(docs[1]['profile']['errors']), 2)
+        self.assertEqual(docs[1]['best_practices']['warnings'][0]['title'],
+                         "Missing Titles")
+        self.assertEqual(docs[2]['error'], "Cannot parse broken.xml")
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(report("csv"))))
+
+        self.assertEqual(tuple(rows[0]), reports.RECORD_FIELDS)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([x[2] for x in rows[1:]],
+                         ["valid", "invalid", "invalid", "invalid", "error"])
+        self.assertEqual(rows[3][5], "Field <Title> & <Description>.")
+
+    def test_junit(self):
+        suite = ET.fromstring(report("junit")).find("testsuite")
+        cases = suite.findall("testcase")
+
+        self.assertEqual([x.get("name") for x in cases],
+                         [x[0].filename for x in DOCUMENTS])
+        self.assertEqual(cases[1].get("classname"), "stix-1.1.1")
+        self.assertEqual(list(cases[0]), [])
+        self.assertEqual(cases[1].find("failure").get("message"),
+                         "3 problems")
+        self.assertEqual(cases[2].find("error").get("message"),
+                         "Cannot parse broken.xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for searching validation results with a ResultsIndex.
+"""
+
+# stdlib
+import unittest
+
+# internal
+from cutiestix import search
+from cutiestix import validation
+
+
+ERRORS = [
+    validation.DetachedError(12, u"Element 'stix:Title': Unexpected element."),
+    validation.DetachedError(40, u"Element 'stix:Package': Missing child."),
+    validation.DetachedError(41, u"Element 'stix:Title': Unexpected element."),
+    validation.DetachedError(120, u"Attribute 'id': '-' is not a QName."),
+    validation.DetachedError(None, u"Caf\xe9 cr\xe8me is not allowed here."),
+]
+
+WARNINGS = [
+    (u"Missing Titles", validation.DetachedWarning(
+        id=u"example:Package-1", idref=None, tag=u"stix:STIX_Package",
+        line=3, message=None
+    )),
+    (u"Missing Titles", validation.DetachedWarning(
+        id=u"example:Indicator-1", idref=None, tag=u"stix:Indicator",
+        line=10, message=None
+    )),
+    (u"Unresolved IDREFs", validation.DetachedWarning(
+        id=None, idref=u"example:Indicator-2", tag=u"indicator:Indicator",
+        line=22, message=u"No element with this ID."
+    )),
+]
+
+
+class ErrorSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = search.ResultsIndex.from_errors(ERRORS)
+
+    def test_empty_query(self):
+        self.assertEqual(self.index.search(""), [0, 1, 2, 3, 4])
+        self.assertEqual(self.index.search(None), [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.index), 5)
+
+    def test_word_prefix(self):
+        self.assertEqual(self.index.search("unexpect"), [0, 2])
+        self.assertEqual(self.index.search("UNEXPECTED"), [0, 2])
+        self.assertEqual(self.index.search("nomatch"), [])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.index.search("element title"), [0, 2])
+        self.assertEqual(self.index.search("element missing"), [1])
+        self.assertEqual(self.index.search("missing unexpected"), [])
+
+    def test_field_prefix(self):
+        self.assertEqual(self.index.search("line:4"), [1, 2])
+        self.assertEqual(self.index.search("line:12"), [0, 3])
+        self.assertEqual(self.index.search("line:12 unexpected"), [0])
+
+    def test_unsearchable_field(self):
+        # Errors have no tag, so "tag:" terms match nothing.
+        self.assertEqual(self.index.search("tag:stix"), [])
+
+    def test_punctuation_only_terms_ignored(self):
+        self.assertEqual(self.index.search("- title"), [0, 2])
+        self.assertEqual(self.index.search("-"), [0, 1, 2, 3, 4])
+
+    def test_compound_term(self):
+        self.assertEqual(self.index.search("stix:title"), [0, 2])
+
+    def test_non_ascii(self):
+        self.assertEqual(self.index.search(u"caf\xe9"), [4])
+        self.assertEqual(self.index.search(u"CR\xc8ME"), [4])
+
+    def test_repeated_queries(self):
+        for _ in range(2):
+            self.assertEqual(self.index.search("title line:4"), [2])
+
+
+class WarningSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = search.ResultsIndex.from_warnings(WARNINGS)
+
+    def test_title(self):
+        self.assertEqual(self.index.search("title:missing"), [0, 1])
+        self.assertEqual(self.index.search("title:unresolved"), [2])
+
+    def test_fields(self):
+        self.assertEqual(self.index.search("tag:stix:"), [0, 1])
+        self.assertEqual(self.index.search("id:example:indicator"), [1])
+        self.assertEqual(self.index.search("idref:example"), [2])
+        self.assertEqual(self.index.search("line:1"), [1])
+
+    def test_message(self):
+        self.assertEqual(self.index.search("element"), [2])
+        self.assertEqual(self.index.search("element tag:stix"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+Checks that the ``rows`` and ``columns`` table storage backends behave the
+same way.
+"""
+
+# stdlib
+import unittest
+
+# internal
+from cutiestix import ingest
+from cutiestix import storage
+from cutiestix import validation
+
+
+# Larger than a 32-bit C long.
+BIG_SIZE = 5 * 1024 ** 3
+
+
+def documents(count, start=0):
+    return [
+        ingest.Document("/docs/%04d.xml" % idx, "1.2", idx * 1000)
+        for idx in range(start, start + count)
+    ]
+
+
+def results(is_valid):
+    results = validation.ValidationResults()
+    results.xml = validation.DetachedResults(is_valid)
+    return results
+
+
+class QString(object):
+    """Stands in for the PyQt4 API v1 QString that str signals deliver."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def __str__(self):
+        return self._value
+
+
+def snapshot(store):
+    """Return every cell value, size and status of the `store`, and check
+    that its key => row index agrees with its rows.
+    """
+    rows = []
+
+    for row in range(len(store)):
+        assert store.row(store.key(row)) == row
+        item = store.item(row)
+
+        rows.append((
+            tuple(store.value(row, col) for col in range(5)),
+            tuple(store.status(row, col) for col in range(5)),
+            item.filename,
+            item.size
+        ))
+
+    return rows
+
+
+class StorageParityTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stores = [storage.get_storage(x) for x in sorted(storage.STORAGES)]
+
+        for store in self.stores:
+            store.extend(documents(10))
+
+    def assertParity(self):
+        snapshots = [snapshot(x) for x in self.stores]
+
+        for other in snapshots[1:]:
+            self.assertEqual(snapshots[0], other)
+
+        return snapshots[0]
+
+    def test_extend(self):
+        for store in self.stores:
+            store.extend([ingest.Document("/docs/big.xml", "1.1.1", BIG_SIZE),
+                          ingest.Document("/docs/unsized.xml", "1.0", None)])
+
+        rows = self.assertParity()
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[10][3], BIG_SIZE)
+        self.assertEqual(rows[11][3], None)
+
+    def test_unknown_key(self):
+        for store in self.stores:
+            self.assertEqual(store.row("bogus"), None)
+
+    def test_qstring_key(self):
+        for store in self.stores:
+            self.assertEqual(store.row(QString(store.key(3))), 3)
+
+    def test_set_results(self):
+        valid, invalid, error = results(True), results(False), Exception()
+
+        for store in self.stores:
+            store.set_value(1, storage.COL_RESULTS, valid)
+            store.set_value(2, storage.COL_RESULTS, invalid)
+            store.set_value(3, storage.COL_RESULTS, error)
+
+        rows = self.assertParity()
+        self.assertEqual(rows[1][1][storage.COL_RESULTS], storage.STATUS_VALID)
+        self.assertEqual(rows[2][1][storage.COL_RESULTS], storage.STATUS_INVALID)
+        self.assertEqual(rows[3][1][storage.COL_RESULTS], storage.STATUS_ERROR)
+
+    def test_item_results_and_refresh(self):
+        invalid = results(False)
+
+        for store in self.stores:
+            item = store.item(4)
+            item.results = invalid
+            self.assertEqual(store.status(4), storage.STATUS_PENDING)
+
+            store.refresh(4)
+            self.assertEqual(store.status(4), storage.STATUS_INVALID)
+
+        self.assertParity()
+
+    def test_remove_and_reindex(self):
+        valid = results(True)
+
+        for store in self.stores:
+            keys = [store.key(x) for x in range(len(store))]
+            store.set_value(5, storage.COL_RESULTS, valid)
+            store.remove(2, 3)
+            store.reindex(2)
+
+            for key in keys[2:5]:
+                self.assertEqual(store.row(key), None)
+
+            self.assertEqual(store.row(keys[5]), 2)
+
+        rows = self.assertParity()
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[2][2], "/docs/0005.xml")
+
+    def test_remove_then_extend(self):
+        for store in self.stores:
+            store.remove(0, 4)
+            store.reindex()
+            store.extend(documents(3, start=10))
+
+        rows = self.assertParity()
+        self.assertEqual(len(rows), 9)
+
+    def test_fill(self):
+        invalid = results(False)
+
+        for store in self.stores:
+            store.set_value(0, storage.COL_RESULTS, invalid)
+            store.fill(storage.COL_BEST_PRACTICES, True)
+            store.fill(storage.COL_PROFILE, False)
+
+        rows = self.assertParity()
+        self.assertTrue(all(x[0][storage.COL_BEST_PRACTICES] for x in rows))
+
+        for store in self.stores:
+            store.fill(storage.COL_RESULTS, None)
+
+        rows = self.assertParity()
+        self.assertTrue(all(x[0][storage.COL_RESULTS] is None for x in rows))
+        self.assertTrue(all(x[1] == (0,) * 5 for x in rows))
+
+    def test_clear(self):
+        for store in self.stores:
+            store.clear()
+            self.assertEqual(len(store), 0)
+            store.extend(documents(2))
+
+        self.assertEqual(len(self.assertParity()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
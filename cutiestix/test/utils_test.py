@@ -0,0 +1,169 @@
+"""
+Tests for sniffing the STIX namespace and version of a document from its
+prefix.
+"""
+
+# stdlib
+import os
+import codecs
+import shutil
+import tempfile
+import unittest
+
+# internal
+from cutiestix import utils
+
+
+STIX_NS = "http://stix.mitre.org/stix-1"
+
+PACKAGE = (
+    u'<stix:STIX_Package xmlns:stix="%s" id="example:Package-1" '
+    u'version="1.2">\n</stix:STIX_Package>\n' % STIX_NS
+)
+
+
+class SniffTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.parsed = []
+
+        # Record fallbacks to the full parser rather than running it.
+        self._sniff_parse = utils._sniff_parse
+        utils._sniff_parse = self.fake_sniff_parse
+
+    def tearDown(self):
+        utils._sniff_parse = self._sniff_parse
+        shutil.rmtree(self.tmpdir)
+
+    def fake_sniff_parse(self, fn, size):
+        self.parsed.append(fn)
+        return utils.SniffResult(True, "parsed", STIX_NS, size)
+
+    def sniff(self, text, encoding="utf-8", bom=b"", **kwargs):
+        fn = os.path.join(self.tmpdir, "doc.xml")
+
+        with open(fn, "wb") as f:
+            f.write(bom + text.encode(encoding))
+
+        return utils.sniff(fn, **kwargs)
+
+    def assertStix(self, result, version="1.2", namespace=STIX_NS):
+        self.assertEqual(result.is_stix, True)
+        self.assertEqual(result.version, version)
+        self.assertEqual(result.namespace, namespace)
+        self.assertEqual(self.parsed, [])
+
+    def test_plain(self):
+        result = self.sniff(PACKAGE)
+        self.assertStix(result)
+        self.assertEqual(result.size, len(PACKAGE))
+
+    def test_declaration_and_comments(self):
+        text = (
+            u'<?xml version="1.0" encoding="UTF-8"?>\n'
+            u'<!-- <not:Root xmlns:not="http://example.com"> -->\n'
+            u'<?xml-stylesheet href="style.xsl"?>\n'
+            u'<!--\n  multi-line\n  comment\n-->\n'
+        )
+        self.assertStix(self.sniff(text + PACKAGE))
+
+    def test_doctype(self):
+        text = (
+            u'<!DOCTYPE stix:STIX_Package [\n'
+            u'  <!ENTITY greeting "<hello>">\n'
+            u']>\n'
+        )
+        self.assertStix(self.sniff(text + PACKAGE))
+
+    def test_utf8_bom(self):
+        self.assertStix(self.sniff(PACKAGE, bom=codecs.BOM_UTF8))
+
+    def test_utf16_bom(self):
+        for encoding, bom in (("utf-16-le", codecs.BOM_UTF16_LE),
+                              ("utf-16-be", codecs.BOM_UTF16_BE)):
+            self.assertStix(self.sniff(PACKAGE, encoding, bom))
+
+    def test_utf16_without_bom(self):
+        for encoding in ("utf-16-le", "utf-16-be"):
+            self.assertStix(self.sniff(PACKAGE, encoding))
+
+    def test_single_quotes(self):
+        text = PACKAGE.replace(u'"', u"'")
+        self.assertStix(self.sniff(text))
+
+    def test_default_namespace(self):
+        text = u'<STIX_Package xmlns="%s" version="1.1.1"/>' % STIX_NS
+        self.assertStix(self.sniff(text), version="1.1.1")
+
+    def test_whitespace_around_attributes(self):
+        text = (
+            u'<stix:STIX_Package\n    xmlns:stix = "%s"\n'
+            u'    version=\t"1.2" >' % STIX_NS
+        )
+        self.assertStix(self.sniff(text))
+
+    def test_root_beyond_prefix(self):
+        text   = u"<!-- %s -->\n" % (u"x" * 100) + PACKAGE
+        result = self.sniff(text, nbytes=64)
+
+        self.assertEqual(result.version, "parsed")
+        self.assertEqual(len(self.parsed), 1)
+
+    def test_root_tag_cut_off(self):
+        result = self.sniff(PACKAGE, nbytes=40)
+
+        self.assertEqual(result.version, "parsed")
+        self.assertEqual(len(self.parsed), 1)
+
+    def test_missing_version(self):
+        stix_version = utils.stix_version
+        utils.stix_version = lambda fn: "1.0.1"
+
+        try:
+            text = u'<stix:STIX_Package xmlns:stix="%s"/>' % STIX_NS
+            self.assertStix(self.sniff(text), version="1.0.1")
+        finally:
+            utils.stix_version = stix_version
+
+    def test_root_prefix_not_stix(self):
+        # The root element's own prefix decides, not other declarations.
+        text = (
+            u'<other:STIX_Package xmlns:other="http://example.com/other" '
+            u'xmlns:stix="%s" xmlns="%s" version="1.2"/>' % (STIX_NS, STIX_NS)
+        )
+        result = self.sniff(text)
+
+        self.assertEqual(result.is_stix, False)
+        self.assertEqual(result.version, None)
+        self.assertEqual(result.namespace, "http://example.com/other")
+
+    def test_stix_prefix_not_at_start(self):
+        ns     = u"http://example.com/stix.mitre.org"
+        text   = u'<stix:STIX_Package xmlns:stix="%s" version="1.2"/>' % ns
+        result = self.sniff(text)
+
+        self.assertEqual(result.is_stix, False)
+        self.assertEqual(result.namespace, ns)
+
+    def test_undeclared_prefix(self):
+        text   = u'<stix:STIX_Package version="1.2"/>'
+        result = self.sniff(text)
+
+        self.assertEqual(result.is_stix, False)
+        self.assertEqual(result.namespace, None)
+
+    def test_not_stix(self):
+        for text in (u'<html xmlns="http://www.w3.org/1999/xhtml"/>',
+                     u'<?xml version="1.0"?>\n<root/>',
+                     u'<cybox:Observables '
+                     u'xmlns:cybox="http://cybox.mitre.org/cybox-2"/>'):
+            result = self.sniff(text)
+
+            self.assertEqual(result.is_stix, False)
+            self.assertEqual(result.version, None)
+            self.assertEqual(self.parsed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
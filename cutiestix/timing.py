@@ -0,0 +1,341 @@
+"""
+This module contains the per-stage timing instrumentation for validation
+runs.
+
+Each document validation records the wall time, CPU time and bytes read for
+every stage it runs in a DocumentTimes. A TimingStats aggregates those into
+fixed-size histograms for the whole run, both overall and per STIX version.
+Nothing in here depends on Qt.
+
+>>> stats = TimingStats()
+>>> for task, results, times in ...:
+>>>     stats.add(times, task.stix_version)
+>>> stats.percentiles("xml", "wall")
+{50: 0.012, 95: 0.081, 99: 0.230}
+"""
+
+# stdlib
+import os
+import math
+import time
+import logging
+import threading
+import contextlib
+import collections
+
+
+LOG = logging.getLogger(__name__)
+
+# Validation stages, in the order they run.
+STAGE_PARSE          = "parse"
+STAGE_XML            = "xml"
+STAGE_PROFILE        = "profile"
+STAGE_BEST_PRACTICES = "best_practices"
+
+STAGES = (STAGE_PARSE, STAGE_XML, STAGE_PROFILE, STAGE_BEST_PRACTICES)
+
+# Measurements recorded for each stage.
+METRICS = ("wall", "cpu", "bytes")
+
+# Percentiles reported by TimingStats.
+PERCENTILES = (50, 95, 99)
+
+# CPU time for the calling thread where the platform supports it, otherwise
+# for the whole process. Worker processes are single threaded so the two are
+# the same there.
+_cpu_time = (
+    getattr(time, "thread_time", None) or
+    getattr(time, "process_time", None) or
+    time.clock
+)
+
+
+class DocumentTimes(object):
+    """The stage timings for the validation of a single document.
+
+    Instances are small and picklable so they can be returned from
+    validation worker processes.
+    """
+
+    def __init__(self):
+        #: A list of (stage, wall, cpu, bytes) tuples in the order the stages
+        #: ran. Wall and CPU times are in seconds.
+        self.stages = []
+
+        #: The time.time() at which each stage in ``stages`` started.
+        self.started = []
+
+        #: The process and thread which validated the document.
+        self.pid = os.getpid()
+        self.thread = threading.current_thread().ident
+
+    def __getstate__(self):
+        return self.stages, self.started, self.pid, self.thread
+
+    def __setstate__(self, state):
+        self.stages, self.started, self.pid, self.thread = state
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    @contextlib.contextmanager
+    def stage(self, name, nbytes=0):
+        """Time the body of the with-statement as the stage `name`.
+
+        The stage is recorded even if the body raises.
+
+        Args:
+            name: One of the STAGES.
+            nbytes: The number of bytes the stage reads from disk.
+        """
+        wall = time.time()
+        cpu  = _cpu_time()
+
+        try:
+            yield
+        finally:
+            self.started.append(wall)
+            self.stages.append(
+                (name, time.time() - wall, _cpu_time() - cpu, nbytes)
+            )
+
+    @property
+    def elapsed(self):
+        """The total wall time of every recorded stage."""
+        return sum(x[1] for x in self.stages)
+
+
+class Histogram(object):
+    """A fixed-memory histogram of non-negative samples.
+
+    Samples are counted in logarithmic buckets which are RESOLUTION apart,
+    so percentiles are accurate to within about 1% however many samples are
+    added. The count, total, min and max are exact.
+    """
+
+    # Relative width of each bucket.
+    RESOLUTION = 0.02
+
+    # Samples smaller than this share the first bucket.
+    SMALLEST = 1e-6
+
+    _LOG_BASE = math.log(1.0 + RESOLUTION)
+
+    def __init__(self):
+        self.buckets = collections.defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        if value <= self.SMALLEST:
+            return 0
+
+        return 1 + int(math.log(value / self.SMALLEST) / self._LOG_BASE)
+
+    def _value(self, bucket):
+        """Return the midpoint of the `bucket`."""
+        if bucket == 0:
+            return 0.0
+
+        return self.SMALLEST * (1.0 + self.RESOLUTION) ** (bucket - 0.5)
+
+    def add(self, value):
+        """Add the sample `value`."""
+        self.buckets[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add every sample in the Histogram `other` to this one."""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] += count
+
+        self.count += other.count
+        self.total += other.total
+
+        for value in (other.min, other.max):
+            if value is None:
+                continue
+
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        if not self.count:
+            return 0.0
+
+        return self.total / self.count
+
+    def percentile(self, pct):
+        """Return the approximate `pct` percentile (0 - 100) of the samples,
+        or None if there are none.
+        """
+        if not self.count:
+            return None
+
+        rank = max(1, int(math.ceil(self.count * pct / 100.0)))
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+
+            if seen >= rank:
+                value = self._value(bucket)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def as_dict(self):
+        """Return a dictionary of the count, total, min, max, mean and each
+        of the PERCENTILES (keyed ``p50`` etc.).
+        """
+        d = {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean
+        }
+
+        for pct in PERCENTILES:
+            d['p%d' % pct] = self.percentile(pct)
+
+        return d
+
+
+class TimingStats(object):
+    """Per-run histograms of stage timings.
+
+    A Histogram is kept for each stage and metric, across all documents and
+    for each STIX version.
+    """
+
+    def __init__(self):
+        self._hists = {}  # (stage, metric, version) => Histogram
+        self.documents = 0
+
+    def _histogram(self, stage, metric, version):
+        key = (stage, metric, version)
+
+        try:
+            return self._hists[key]
+        except KeyError:
+            hist = self._hists[key] = Histogram()
+            return hist
+
+    def add(self, times, version=None):
+        """Add the DocumentTimes `times` for a document of STIX version
+        `version`.
+        """
+        self.documents += 1
+
+        for stage, wall, cpu, nbytes in times:
+            for metric, value in zip(METRICS, (wall, cpu, nbytes)):
+                self._histogram(stage, metric, None).add(value)
+
+                if version is not None:
+                    self._histogram(stage, metric, version).add(value)
+
+    def histogram(self, stage, metric="wall", version=None):
+        """Return the Histogram for the `stage` and `metric`, limited to
+        documents of STIX version `version` if it is not None. Returns None
+        if the stage has not run.
+        """
+        return self._hists.get((stage, metric, version))
+
+    def percentiles(self, stage, metric="wall", version=None):
+        """Return a dictionary mapping each of the PERCENTILES to its value
+        for the `stage` and `metric`. See histogram().
+        """
+        hist = self.histogram(stage, metric, version)
+
+        if hist is None:
+            return dict.fromkeys(PERCENTILES)
+
+        return dict((pct, hist.percentile(pct)) for pct in PERCENTILES)
+
+    def stages(self):
+        """Return the stages which have been recorded, in run order."""
+        seen = set(x[0] for x in self._hists)
+        return [x for x in STAGES if x in seen]
+
+    def versions(self):
+        """Return a sorted list of the STIX versions which have been
+        recorded.
+        """
+        return sorted(set(x[2] for x in self._hists if x[2] is not None))
+
+    def as_dict(self):
+        """Return a dictionary representation of the statistics.
+
+        The result maps each stage to a dictionary of metric => Histogram
+        dictionary, with a ``versions`` key holding the same breakdown for
+        each STIX version.
+        """
+        def breakdown(version):
+            return dict(
+                (stage, dict(
+                    (metric, self.histogram(stage, metric, version).as_dict())
+                    for metric in METRICS
+                ))
+                for stage in self.stages()
+                if self.histogram(stage, "wall", version)
+            )
+
+        d = breakdown(None)
+        d['documents'] = self.documents
+        d['versions'] = dict((v, breakdown(v)) for v in self.versions())
+        return d
+
+    def _line(self, label, stage, version):
+        wall = self.histogram(stage, "wall", version)
+        cpu  = self.histogram(stage, "cpu", version)
+        read = self.histogram(stage, "bytes", version)
+
+        def ms(hist):
+            return "/".join("%.1f" % (hist.percentile(x) * 1000.0)
+                            for x in PERCENTILES)
+
+        line = "  %-24s %7d docs  wall %s  cpu %s" % (
+            label, wall.count, ms(wall), ms(cpu)
+        )
+
+        if read.total:
+            line += "  read %.1f MB" % (read.total / (1024.0 * 1024.0))
+
+        return line
+
+    def summary(self):
+        """Return a multi-line, human-readable table of the stage timings.
+
+        Stages are broken down by STIX version when more than one version
+        was validated.
+        """
+        if not self._hists:
+            return "No stage timings recorded."
+
+        pcts     = "/".join("p%d" % x for x in PERCENTILES)
+        lines    = ["Stage timings in ms (%s):" % pcts]
+        versions = self.versions()
+
+        for stage in self.stages():
+            lines.append(self._line(stage, stage, None))
+
+            if len(versions) < 2:
+                continue
+
+            for version in versions:
+                if self.histogram(stage, "wall", version):
+                    label = "  STIX %s" % version
+                    lines.append(self._line(label, stage, version))
+
+        return "\n".join(lines)
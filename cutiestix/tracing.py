@@ -0,0 +1,288 @@
+"""
+This module contains the opt-in timeline tracer for validation runs.
+
+When tracing is started, spans recorded by the validation workers, the
+ingestion pipeline and the GUI thread are collected in memory and written as
+a Trace Event Format JSON file, which can be opened in chrome://tracing or
+https://ui.perfetto.dev. Nothing in here depends on Qt.
+
+>>> tracing.start("run.trace.json")
+>>> with tracing.span("add_many", "gui", rows=len(docs)):
+>>>     model.add_many(docs)
+>>> tracing.stop()
+
+When tracing is not started, span() returns a shared no-op context manager
+so instrumented code paths cost a single function call.
+"""
+
+# stdlib
+import os
+import json
+import time
+import logging
+import threading
+
+# internal
+from . import settings
+
+
+LOG = logging.getLogger(__name__)
+
+# The active Tracer, or None if tracing is not started. See start().
+_TRACER = None
+
+
+class Tracer(object):
+    """Collects trace events in memory and writes them to a Trace Event
+    Format JSON file.
+
+    Events may be added from any thread. Timestamps are time.time() values,
+    so spans recorded by validation worker processes on the same machine
+    line up with those recorded here.
+
+    Args:
+        filename: The trace file to write.
+        max_events: The maximum number of events to keep. Later events are
+            dropped. Defaults to ``settings.TRACE_MAX_EVENTS``.
+    """
+
+    def __init__(self, filename, max_events=None):
+        self.filename = filename
+        self.origin = time.time()
+        self.dropped = 0
+
+        self._max_events = max_events or settings.TRACE_MAX_EVENTS
+        self._events = []
+        self._named = set()  # (pid, tid) pairs with thread_name metadata
+        self._lock = threading.Lock()
+
+    def _ts(self, t):
+        """Return the time.time() value `t` in trace microseconds."""
+        return (t - self.origin) * 1e6
+
+    def _append(self, event):
+        if len(self._events) >= self._max_events:
+            self.dropped += 1
+            return
+
+        self._events.append(event)
+
+    def _name_thread(self, pid, tid, name):
+        """Add thread_name metadata the first time `pid` and `tid` are
+        seen. Metadata counts towards the event limit like any other event.
+        """
+        if (pid, tid) in self._named:
+            return
+
+        self._named.add((pid, tid))
+        self._append({
+            'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+            'args': {'name': name}
+        })
+
+        if pid != os.getpid() and (pid, None) not in self._named:
+            self._named.add((pid, None))
+            self._append({
+                'name': 'process_name', 'ph': 'M', 'pid': pid,
+                'args': {'name': "validation worker %d" % pid}
+            })
+
+    def complete(self, name, cat, start, end, args=None, pid=None, tid=None):
+        """Add a complete ("X") event for a span from `start` to `end`.
+
+        Args:
+            name: The span name.
+            cat: The span category, e.g. "worker", "ingest" or "gui".
+            start: The time.time() at which the span started.
+            end: The time.time() at which the span ended.
+            args: An optional dictionary shown with the span.
+            pid: The process the span ran in. Defaults to this process.
+            tid: The thread the span ran in. Defaults to the calling thread.
+        """
+        if pid is None:
+            pid = os.getpid()
+
+        if tid is None:
+            thread = threading.current_thread()
+            tid, tname = thread.ident, thread.name
+        else:
+            tname = "validation"
+
+        event = {
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': self._ts(start), 'dur': (end - start) * 1e6
+        }
+
+        if args:
+            event['args'] = args
+
+        with self._lock:
+            self._name_thread(pid, tid, tname)
+            self._append(event)
+
+    def instant(self, name, cat, args=None):
+        """Add a thread-scoped instant ("i") event at the current time."""
+        thread = threading.current_thread()
+        pid    = os.getpid()
+        event  = {
+            'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'pid': pid,
+            'tid': thread.ident, 'ts': self._ts(time.time())
+        }
+
+        if args:
+            event['args'] = args
+
+        with self._lock:
+            self._name_thread(pid, thread.ident, thread.name)
+            self._append(event)
+
+    def write(self):
+        """Write every event collected so far to the trace file. Errors
+        writing the file are logged rather than raised, since this is
+        called from Qt slots.
+        """
+        with self._lock:
+            events = list(self._events)
+
+        doc = {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped': self.dropped}
+        }
+
+        try:
+            with open(self.filename, "w") as f:
+                json.dump(doc, f)
+        except (IOError, OSError) as ex:
+            LOG.error("Cannot write trace file %s: %s", self.filename, str(ex))
+            return
+
+        if self.dropped:
+            LOG.warn("Trace buffer full: dropped %d events", self.dropped)
+
+        LOG.info("Wrote %d trace events to %s", len(events), self.filename)
+
+
+class _Span(object):
+    """Records a complete event for the body of a with-statement."""
+
+    __slots__ = ("_tracer", "_name", "_cat", "_args", "_start")
+
+    def __init__(self, tracer, name, cat, args):
+        self._tracer = tracer
+        self._name = name
+        self._cat = cat
+        self._args = args
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer.complete(
+            self._name, self._cat, self._start, time.time(), self._args
+        )
+
+
+class _NullSpan(object):
+    """A span which records nothing. Used when tracing is not started."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled():
+    """Return True if tracing has been started."""
+    return _TRACER is not None
+
+
+def start(filename):
+    """Start collecting trace events to be written to `filename`. Any
+    previously started tracer is discarded.
+    """
+    global _TRACER
+    _TRACER = Tracer(filename)
+    LOG.info("Tracing to %s", filename)
+
+
+def stop():
+    """Write the trace file and stop tracing. Does nothing if tracing was
+    not started.
+    """
+    global _TRACER
+
+    if _TRACER is None:
+        return
+
+    tracer, _TRACER = _TRACER, None
+    tracer.write()
+
+
+def flush():
+    """Write the events collected so far to the trace file without stopping
+    tracing. Does nothing if tracing was not started.
+    """
+    if _TRACER is not None:
+        _TRACER.write()
+
+
+def span(name, cat, **args):
+    """Return a context manager which records its body as a span.
+
+    Args:
+        name: The span name.
+        cat: The span category, e.g. "worker", "ingest" or "gui".
+        **args: Values shown with the span in the trace viewer.
+    """
+    tracer = _TRACER
+
+    if tracer is None:
+        return _NULL_SPAN
+
+    return _Span(tracer, name, cat, args)
+
+
+def instant(name, cat, **args):
+    """Record an instant event on the calling thread."""
+    tracer = _TRACER
+
+    if tracer is not None:
+        tracer.instant(name, cat, args)
+
+
+def document(task, times):
+    """Record a span for the validation of the ValidationTask `task` with a
+    nested span for each stage in the timing.DocumentTimes `times`.
+
+    The spans are placed on the process and thread that validated the
+    document, which may be a validation worker process.
+    """
+    tracer = _TRACER
+
+    if tracer is None or not times.stages:
+        return
+
+    pid, tid = times.pid, times.thread
+    started  = times.started
+    stages   = times.stages
+    end      = started[-1] + stages[-1][1]
+    args     = {'filename': task.filename, 'stix_version': task.stix_version}
+
+    tracer.complete("document", "worker", started[0], end, args, pid, tid)
+
+    for start, (stage, wall, cpu, nbytes) in zip(started, stages):
+        args = {'cpu_ms': cpu * 1000.0}
+
+        if nbytes:
+            args['bytes'] = nbytes
+
+        tracer.complete(stage, "worker", start, start + wall, args, pid, tid)
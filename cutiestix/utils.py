@@ -4,13 +4,40 @@ Helper utilities that have use throughout the cutiestix codebase.
 
 # stdlib
 import os
+import re
+import codecs
+import collections
 
-# lxml
-from lxml import etree
+# lxml and stix-validator are imported by the functions that need a parser.
+# sniff() usually finds the root start tag without one, so ingestion and GUI
+# startup do not load them.
 
-# stix-validator
-import sdv.utils
-import sdv.validators.stix.common as stix_utils
+# internal
+from . import settings
+
+
+# The STIX namespaces all start with this.
+STIX_NS_PREFIX = "http://stix.mitre.org"
+
+# The number of bytes read from the start of a document when sniffing it.
+SNIFF_BYTES = 64 * 1024
+
+# Prologue constructs that may appear before the root element.
+_RE_PROLOGUE = re.compile(
+    r"\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE(?:[^\[>]|\[.*?\])*>",
+    re.DOTALL
+)
+
+# The root element start tag and its attributes.
+_RE_START_TAG = re.compile(
+    r"<([^\s/>]+)((?:\s+[^\s=/>]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*)\s*/?>"
+)
+_RE_ATTR = re.compile(r"([^\s=/>]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+# The result of sniffing a file.
+SniffResult = collections.namedtuple(
+    "SniffResult", ["is_stix", "version", "namespace", "size"]
+)
 
 
 def stix_version(fn):
@@ -22,6 +49,7 @@ def stix_version(fn):
     Returns:
         A STIX version number.
     """
+    from sdv.validators.stix import common as stix_utils
     return stix_utils.get_version(fn)
 
 
@@ -59,11 +87,28 @@ def home():
     return os.path.expanduser("~")
 
 
+def cache_dir():
+    """Return the directory where cutiestix keeps its on-disk caches,
+    creating it if it does not exist.
+
+    This is ``settings.CACHE_DIR`` if set, otherwise ``~/.cutiestix``.
+    """
+    path = settings.CACHE_DIR or os.path.join(home(), ".cutiestix")
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    return path
+
+
 def is_stix(fn):
     """Attempts to determine if the input `doc` is a STIX XML instance document.
     If the root-level element falls under a namespace which starts with
     ``http://stix.mitre.org``, this will return True.
     """
+    from lxml import etree
+    import sdv.utils
+
     try:
         context = etree.iterparse(fn, events=("start",))
         _, root = next(context)
@@ -72,6 +117,130 @@ def is_stix(fn):
         return False
 
 
+def _decode_prefix(data):
+    """Decode the leading bytes of an XML document.
+
+    Only the markup in the prologue and root start tag is inspected, so
+    anything which is not UTF-16 is decoded as Latin-1, which never fails
+    and leaves ASCII namespace URIs and version strings intact.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode("utf-8", "replace")
+    elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return data.decode("utf-16", "replace")
+    elif data.startswith(b"<\x00"):
+        return data.decode("utf-16-le", "replace")
+    elif data.startswith(b"\x00<"):
+        return data.decode("utf-16-be", "replace")
+
+    return data.decode("latin-1")
+
+
+def _root_start_tag(text):
+    """Return a (tag, attributes) tuple for the root element start tag found
+    in the document prefix `text`, or None if it cannot be found.
+    """
+    pos = 0
+    end = len(text)
+
+    while pos < end:
+        match = _RE_PROLOGUE.match(text, pos)
+
+        if not match:
+            break
+
+        pos = match.end()
+
+    match = _RE_START_TAG.match(text, pos)
+
+    if not match:
+        return None
+
+    attrs = dict(
+        (name, dq or sq) for name, dq, sq in _RE_ATTR.findall(match.group(2))
+    )
+
+    return match.group(1), attrs
+
+
+def sniff(fn, nbytes=SNIFF_BYTES):
+    """Determine whether the file `fn` is a STIX document and, if so, which
+    version of STIX it uses.
+
+    Only the first `nbytes` bytes of the file are read. The root element
+    namespace and version are pulled out of its start tag without building
+    a parse tree. If the root start tag cannot be found in that prefix, the
+    file is parsed with is_stix() and stix_version() instead.
+
+    Args:
+        fn: A filename.
+        nbytes: The maximum number of bytes to read.
+
+    Returns:
+        A SniffResult tuple.
+
+    Raises:
+        OSError: If `fn` cannot be stat'd.
+    """
+    size = os.path.getsize(fn)
+
+    try:
+        with open(fn, "rb") as f:
+            prefix = f.read(nbytes)
+    except IOError:
+        return SniffResult(False, None, None, size)
+
+    root = _root_start_tag(_decode_prefix(prefix))
+
+    if root is None:
+        return _sniff_parse(fn, size)
+
+    tag, attrs = root
+    prefix, _, local = tag.rpartition(":")
+    nsattr = "xmlns:%s" % prefix if prefix else "xmlns"
+    ns = attrs.get(nsattr)
+
+    if not (ns and ns.startswith(STIX_NS_PREFIX)):
+        return SniffResult(False, None, ns, size)
+
+    version = attrs.get("version")
+
+    if version is None:
+        try:
+            version = stix_version(fn)
+        except Exception:
+            version = None
+
+    return SniffResult(True, version, ns, size)
+
+
+def _sniff_parse(fn, size):
+    """Sniff the file `fn` with a full parser. This is used when the root
+    start tag could not be found in the document prefix.
+    """
+    from lxml import etree
+    from sdv.validators.stix import common as stix_utils
+    import sdv.utils
+
+    try:
+        context = etree.iterparse(fn, events=("start",))
+        _, root = next(context)
+    except Exception:
+        return SniffResult(False, None, None, size)
+
+    ns = etree.QName(root).namespace
+
+    if not sdv.utils.is_stix(root):
+        return SniffResult(False, None, ns, size)
+
+    try:
+        version = stix_utils.get_version(root)
+    except Exception:
+        version = None
+
+    return SniffResult(True, version, ns, size)
+
+
 def is_iterable(x):
     """Returhs True if `x` is iterable.
 
@@ -90,6 +259,8 @@ def list_xml_files(files):
     Returns:
         A list of XML filenames.
     """
+    import sdv.utils
+
     if not is_iterable(files):
         files = [files]
 
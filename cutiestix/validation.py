@@ -0,0 +1,885 @@
+"""
+This module contains the validation pipeline used by cutiestix.
+
+Nothing in here depends on Qt, so the code can run in a QThread, in a pool of
+worker processes, or anywhere else that needs to validate STIX documents.
+
+>>> tasks = [ValidationTask(filename="foo.xml", stix_version="1.2")]
+>>> for task, results in run(tasks, processes=4):
+>>>     print task.filename, results.xml.is_valid
+"""
+
+# stdlib
+import os
+import time
+import pickle
+import logging
+import multiprocessing
+
+# internal
+from . import cache
+from . import timing
+from . import tracing
+from . import settings
+
+
+LOG = logging.getLogger(__name__)
+
+# The RunControl for the current worker process. See _init_worker().
+_CONTROL = None
+
+# The read-only cache.ResultCache for the current worker process, or None if
+# the run is not cached. See _init_worker().
+_STORE = None
+
+# How long a pool-mode run waits for a result before checking whether it
+# has been cancelled.
+_POLL_INTERVAL = 0.25
+
+
+def preload():
+    """Import and return the stix-validator package.
+
+    stix-validator brings in lxml, the XML Schema machinery and the Excel
+    profile reader, so cutiestix does not import it until a document is
+    validated. run() calls this up front so the import is not counted in
+    the first document's stage timings and so forked pool workers inherit
+    the loaded modules instead of each importing them.
+    """
+    import sdv
+    import sdv.utils
+    return sdv
+
+
+class Cancelled(Exception):
+    """Raised at a RunControl checkpoint when the run has been cancelled."""
+    pass
+
+
+class RunControl(object):
+    """A control channel used to cancel, pause and resume a validation run.
+
+    The control may be shared between threads and with validation worker
+    processes. Validation checks it between documents and between the
+    validation stages of a single document.
+    """
+
+    def __init__(self):
+        self._cancelled = multiprocessing.Event()
+        self._running = multiprocessing.Event()
+        self._running.set()
+
+    def cancel(self):
+        """Cancel the run. This also wakes a paused run so it can exit."""
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        """Pause the run at the next checkpoint."""
+        self._running.clear()
+
+    def resume(self):
+        """Resume a paused run."""
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def checkpoint(self):
+        """Block while the run is paused.
+
+        Raises:
+            Cancelled: If the run has been cancelled.
+        """
+        while not self._running.is_set():
+            self._running.wait(_POLL_INTERVAL)
+
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+
+class ValidationResults(object):
+    """Holds validation results.
+
+    This is used by ValidationTableItem for storing validation results.
+    """
+    __slots__ = ("xml", "best_practices", "profile")
+
+    def __init__(self):
+        self.xml = None
+        self.best_practices = None
+        self.profile = None
+
+    def __getstate__(self):
+        return self.xml, self.best_practices, self.profile
+
+    def __setstate__(self, state):
+        self.xml, self.best_practices, self.profile = state
+
+
+class ValidationTask(object):
+    """A picklable description of a single document validation.
+
+    Tasks carry a snapshot of the settings that affect validation so that
+    they can be shipped to worker processes which do not share our settings
+    module state.
+
+    Args:
+        key: An identifier used to map results back to the task owner.
+        filename: The STIX document filename.
+        stix_version: The STIX version of the document.
+        validate_best_practices: True if best practices should be validated.
+        validate_stix_profile: True if STIX Profile validation should be run.
+        schemas: An external schema directory or None.
+        profile: A STIX Profile filename or None.
+        size: The document size in bytes, if known.
+    """
+    __slots__ = ("key", "filename", "stix_version", "validate_best_practices",
+                 "validate_stix_profile", "schemas", "profile", "size")
+
+    def __init__(self, key=None, filename=None, stix_version=None,
+                 validate_best_practices=False, validate_stix_profile=False,
+                 schemas=None, profile=None, size=None):
+        self.key = key
+        self.filename = filename
+        self.stix_version = stix_version
+        self.validate_best_practices = validate_best_practices
+        self.validate_stix_profile = validate_stix_profile
+        self.schemas = schemas
+        self.profile = profile
+        self.size = size
+
+    def __getstate__(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr, value in zip(self.__slots__, state):
+            setattr(self, attr, value)
+
+    @classmethod
+    def from_item(cls, item):
+        """Return a ValidationTask for the ValidateTableItem `item` using the
+        current global validation settings.
+        """
+        schemas = None
+
+        if settings.VALIDATE_EXTERNAL_SCHEMAS:
+            schemas = settings.XML_SCHEMA_DIR
+
+        return cls(
+            key=item.key(),
+            filename=item.filename,
+            stix_version=item.stix_version,
+            validate_best_practices=item.validate_best_practices,
+            validate_stix_profile=item.validate_stix_profile,
+            schemas=schemas,
+            profile=settings.STIX_PROFILE_FILENAME,
+            size=item.size
+        )
+
+    @classmethod
+    def from_document(cls, key, doc):
+        """Return a ValidationTask for the ingest.Document `doc` using the
+        current global validation settings.
+
+        Args:
+            key: An identifier used to map results back to `doc`.
+            doc: An ingest.Document.
+        """
+        schemas = None
+
+        if settings.VALIDATE_EXTERNAL_SCHEMAS:
+            schemas = settings.XML_SCHEMA_DIR
+
+        return cls(
+            key=key,
+            filename=doc.filename,
+            stix_version=doc.stix_version,
+            validate_best_practices=settings.VALIDATE_STIX_BEST_PRACTICES,
+            validate_stix_profile=settings.VALIDATE_STIX_PROFILE,
+            schemas=schemas,
+            profile=settings.STIX_PROFILE_FILENAME,
+            size=doc.size
+        )
+
+
+def status(results):
+    """Return the overall status of validation `results`.
+
+    Args:
+        results: A ValidationResults object or the Exception raised during
+            validation.
+
+    Returns:
+        ``"error"`` if `results` is an Exception, ``"invalid"`` if any of the
+        validation stages failed, otherwise ``"valid"``.
+    """
+    if isinstance(results, Exception):
+        return "error"
+
+    stages = (results.xml, results.profile, results.best_practices)
+
+    if any(x is not None and not x.is_valid for x in stages):
+        return "invalid"
+
+    return "valid"
+
+
+def best_practice_warnings(results):
+    """Yield a dictionary for each warning in the best practice validation
+    `results`.
+
+    Collections are visited in name order. Each dictionary contains the
+    warning's core key/value pairs plus a ``title`` key holding the name of
+    the collection the warning belongs to.
+
+    Args:
+        results: A stix-validator BestPracticeValidationResults or
+            DetachedBestPracticeResults object.
+    """
+    for collection in sorted(results, key=lambda x: x.name):
+        for warn in collection:
+            warndict = dict((k, warn[k]) for k in warn.core_keys)
+            warndict['title'] = collection.name
+            yield warndict
+
+
+class RunStats(object):
+    """Statistics for a validation run.
+
+    Args:
+        scheduler: The name of the scheduling policy used for the run.
+        processes: The number of validation processes used for the run.
+    """
+
+    def __init__(self, scheduler=None, processes=1):
+        self.scheduler = scheduler
+        self.processes = processes
+        self.total = 0
+        self.completed = 0
+        self.cached = 0
+        self.errors = 0
+        self.cancelled = False
+        self.started = None
+        self.finished = None
+
+        #: timing.TimingStats for the documents validated in this run.
+        #: Cached results are not timed.
+        self.timings = timing.TimingStats()
+
+        #: Validator cache hits and misses in every process of the run, in
+        #: the format returned by cache.validator_counts().
+        self.validators = {
+            'schemas': {'hits': 0, 'misses': 0},
+            'profiles': {'hits': 0, 'misses': 0}
+        }
+
+    @property
+    def elapsed(self):
+        """The number of seconds the run took, or has taken so far."""
+        if self.started is None:
+            return 0.0
+
+        return (self.finished or time.time()) - self.started
+
+    def add_validator_counts(self, counts):
+        """Add the cache.validator_counts() `counts` of one process to the
+        run's validator cache counters.
+        """
+        for name, count in counts.items():
+            for counter, value in count.items():
+                self.validators[name][counter] += value
+
+    def as_dict(self):
+        """Return a dictionary representation of the statistics."""
+        return {
+            'scheduler': self.scheduler,
+            'processes': self.processes,
+            'total': self.total,
+            'completed': self.completed,
+            'cached': self.cached,
+            'errors': self.errors,
+            'cancelled': self.cancelled,
+            'elapsed': self.elapsed,
+            'validators': self.validators
+        }
+
+    def summary(self):
+        """Return a one-line, human-readable summary of the run."""
+        msg = ("Validated {completed} of {total} documents in {elapsed:.1f}s "
+               "({cached} cached, {errors} errors; {scheduler} scheduling, "
+               "{processes} processes)")
+
+        if self.cancelled:
+            msg += " [cancelled]"
+
+        return msg.format(**self.as_dict())
+
+
+def _task_size(task):
+    """Return the size of the `task` document, stat'ing the file if the size
+    was not provided by ingestion.
+    """
+    if task.size is not None:
+        return task.size
+
+    try:
+        return os.path.getsize(task.filename)
+    except OSError:
+        return 0
+
+
+def _table_order(tasks):
+    """Schedule the `tasks` in the order they were given."""
+    return list(tasks)
+
+
+def _largest_first(tasks):
+    """Schedule the largest documents first. This keeps one huge document
+    from extending a pool-mode run after everything else has finished.
+    """
+    return sorted(tasks, key=_task_size, reverse=True)
+
+
+def _smallest_first(tasks):
+    """Schedule the smallest documents first for fast early feedback."""
+    return sorted(tasks, key=_task_size)
+
+
+# Scheduling policy name => function which returns the tasks in the order
+# they should be validated.
+SCHEDULERS = {
+    'table': _table_order,
+    'largest-first': _largest_first,
+    'smallest-first': _smallest_first
+}
+
+
+def register_scheduler(name, func):
+    """Register a scheduling policy.
+
+    Args:
+        name: The policy name.
+        func: A callable which accepts a list of ValidationTask objects and
+            returns them in the order they should be validated.
+    """
+    SCHEDULERS[name] = func
+
+
+def schedule(tasks, scheduler=None):
+    """Return the `tasks` in the order they should be validated.
+
+    Args:
+        tasks: An iterable of ValidationTask objects.
+        scheduler: A scheduling policy name. If None,
+            ``settings.VALIDATION_SCHEDULER`` is used.
+
+    Raises:
+        KeyError: If `scheduler` is not a registered scheduling policy.
+    """
+    scheduler = scheduler or settings.VALIDATION_SCHEDULER
+
+    try:
+        func = SCHEDULERS[scheduler]
+    except KeyError:
+        raise KeyError("Unknown scheduler: %s" % scheduler)
+
+    return func(tasks)
+
+
+class DetachedError(object):
+    """A picklable copy of a stix-validator XML Schema or STIX Profile
+    validation error.
+    """
+    __slots__ = ("line", "message")
+
+    def __init__(self, line=None, message=None):
+        self.line = line
+        self.message = message
+
+    def __getstate__(self):
+        return self.line, self.message
+
+    def __setstate__(self, state):
+        self.line, self.message = state
+
+
+class DetachedResults(object):
+    """A picklable copy of stix-validator XML Schema or STIX Profile
+    validation results.
+    """
+    __slots__ = ("is_valid", "errors")
+
+    def __init__(self, is_valid=None, errors=None):
+        self.is_valid = is_valid
+        self.errors = errors or []
+
+    def __getstate__(self):
+        return self.is_valid, self.errors
+
+    def __setstate__(self, state):
+        self.is_valid, self.errors = state
+
+
+class DetachedWarning(dict):
+    """A picklable copy of a stix-validator BestPracticeWarning."""
+
+    @property
+    def core_keys(self):
+        return tuple(self)
+
+
+class DetachedWarningCollection(list):
+    """A picklable copy of a stix-validator BestPracticeWarningCollection."""
+
+    def __init__(self, name=None, warnings=()):
+        super(DetachedWarningCollection, self).__init__(warnings)
+        self.name = name
+
+
+class DetachedBestPracticeResults(list):
+    """A picklable copy of stix-validator BestPracticeValidationResults.
+
+    Iterating over this yields DetachedWarningCollection objects, just like
+    the stix-validator results it was copied from.
+    """
+
+    def __init__(self, is_valid=None, collections=()):
+        super(DetachedBestPracticeResults, self).__init__(collections)
+        self.is_valid = is_valid
+
+    @property
+    def errors(self):
+        return [x for x in self if x]
+
+
+def _detach_errors(results):
+    """Return a DetachedResults copy of XML Schema or STIX Profile
+    validation `results`.
+    """
+    errors = [DetachedError(x.line, x.message) for x in (results.errors or ())]
+    return DetachedResults(results.is_valid, errors)
+
+
+def _detach_best_practices(results):
+    """Return a DetachedBestPracticeResults copy of the best practice
+    validation `results`.
+    """
+    collections = []
+
+    for collection in results:
+        warns = (
+            DetachedWarning((k, warn[k]) for k in warn.core_keys)
+            for warn in collection
+        )
+        collections.append(DetachedWarningCollection(collection.name, warns))
+
+    return DetachedBestPracticeResults(results.is_valid, collections)
+
+
+def detach(results):
+    """Return a copy of the ValidationResults `results` which holds no
+    references to lxml or stix-validator objects and can be pickled.
+
+    Args:
+        results: A ValidationResults object.
+
+    Returns:
+        A ValidationResults object.
+    """
+    detached = ValidationResults()
+
+    if results.xml is not None:
+        detached.xml = _detach_errors(results.xml)
+
+    if results.profile is not None:
+        detached.profile = _detach_errors(results.profile)
+
+    if results.best_practices is not None:
+        detached.best_practices = _detach_best_practices(results.best_practices)
+
+    return detached
+
+
+def _picklable(ex):
+    """Return `ex` if it can be pickled, otherwise an Exception carrying
+    its message.
+    """
+    try:
+        pickle.dumps(ex)
+        return ex
+    except Exception:
+        return Exception(str(ex))
+
+
+def parse(fn):
+    """Parse the document `fn` into an lxml ElementTree.
+
+    The stix-validator parser is used so the tree is identical to the one
+    each validator would build for itself if handed the filename.
+    """
+    root = preload().utils.get_etree_root(fn)
+    return root.getroottree()
+
+
+def validate(task, control=None, times=None):
+    """Perform validation for the ValidationTask `task`.
+
+    The `task` specifies the input filename and what forms of validation
+    are to be run against that file. The document is parsed once and the
+    resulting tree is shared by every enabled validator.
+
+    Args:
+        task: A ValidationTask.
+        control: An optional RunControl which is checked before each
+            validation stage.
+        times: An optional timing.DocumentTimes which each stage that runs
+            is recorded in.
+
+    Returns:
+        A ValidationResults object.
+
+    Raises:
+        Cancelled: If the `control` is cancelled.
+    """
+    fn      = task.filename
+    version = task.stix_version
+    schemas = task.schemas
+    profile = task.profile
+    result  = ValidationResults()
+    check   = control.checkpoint if control else (lambda: None)
+    times   = times or timing.DocumentTimes()
+
+    check()
+    LOG.debug("Parsing %s", fn)
+    with times.stage(timing.STAGE_PARSE, _task_size(task)):
+        doc = parse(fn)
+
+    # Always run XML validation
+    check()
+    LOG.debug("Validating %s using schema dir %s", fn, schemas)
+    with times.stage(timing.STAGE_XML):
+        validator  = cache.SCHEMAS.get(version, schemas)
+        result.xml = validator.validate(doc, version=version)
+
+    # If the file was XML invalid, don't bother running the other
+    # validation scenarios.
+    if not result.xml.is_valid:
+        return result
+
+    if task.validate_stix_profile:
+        check()
+        LOG.debug("Running profile validation for %s using profile %s", fn, profile)
+        with times.stage(timing.STAGE_PROFILE):
+            validator = cache.PROFILES.get(profile)
+            result.profile = validator.validate(doc)
+
+    if task.validate_best_practices:
+        check()
+        LOG.debug("Running best practice validation for %s", fn)
+        with times.stage(timing.STAGE_BEST_PRACTICES):
+            result.best_practices = preload().validate_best_practices(
+                doc=doc, version=version
+            )
+
+    return result
+
+
+def _init_worker(control, cache_filename=None):
+    """Initialize a validation worker process with the run's RunControl and
+    the filename of the run's result cache, if it has one.
+    """
+    global _CONTROL, _STORE
+    _CONTROL = control
+    _STORE   = cache.ResultCache(cache_filename) if cache_filename else None
+
+
+def _validate_detached(task):
+    """Look up the `task` in the worker's result cache and validate it in
+    the worker process if it has no cached results.
+
+    The cache key is computed here so the documents are hashed by the
+    worker processes in parallel rather than by the parent up front.
+
+    Returns:
+        A tuple containing the task key, either a detached ValidationResults
+        object or the Exception raised during validation, the
+        timing.DocumentTimes for the stages that ran or None if the results
+        were cached, the result cache key or None, and the worker's
+        cache.validator_counts() for the task or None.
+    """
+    key = None
+
+    if _STORE is not None:
+        try:
+            key = _STORE.key(task)
+        except (IOError, OSError) as ex:
+            LOG.debug("Cannot compute result cache key: %s", str(ex))
+
+    if key is not None:
+        cached = _STORE.lookup(key)
+
+        if cached is not None:
+            return task.key, cached, None, key, None
+
+    times  = timing.DocumentTimes()
+    counts = cache.validator_counts()
+
+    try:
+        results = detach(validate(task, _CONTROL, times))
+    except Exception as ex:
+        results = _picklable(ex)
+
+    return task.key, results, times, key, cache.validator_counts(counts)
+
+
+def process_count(processes=None):
+    """Return the number of validation processes to use.
+
+    Args:
+        processes: A requested number of processes. If None, the
+            ``settings.VALIDATION_PROCESSES`` value is used. A value less than
+            one means "one process per CPU".
+    """
+    if processes is None:
+        processes = settings.VALIDATION_PROCESSES
+
+    if processes is None or processes < 1:
+        processes = multiprocessing.cpu_count()
+
+    return processes
+
+
+def _run_serial(tasks, started=None, store=None, control=None):
+    """Validate the `tasks` one after another in the calling thread.
+
+    Yields (task, results, times) tuples. See run().
+    """
+    for task in tasks:
+        if control:
+            control.checkpoint()
+
+        cached = store.get(task) if store else None
+
+        if cached is not None:
+            yield task, cached, None
+            continue
+
+        if started:
+            started(task)
+
+        times = timing.DocumentTimes()
+
+        try:
+            results = validate(task, control, times)
+        except Cancelled:
+            raise
+        except Exception as ex:
+            results = ex
+        else:
+            if store:
+                store.put(task, detach(results))
+
+        yield task, results, times
+
+
+def _forks():
+    """Return True if pool worker processes are forked from this process,
+    and so start with a copy of its validator caches.
+    """
+    try:
+        return multiprocessing.get_start_method() == "fork"
+    except AttributeError:
+        return hasattr(os, "fork")
+
+
+def _warm(tasks):
+    """Build the validators needed by the `tasks` in this process, so forked
+    pool workers inherit them instead of each building their own.
+
+    Validators which cannot be built are left to fail, and be reported, for
+    each document that needs them.
+    """
+    # Schema validators are shared by every STIX version.
+    schemas = dict((task.schemas, task.stix_version) for task in tasks)
+
+    for schema_dir, version in schemas.items():
+        try:
+            cache.SCHEMAS.get(version, schema_dir)
+        except Exception as ex:
+            LOG.debug("Cannot build schema validator: %s", str(ex))
+
+    profiles = set(
+        task.profile for task in tasks if task.validate_stix_profile
+    )
+
+    for profile in profiles:
+        try:
+            cache.PROFILES.get(profile)
+        except Exception as ex:
+            LOG.debug("Cannot build profile validator: %s", str(ex))
+
+
+def _run_pool(tasks, processes, store=None, control=None, stats=None):
+    """Validate the `tasks` using a pool of `processes` worker processes.
+
+    Yields (task, results, times) tuples. See run(). Results are yielded
+    in completion order, not task order.
+
+    The worker processes look up the `store` themselves through their own
+    read-only connections, so hashing documents for their cache keys
+    overlaps with validation. Only the parent writes to the `store`.
+
+    Validator cache counts from the worker processes are added to the
+    `stats`, if given.
+
+    If the `control` is cancelled the pool is terminated, abandoning any
+    documents the worker processes are still validating.
+    """
+    control   = control or RunControl()
+    processes = min(processes, len(tasks))
+
+    if processes <= 1:
+        for result in _run_serial(tasks, store=store, control=control):
+            yield result
+        return
+
+    filename = None
+
+    if store and not store.disabled:
+        try:
+            filename = store.filename
+        except OSError as ex:
+            LOG.warn("Result cache unavailable: %s", str(ex))
+
+    if _forks():
+        _warm(tasks)
+
+    bykey = dict((task.key, task) for task in tasks)
+    pool  = multiprocessing.Pool(processes, _init_worker, (control, filename))
+    done  = False
+
+    LOG.debug("Started validation pool with %d processes", processes)
+
+    try:
+        pending = pool.imap_unordered(_validate_detached, tasks)
+
+        for _ in tasks:
+            key, results, times, cache_key, counts = _next_result(
+                pending, control
+            )
+            task = bykey[key]
+
+            if isinstance(results, Cancelled):
+                raise results
+
+            if stats and counts:
+                stats.add_validator_counts(counts)
+
+            # The lookups happened in the workers, so count them here.
+            if filename and times is None:
+                store.hits += 1
+            elif filename:
+                store.misses += 1
+
+                if not isinstance(results, Exception):
+                    store.put(task, results, cache_key)
+
+            yield task, results, times
+
+            control.checkpoint()
+        done = True
+    finally:
+        if done:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+
+def _next_result(pending, control):
+    """Return the next result from the pool iterator `pending`, checking the
+    `control` for cancellation while waiting.
+
+    Raises:
+        Cancelled: If the `control` is cancelled.
+    """
+    while True:
+        if control.cancelled:
+            raise Cancelled()
+
+        try:
+            return pending.next(_POLL_INTERVAL)
+        except multiprocessing.TimeoutError:
+            continue
+
+
+def run(tasks, processes=1, started=None, store=None, control=None,
+        scheduler=None, stats=None):
+    """Validate the `tasks`, yielding results as each task completes.
+
+    Args:
+        tasks: An iterable of ValidationTask objects.
+        processes: The number of worker processes to use. If 1, validation
+            runs in the calling thread.
+        started: An optional callable which is passed each task just before
+            it is validated in the calling thread. It is not called for
+            cached results or for tasks sent to worker processes.
+        store: An optional cache.ResultCache. Tasks with cached results are
+            not validated again and fresh results are added to it.
+        control: An optional RunControl used to pause or cancel the run.
+            A cancelled run stops yielding results; results which were
+            already yielded are unaffected.
+        scheduler: The scheduling policy name used to order the tasks. See
+            schedule().
+        stats: An optional RunStats which is updated as the run progresses,
+            including the stage timings of each document validated.
+
+    Yields:
+        A tuple containing a ValidationTask and its ValidationResults, or the
+        Exception that was raised while validating it.
+    """
+    scheduler = scheduler or settings.VALIDATION_SCHEDULER
+    tasks     = schedule(tasks, scheduler)
+    stats     = stats or RunStats()
+    hits      = store.hits if store else 0
+    counts    = cache.validator_counts()
+
+    stats.scheduler = scheduler
+    stats.processes = processes
+    stats.total     = len(tasks)
+    stats.started   = time.time()
+
+    preload()
+
+    if processes > 1:
+        gen = _run_pool(tasks, processes, store, control, stats)
+    else:
+        gen = _run_serial(tasks, started, store, control)
+
+    try:
+        for task, results, times in gen:
+            stats.completed += 1
+
+            if times is not None:
+                stats.timings.add(times, task.stix_version)
+                tracing.document(task, times)
+
+            if isinstance(results, Exception):
+                stats.errors += 1
+
+            if store:
+                stats.cached = store.hits - hits
+
+            yield task, results
+    except Cancelled:
+        LOG.info("Validation run cancelled.")
+        stats.cancelled = True
+    finally:
+        stats.add_validator_counts(cache.validator_counts(counts))
+        stats.finished = time.time()
@@ -6,9 +6,6 @@ This module contains custom Qt widgets and widget-related helper functions.
 import os
 import logging
 
-# stix-validator
-import sdv
-
 # PyQT
 from PyQt4 import QtGui, QtCore
 from PyQt4.QtCore import Qt
@@ -37,6 +34,26 @@ def center(widget):
     widget.move(xpos, ypos)
 
 
+class FirstPaintFilter(QtCore.QObject):
+    """An event filter which emits SIGNAL_PAINTED when the widget it is
+    installed on receives its first paint event, then removes itself.
+
+    Used to measure the time to first paint at startup.
+    """
+    SIGNAL_PAINTED = QtCore.pyqtSignal()
+
+    def __init__(self, widget):
+        super(FirstPaintFilter, self).__init__(widget)
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            obj.removeEventFilter(self)
+            self.SIGNAL_PAINTED.emit()
+
+        return False
+
+
 class XmlDropMixin(QtCore.QObject):
     """A pseudo-mixin class that contains the logic required for handling
     file drop events.
@@ -172,6 +189,7 @@ class AboutDialog(Ui_AboutDialog, QtGui.QDialog):
 
     def _populate(self):
         """Add the version information to the appropriate QLabels."""
+        import sdv
         self.txt_license_value.setText(LICENSE)
         self.label_api_version_value.setText(sdv.__version__)
         self.label_version_value.setText(version.__version__)
@@ -377,22 +395,62 @@ class ResultsWidget(Ui_ResultsWidget, QtGui.QWidget):
         parent: A QObject parent for this widget.
     """
 
+    # Milliseconds to wait after the last keystroke before filtering.
+    FILTER_DELAY = 150
+
     def __init__(self, model, parent=None):
         super(ResultsWidget, self).__init__(parent)
         self.setupUi(self)
+        self._init_filter()
         self._init_model(model)
         self._connect_signals()
 
+    def _init_filter(self):
+        """Add the results filter box below the file information.
+
+        The box is not part of the Designer layout, so it is built here.
+        """
+        self.label_filter = QtGui.QLabel("Filter:", self)
+        self.edit_filter = QtGui.QLineEdit(self)
+        self.edit_filter.setToolTip(
+            "Show rows whose message contains words starting with each term.\n"
+            "Use title:, tag:, id:, idref: or line: to match a column."
+        )
+
+        row = self.formLayout.rowCount()
+        self.formLayout.setWidget(row, QtGui.QFormLayout.LabelRole, self.label_filter)
+        self.formLayout.setWidget(row, QtGui.QFormLayout.FieldRole, self.edit_filter)
+
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(self.FILTER_DELAY)
+
     def _connect_signals(self):
         """Connect ui component signals.
 
         Every time the underlying table model is reset, we resize the columns
         to fit their contents.
+
+        Edits to the filter box are applied once the user stops typing.
         """
         table  = self.table_results
         model = table.source_model
         model.modelReset.connect(table.resize_columns)
 
+        self.edit_filter.textChanged.connect(self._handle_filter_changed)
+        self._filter_timer.timeout.connect(self._apply_filter)
+
+    @QtCore.pyqtSlot(str)
+    def _handle_filter_changed(self, text):
+        """Restart the filter delay each time the filter text changes."""
+        self._filter_timer.start()
+
+    @QtCore.pyqtSlot()
+    def _apply_filter(self):
+        """Filter the results table using the filter box text."""
+        query = unicode(self.edit_filter.text())
+        self.table_results.source_model.filter(query)
+
     def _init_model(self, model):
         """Sets the source model for this table view.
 
@@ -425,6 +483,9 @@ class ResultsWidget(Ui_ResultsWidget, QtGui.QWidget):
         table = self.table_results
         table.source_model.update(results)
 
+        if self.edit_filter.text():
+            self._apply_filter()
+
 
 class _TransformDialog(Ui_TransformDialog, QtGui.QDialog):
     """Abstract base class for a dialog that displays Schematron/XSLT
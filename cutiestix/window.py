@@ -11,11 +11,12 @@ from PyQt4 import QtGui, QtCore
 from PyQt4.QtCore import Qt
 
 # internal
+from . import cache
 from . import widgets
 from . import models
 from . import worker
+from . import tracing
 from . import settings
-from . import utils
 from .ui.window import Ui_MainWindow
 
 
@@ -33,6 +34,13 @@ INDEX_VIEW_FILES = 1
 # Used for Open/Save file dialogs
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Result type => table model class for its ResultsWidget tab
+RESULTS_MODELS = {
+    'xml': models.ValidationResultsTableModel,
+    'profile': models.ValidationResultsTableModel,
+    'best_practices': models.BestPracticeResultsTableModel
+}
+
 
 class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
     """The main window for the application.
@@ -46,9 +54,21 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
 
         # Dictionary of result types (xml, profile, ...) to QWidgets.
         # We use this for auto-selecting an already-open widget when a
-        # user requests validation results.
+        # user requests validation results. Tabs are created on first use
+        # by _results_tab().
         self._result_tabs = {}
 
+        # List of (QThread, IngestWorker) tuples for file ingestion tasks.
+        # We hold onto these so they don't get garbage collected while
+        # they're running.
+        self._ingests = []
+        self._ingests_running = 0
+
+        # Incremented when running ingestion tasks are cancelled. Batches
+        # which were queued by an earlier generation are dropped, so they
+        # cannot refill a table the user has just cleared.
+        self._ingest_generation = 0
+
         # Initialize all the ui components
         self._populate()
 
@@ -59,11 +79,6 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         """Initializes and populates ui components found in this window."""
         self.setupUi(self)
 
-        # Create the results tabs but don't show them yet.
-        self._result_tabs['xml'] = widgets.ResultsWidget(models.ValidationResultsTableModel)
-        self._result_tabs['profile'] = widgets.ResultsWidget(models.ValidationResultsTableModel)
-        self._result_tabs['best_practices'] = widgets.ResultsWidget(models.BestPracticeResultsTableModel)
-
         # Remove the unwanted, empty tab
         self.tab_widget.removeTab(1)
 
@@ -71,6 +86,19 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         self.status = QtGui.QLabel()
         self.statusBar().addPermanentWidget(self.status)
 
+        # Lets users stop adding files while directories are being scanned.
+        self.btn_stop_adding = QtGui.QPushButton("Stop Adding Files")
+        self.btn_stop_adding.setVisible(False)
+        self.statusBar().addPermanentWidget(self.btn_stop_adding)
+
+        # Pause/Resume and Cancel controls for validation runs.
+        self.btn_pause_validation = QtGui.QPushButton("Pause")
+        self.btn_pause_validation.setVisible(False)
+        self.statusBar().addPermanentWidget(self.btn_pause_validation)
+        self.btn_cancel_validation = QtGui.QPushButton("Cancel")
+        self.btn_cancel_validation.setVisible(False)
+        self.statusBar().addPermanentWidget(self.btn_cancel_validation)
+
         # Update the status bar and make sure we're on the right stacked
         # widget.
         self._handle_file_table_model_changed()
@@ -87,6 +115,9 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         # Buttons in the main window
         self.btn_validate.clicked.connect(self._handle_btn_validate_clicked)
         self.btn_clear.clicked.connect(self._handle_btn_clear_clicked)
+        self.btn_stop_adding.clicked.connect(self._cancel_ingests)
+        self.btn_pause_validation.clicked.connect(self._handle_btn_pause_validation_clicked)
+        self.btn_cancel_validation.clicked.connect(self._handle_btn_cancel_validation_clicked)
 
         # Main menu
         self.action_add_file.triggered.connect(self._handle_add_files)
@@ -121,6 +152,23 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         # Add Files landing screen.
         self.page_add_files.SIGNAL_FILES_ADDED.connect(self._add_files)
 
+    def _results_tab(self, name):
+        """Return the ResultsWidget for the result type `name`, creating it
+        the first time it is requested. The widget is not added to the tab
+        widget.
+
+        Args:
+            name: A RESULTS_MODELS key.
+        """
+        try:
+            return self._result_tabs[name]
+        except KeyError:
+            pass
+
+        tab = widgets.ResultsWidget(RESULTS_MODELS[name])
+        self._result_tabs[name] = tab
+        return tab
+
     def _remove_results_tabs(self):
         """Removes XML, Best Practices, and Profile results tabs from the
         main window.
@@ -162,21 +210,97 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
     def _add_files(self, files):
         """Add entries to the file table.
 
+        The files are scanned on a background thread and STIX documents are
+        added to the table in batches as they are found.
+
         Args:
             files: A single file or list of files to add. If any of the files
                 are directories, they will be traversed and all contained
                 STIX files will be collected.
         """
-        xmlfiles  = utils.list_xml_files(files)
-        stixdocs  = [f for f in xmlfiles if utils.is_stix(f)]
-        nonstix   = [f for f in xmlfiles if f not in stixdocs]
-        model     = self.table_files.source_model
+        # Let go of ingestion threads that have already finished.
+        self._ingests = [x for x in self._ingests if not x[0].isFinished()]
+
+        thread     = QtCore.QThread()
+        ingester   = worker.IngestWorker(files)
+        generation = self._ingest_generation
+
+        # Connect the QThread signals
+        thread.started.connect(ingester.scan)
+        thread.finished.connect(self._handle_ingest_complete)
+
+        # Connect the IngestWorker signals
+        ingester.SIGNAL_DISCOVERED.connect(
+            lambda docs: self._handle_files_discovered(docs, generation)
+        )
+        ingester.SIGNAL_PROGRESS.connect(self._handle_ingest_progress)
+        ingester.SIGNAL_EXCEPTION.connect(self._handle_ingest_exception)
+        ingester.SIGNAL_FINISHED.connect(thread.quit)
+
+        self._ingests.append((thread, ingester))
+        self._ingests_running += 1
+        self.btn_stop_adding.setVisible(True)
+
+        # Start the thread
+        ingester.moveToThread(thread)
+        thread.start()
+
+    def _handle_files_discovered(self, docs, generation):
+        """Add a batch of STIX documents found during ingestion to the file
+        table.
+
+        Args:
+            docs: A list of ingest.Document objects.
+            generation: The _ingest_generation of the ingestion task which
+                found them. Batches from cancelled tasks are ignored.
+        """
+        if generation != self._ingest_generation:
+            LOG.debug("Dropped %d files from a cancelled ingest", len(docs))
+            return
+
+        model = self.table_files.source_model
+
+        with tracing.span("add_many", "gui", rows=len(docs)):
+            model.add_many(docs)
+
+        LOG.debug("Added %d STIX files", len(docs))
+
+    @QtCore.pyqtSlot(int, int)
+    def _handle_ingest_progress(self, scanned, found):
+        """Update the status bar with the ingestion progress."""
+        msg = "Scanned {scanned} files, found {found} STIX documents..."
+        self.update_status(msg.format(scanned=scanned, found=found))
+
+    @QtCore.pyqtSlot(Exception)
+    def _handle_ingest_exception(self, ex):
+        """Report an error raised while scanning added files. Documents
+        found before the error are kept.
+        """
+        LOG.error("Error adding files: %s", str(ex))
+        QtGui.QMessageBox.warning(self, "Error Adding Files", str(ex))
+
+    @QtCore.pyqtSlot()
+    def _handle_ingest_complete(self):
+        """Hide the stop button and reset the status once every ingestion
+        thread has finished.
+        """
+        self._ingests_running -= 1
 
-        for file in stixdocs:
-            model.add(file)
+        if self._ingests_running > 0:
+            return
 
-        LOG.debug("Added STIX files: %s", stixdocs)
-        LOG.debug("Skipped non-STIX files: %s", nonstix)
+        self.btn_stop_adding.setVisible(False)
+        self._handle_file_table_model_changed()
+
+    @QtCore.pyqtSlot()
+    def _cancel_ingests(self):
+        """Stop every running ingestion task and drop the batches they have
+        already queued.
+        """
+        self._ingest_generation += 1
+
+        for _, ingester in self._ingests:
+            ingester.cancel()
 
     @QtCore.pyqtSlot()
     def _handle_add_files(self):
@@ -226,6 +350,7 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
             LOG.debug("User cancelled out of schema dir selection.")
         else:
             LOG.debug("User selected schema dir %s", schemadir)
+            cache.SCHEMAS.invalidate(settings.XML_SCHEMA_DIR)
             settings.XML_SCHEMA_DIR = str(schemadir)
             self.check_external_schemas.setEnabled(True)
             self.check_external_schemas.setChecked(True)
@@ -246,6 +371,7 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
             LOG.debug("User cancelled out of STIX Profile selection.")
         else:
             LOG.debug("User selected profile %s", profile)
+            cache.PROFILES.invalidate(settings.STIX_PROFILE_FILENAME)
             settings.STIX_PROFILE_FILENAME = str(profile)
             self.check_profile.setEnabled(True)
             self.check_profile.setChecked(True)
@@ -305,8 +431,26 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
 
     @QtCore.pyqtSlot(str, float)
     def _handle_validation_updated(self, itemid, progress):
-        """Update the progress bar when a table entry is finished validating."""
+        """Redraw the row for a table entry that has finished validating and
+        update the progress bar.
+        """
         LOG.debug("%s completed. Total progress: %f", itemid, progress)
+
+        with tracing.span("notify_updated", "gui"):
+            self.table_files.source_model.notify_updated(str(itemid))
+
+        self.progress_validation.setValue(int(progress*100))
+
+    @QtCore.pyqtSlot(list, float)
+    def _handle_validation_batch(self, itemids, progress):
+        """Redraw the rows for a batch of validated items and update the
+        progress bar.
+        """
+        model = self.table_files.source_model
+
+        with tracing.span("notify_updated_many", "gui", rows=len(itemids)):
+            model.notify_updated_many(itemids)
+
         self.progress_validation.setValue(int(progress*100))
 
     @QtCore.pyqtSlot()
@@ -315,20 +459,66 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         self.group_actions.setEnabled(False)
         self.group_options.setEnabled(False)
         self.progress_validation.setValue(0)
+        self.btn_pause_validation.setText("Pause")
+        self.btn_pause_validation.setVisible(True)
+        self.btn_cancel_validation.setVisible(True)
 
     @QtCore.pyqtSlot()
     def _handle_validation_complete(self):
         """Enable ui components when validation has completed."""
         LOG.debug("Validation completed.")
-        self.progress_validation.setValue(100)
-        self.update_status("Ready.")
+
+        # The notifier is parented to this window, so it must be deleted
+        # explicitly or every run would leave one behind.
+        if self.notifier:
+            self.notifier.stop()
+            self.notifier.deleteLater()
+            self.notifier = None
+
+        self.btn_pause_validation.setVisible(False)
+        self.btn_cancel_validation.setVisible(False)
         self.group_actions.setEnabled(True)
         self.group_options.setEnabled(True)
 
+        if not self.worker.cancelled:
+            self.progress_validation.setValue(100)
+
+        self.update_status(self.worker.stats.summary())
+
+        # Save the trace so far in case the application does not exit
+        # cleanly.
+        tracing.flush()
+
+    @QtCore.pyqtSlot()
+    def _handle_btn_pause_validation_clicked(self):
+        """Pause or resume the running validation."""
+        if self.worker.paused:
+            self.worker.resume()
+            self.btn_pause_validation.setText("Pause")
+            self.update_status("Resuming validation...")
+        else:
+            self.worker.pause()
+            self.btn_pause_validation.setText("Resume")
+            self.update_status("Validation paused.")
+
+    @QtCore.pyqtSlot()
+    def _handle_btn_cancel_validation_clicked(self):
+        """Cancel the running validation. Results for documents which have
+        already been validated are kept.
+        """
+        self.update_status("Cancelling validation...")
+        self.btn_pause_validation.setVisible(False)
+        self.worker.cancel()
+
     def _validate_files(self):
         """Create the validation thread and start it."""
         self.thread = QtCore.QThread()
-        self.worker = worker.ValidationWorker()
+        self.notifier = None
+
+        if settings.NOTIFY_INTERVAL:
+            self.notifier = worker.ValidationNotifier(parent=self)
+
+        self.worker = worker.ValidationWorker(notifier=self.notifier)
 
         # Add validation tasks to our worker
         model = self.table_files.source_model
@@ -344,6 +534,12 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         self.worker.SIGNAL_VALIDATED.connect(self._handle_validation_updated)
         self.worker.SIGNAL_FINISHED.connect(self.thread.quit)
 
+        # Connect the batched notification signals
+        if self.notifier:
+            self.notifier.SIGNAL_VALIDATING.connect(self._handle_validating)
+            self.notifier.SIGNAL_VALIDATED.connect(self._handle_validation_batch)
+            self.notifier.start()
+
         # Start the thread
         LOG.debug("Main executing in thread %d", QtCore.QThread.currentThreadId())
         self.worker.moveToThread(self.thread)
@@ -365,6 +561,7 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
     def _handle_btn_clear_clicked(self):
         """Handle "Clear" button clicks."""
         LOG.debug("handle_btn_clear_clicked()")
+        self._cancel_ingests()
         self.table_files.clear()
 
     def _populate_xml_results(self, item):
@@ -373,8 +570,10 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         Args:
             item: A ValidationTableItem from the main files table.
         """
-        tab = self._result_tabs.get('xml')
-        tab.set_results(item.filename, item.results.xml)
+        tab = self._results_tab('xml')
+
+        with tracing.span("set_results", "gui", tab="xml"):
+            tab.set_results(item.filename, item.results.xml)
 
         if self.tab_widget.indexOf(tab) == -1:
             self.tab_widget.addTab(tab, "XML Results")
@@ -403,8 +602,10 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         Args:
             item: A ValidationTableItem from the main files table.
         """
-        tab = self._result_tabs.get('profile')
-        tab.set_results(item.filename, item.results.profile)
+        tab = self._results_tab('profile')
+
+        with tracing.span("set_results", "gui", tab="profile"):
+            tab.set_results(item.filename, item.results.profile)
 
         if self.tab_widget.indexOf(tab) == -1:
             self.tab_widget.addTab(tab, "STIX Profile Results")
@@ -433,8 +634,10 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         Args:
             item: A ValidationTableItem from the main files table.
         """
-        tab = self._result_tabs.get('best_practices')
-        tab.set_results(item.filename, item.results.best_practices)
+        tab = self._results_tab('best_practices')
+
+        with tracing.span("set_results", "gui", tab="best_practices"):
+            tab.set_results(item.filename, item.results.best_practices)
 
         if self.tab_widget.indexOf(tab) == -1:
             self.tab_widget.addTab(tab, "Best Practices Results")
@@ -517,6 +720,19 @@ class MainWindow(Ui_MainWindow, QtGui.QMainWindow):
         filter = "Schematron (*.sch)"
         self._handle_transform(klass=widgets.SchematronTransformDialog, filter=filter)
 
+    def closeEvent(self, event):
+        """Stop any running ingestion or validation threads before closing."""
+        self._cancel_ingests()
+
+        for thread, _ in self._ingests:
+            thread.wait()
+
+        if getattr(self, "thread", None) and self.thread.isRunning():
+            self.worker.cancel()
+            self.thread.wait()
+
+        super(MainWindow, self).closeEvent(event)
+
     @QtCore.pyqtSlot()
     def update_status(self, msg):
         """Updates the status bar with the input `msg`.
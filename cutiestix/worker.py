@@ -18,22 +18,117 @@ via the `moveToThread()` method:
 
 # stdlib
 from __future__ import division
+import time
 import logging
+import threading
 
 # PyQt
 from PyQt4 import QtCore
 
-# stix-validator
-import sdv
-
 # internal
+from . import cache
+from . import ingest
+from . import reports
+from . import tracing
 from . import settings
-from . import models
+from . import validation
 
 
 LOG = logging.getLogger(__name__)
 
 
+class ValidationNotifier(QtCore.QObject):
+    """Coalesces per-document validation notifications from a
+    ValidationWorker into batches delivered at a bounded rate.
+
+    The worker thread push()es completed item keys, which are collected
+    under a lock. A QTimer owned by this object flushes them on the GUI
+    thread at most once per interval, so the GUI receives one queued event
+    per interval instead of several per document.
+
+    Note:
+        Create this object on the GUI thread and do not move it to the
+        worker thread.
+
+    Signals:
+        SIGNAL_VALIDATING (str): Emits the name of the most recently started
+            or completed document.
+        SIGNAL_VALIDATED (list, float): Emits the keys of the items completed
+            since the last flush and the overall progress.
+
+    Args:
+        interval: The flush interval in seconds. Defaults to
+            ``settings.NOTIFY_INTERVAL``.
+        parent: A QObject parent.
+    """
+
+    SIGNAL_VALIDATING = QtCore.pyqtSignal(str)
+    SIGNAL_VALIDATED  = QtCore.pyqtSignal(list, float)
+
+    def __init__(self, interval=None, parent=None):
+        super(ValidationNotifier, self).__init__(parent)
+        interval = interval or settings.NOTIFY_INTERVAL
+
+        self._lock = threading.Lock()
+        self._keys = []
+        self._pushed = None  # time.time() of the oldest pending key
+        self._progress = 0.0
+        self._filename = None
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(int(interval * 1000))
+        self._timer.timeout.connect(self.flush)
+
+    def start(self):
+        """Start flushing notifications."""
+        self._timer.start()
+
+    def stop(self):
+        """Stop the flush timer and deliver any pending notifications."""
+        self._timer.stop()
+        self.flush()
+
+    def started(self, filename):
+        """Record that validation of `filename` has started. This may be
+        called from any thread.
+        """
+        with self._lock:
+            self._filename = filename
+
+    def push(self, key, filename, progress):
+        """Record that the item with the key() `key` has been validated.
+        This may be called from any thread.
+        """
+        with self._lock:
+            if not self._keys:
+                self._pushed = time.time()
+
+            self._keys.append(key)
+            self._filename = filename
+            self._progress = progress
+
+    @QtCore.pyqtSlot()
+    def flush(self):
+        """Emit the notifications collected since the last flush."""
+        with self._lock:
+            keys, self._keys = self._keys, []
+            filename, self._filename = self._filename, None
+            progress = self._progress
+            pushed = self._pushed
+
+        if filename:
+            self.SIGNAL_VALIDATING.emit(filename)
+
+        if not keys:
+            return
+
+        # The lag is how long the oldest key waited to reach the GUI.
+        lag = (time.time() - pushed) * 1000.0
+
+        with tracing.span("flush", "gui", documents=len(keys), lag_ms=lag):
+            self.SIGNAL_VALIDATED.emit(keys, progress)
+
+
 class ValidationWorker(QtCore.QObject):
     """Performs XML, STIX Best Practices, and STIX Profile validation against
     a set of input files.
@@ -41,24 +136,66 @@ class ValidationWorker(QtCore.QObject):
     Signals:
         SIGNAL_VALIDATING (str): Emits the key() of the item that is currently
             being validated.
-        SIGNAL_VALIDATED (str): Emits the key() of an item that is done
-            validating.
+        SIGNAL_VALIDATED (str, float): Emits the key() of an item that is done
+            validating and the overall progress. The item's row in the
+            ValidateTableModel must be redrawn by the receiver.
         SIGNAL_FINISHED: Emitted when validation is completed for all items.
         SIGNAL_EXCEPTION (str): Emits an Exception string if an Exception
             has been raised during validation.
 
     Slots:
         validate: Runs the validation tasks. Connect QThread.started to this.
+
+    Args:
+        processes: The number of validation processes to use. If None,
+            ``settings.VALIDATION_PROCESSES`` is used.
+        notifier: An optional ValidationNotifier. If provided, progress is
+            reported through it in batches and the per-document signals are
+            not emitted.
+        parent: A QObject parent.
     """
 
     SIGNAL_VALIDATING  = QtCore.pyqtSignal(str)
-    SIGNAL_VALIDATED   = QtCore.pyqtSignal(int, float)
+    SIGNAL_VALIDATED   = QtCore.pyqtSignal(str, float)
     SIGNAL_FINISHED    = QtCore.pyqtSignal()
     SIGNAL_EXCEPTION   = QtCore.pyqtSignal(Exception)
 
-    def __init__(self, parent=None):
+    def __init__(self, processes=None, notifier=None, parent=None):
         super(ValidationWorker, self).__init__(parent)
         self._tasks = []
+        self._items = {}
+        self._processes = processes
+        self._notifier = notifier
+        self._control = validation.RunControl()
+
+        #: validation.RunStats for the most recent run.
+        self.stats = validation.RunStats()
+
+    def cancel(self):
+        """Cancel validation. Documents which have already been validated
+        keep their results.
+
+        This and the pause() and resume() methods are meant to be called
+        directly from the GUI thread since the worker thread is busy
+        validating and will not service queued slots.
+        """
+        self._control.cancel()
+
+    def pause(self):
+        """Pause validation before the next document or validation stage."""
+        self._control.pause()
+
+    def resume(self):
+        """Resume paused validation."""
+        self._control.resume()
+
+    @property
+    def cancelled(self):
+        return self._control.cancelled
+
+    @property
+    def paused(self):
+        return self._control.paused
 
     def add_tasks(self, tasks):
         """Add the validation "tasks" to the internal task collection.
@@ -66,52 +203,48 @@ class ValidationWorker(QtCore.QObject):
         Args:
             tasks: A list of ValidateTableItem objects from the main window table.
         """
-        self._tasks.extend(tasks)
+        for task in tasks:
+            self.add_task(task)
 
     def add_task(self, task):
         """Add a single validation task to the internal task collection.
 
+        The item's filename and validation options are captured now, on the
+        calling thread, so rows may be read from the table model safely.
+
         Args:
             task: A single ValidateTableItem from the main window table.
         """
-        self._tasks.append(task)
-
-    def _validate_item(self, item):
-        """Perform validation for the  ValidateTableItem `item`.
-
-        The `item` specifies the input filename and what forms of validation
-        are to be run against that file.
+        self._items[task.key()] = task
+        self._tasks.append(validation.ValidationTask.from_item(task))
 
-        Returns:
-            A model ValidationResults object.
+    def _result_cache(self):
+        """Return a ResultCache if result caching is enabled, otherwise
+        None.
         """
-        fn      = item.filename
-        version = item.stix_version
-        schemas = None
-        profile = settings.STIX_PROFILE_FILENAME
-        result  = models.ValidationResults()
-
-        if settings.VALIDATE_EXTERNAL_SCHEMAS:
-            schemas = settings.XML_SCHEMA_DIR
-
-        # Always run XML validation
-        LOG.debug("Validating %s using schema dir %s", fn, schemas)
-        result.xml = sdv.validate_xml(doc=fn, schemas=schemas, version=version)
+        if not settings.RESULT_CACHE:
+            return None
 
-        # If the file was XML invalid, don't bother running the other
-        # validation scenarios.
-        if not result.xml.is_valid:
-            return result
-
-        if item.validate_stix_profile:
-            LOG.debug("Running profile validation for %s using profile %s", fn, profile)
-            result.profile = sdv.validate_profile(doc=fn, profile=profile)
+        try:
+            return cache.ResultCache().open()
+        except cache.DATABASE_ERRORS as ex:
+            LOG.warn("Result cache unavailable: %s", str(ex))
+            return None
+
+    def _report(self):
+        """Return a (stream, ReportWriter) tuple if a report file is
+        configured, otherwise (None, None).
+        """
+        if not settings.REPORT_FILENAME:
+            return None, None
 
-        if item.validate_best_practices:
-            LOG.debug("Running best practice validation for %s", fn)
-            result.best_practices = sdv.validate_best_practices(doc=fn, version=version)
+        try:
+            stream = open(settings.REPORT_FILENAME, "w")
+        except IOError as ex:
+            LOG.warn("Cannot write report: %s", str(ex))
+            return None, None
 
-        return result
+        return stream, reports.get_writer(settings.REPORT_FORMAT, stream)
 
     @QtCore.pyqtSlot()
     def validate(self):
@@ -119,6 +252,19 @@ class ValidationWorker(QtCore.QObject):
 
         Connect the QThread.started signal to this slot!
 
+        If more than one validation process is configured, the tasks are
+        fanned out to a pool of worker processes and SIGNAL_VALIDATING is
+        emitted as each result is received rather than when the task starts.
+
+        Tasks with results in the result cache are not validated again.
+
+        If ``settings.REPORT_FILENAME`` is set, each result is also written to
+        that file as it is received.
+
+        Validation can be paused, resumed or cancelled from another thread.
+        If it is cancelled, or if the run fails, SIGNAL_FINISHED is emitted
+        without results for the documents which had not been validated yet.
+
         Emits:
             SIGNAL_VALIDATING (str): When a validation task has started.
             SIGNAL_VALIDATED (str, float): When a validation task has completed.
@@ -127,24 +273,142 @@ class ValidationWorker(QtCore.QObject):
         """
         LOG.debug("Validating %d docuemnts", len(self._tasks))
         LOG.debug("Worker executing in thread %d", QtCore.QThread.currentThreadId())
-        total = len(self._tasks)
-
-        for idx, item in enumerate(self._tasks, start=1):
-            LOG.debug("Running task %s", id(item))
-            self.SIGNAL_VALIDATING.emit(item.filename)
+        total     = len(self._tasks)
+        items     = self._items
+        tasks     = self._tasks
+        processes = validation.process_count(self._processes)
+        store     = self._result_cache()
+        notifier  = self._notifier
+        stream, report = self._report()
+
+        def started(task):
+            LOG.debug("Running task %s", task.key)
+            filename = task.filename
+
+            if notifier:
+                notifier.started(filename)
+            else:
+                self.SIGNAL_VALIDATING.emit(filename)
+
+        if processes > 1:
+            LOG.debug("Validating with %d processes", processes)
+
+        results = validation.run(
+            tasks,
+            processes=processes,
+            started=started,
+            store=store,
+            control=self._control,
+            stats=self.stats
+        )
 
+        with tracing.span("validate", "worker", documents=total):
             try:
-                item.results = self._validate_item(item)
+                for idx, (task, result) in enumerate(results, start=1):
+                    item = items[task.key]
+
+                    if isinstance(result, Exception):
+                        LOG.warn("Error during validation: %s", str(result))
+                        self.SIGNAL_EXCEPTION.emit(result)
+
+                    item.results = result
+
+                    if report:
+                        report.write(task, result)
+
+                    if notifier:
+                        notifier.push(task.key, task.filename, (idx / total))
+                        continue
+
+                    if processes > 1:
+                        self.SIGNAL_VALIDATING.emit(task.filename)
+
+                    self.SIGNAL_VALIDATED.emit(task.key, (idx / total))
             except Exception as ex:
-                LOG.warn("Error during validation: %s", str(ex))
+                LOG.error("Validation run failed: %s", str(ex))
                 self.SIGNAL_EXCEPTION.emit(ex)
-                item.results = ex
             finally:
-                item.notify()
-                self.SIGNAL_VALIDATED.emit(item.key(), (idx / total))
+                if store:
+                    LOG.debug("Result cache stats: %s", store.stats())
+                    store.close()
+
+                if report:
+                    report.close()
+                    stream.close()
+
+                LOG.info(self.stats.summary())
+                LOG.info(self.stats.timings.summary())
+                LOG.debug("Validator cache stats: %s", self.stats.validators)
+                LOG.debug("validate() done!")
+                self.SIGNAL_FINISHED.emit()
+
+
+class IngestWorker(QtCore.QObject):
+    """Finds the STIX documents in a set of files and directories.
+
+    Directory walking and file sniffing happen on the worker's thread and a
+    pool of sniffing threads, so the GUI thread only has to insert the
+    discovered documents into its model.
+
+    Signals:
+        SIGNAL_DISCOVERED (list): Emits a batch of ingest.Document objects.
+        SIGNAL_PROGRESS (int, int): Emits the number of XML files examined
+            and the number of STIX documents found so far.
+        SIGNAL_FINISHED: Emitted when scanning has completed or has been
+            cancelled.
+        SIGNAL_EXCEPTION (Exception): Emitted if an Exception has been raised
+            while scanning.
+
+    Slots:
+        scan: Scans the files. Connect QThread.started to this.
+
+    Args:
+        files: A filename, dirname, or list of filenames/dirnames.
+        parent: A QObject parent.
+    """
+
+    SIGNAL_DISCOVERED = QtCore.pyqtSignal(list)
+    SIGNAL_PROGRESS   = QtCore.pyqtSignal(int, int)
+    SIGNAL_FINISHED   = QtCore.pyqtSignal()
+    SIGNAL_EXCEPTION  = QtCore.pyqtSignal(Exception)
+
+    def __init__(self, files, parent=None):
+        super(IngestWorker, self).__init__(parent)
+        self._files = files
+        self._scanner = ingest.Scanner()
+
+    def cancel(self):
+        """Stop scanning.
+
+        This is meant to be called directly from the GUI thread since the
+        worker thread is busy scanning and will not service queued slots.
+        """
+        self._scanner.cancel()
+
+    @QtCore.pyqtSlot()
+    def scan(self):
+        """Scan the files and emit the STIX documents found in batches.
+
+        Emits:
+            SIGNAL_DISCOVERED (list): When a batch of documents is found.
+            SIGNAL_PROGRESS (int, int): After each batch.
+            SIGNAL_EXCEPTION (Exception): If an error occurs while scanning.
+            SIGNAL_FINISHED: When scanning has completed.
+        """
+        scanner = self._scanner
 
-        LOG.debug("validate() done!")
-        self.SIGNAL_FINISHED.emit()
+        try:
+            for batch in scanner.scan(self._files):
+                if batch:
+                    self.SIGNAL_DISCOVERED.emit(batch)
+                self.SIGNAL_PROGRESS.emit(scanner.scanned, scanner.found)
+        except Exception as ex:
+            LOG.warn("Error while scanning files: %s", str(ex))
+            self.SIGNAL_EXCEPTION.emit(ex)
+        finally:
+            LOG.debug("Scanned %d files, found %d STIX documents",
+                      scanner.scanned, scanner.found)
+            self.SIGNAL_FINISHED.emit()
 
 
 class TransformWorker(QtCore.QObject):
@@ -195,6 +459,7 @@ class TransformWorker(QtCore.QObject):
             SIGNAL_FINISHED: When the transformation has completed.
         """
         try:
+            import sdv
             schematron = sdv.profile_to_schematron(self._profile)
             self._write_out(schematron)
         except Exception as ex:
@@ -211,6 +476,7 @@ class TransformWorker(QtCore.QObject):
             SIGNAL_FINISHED: When the transformation has completed.
         """
         try:
+            import sdv
             xslt = sdv.profile_to_xslt(self._profile)
             self._write_out(xslt)
         except Exception as ex:
@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+"""Validate STIX documents from the command line without starting the GUI."""
+
+# stdlib
+import sys
+
+# internal
+from cutiestix import cli
+
+
+if __name__ == '__main__':
+    sys.exit(cli.main())
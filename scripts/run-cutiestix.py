@@ -4,13 +4,16 @@
 import sys
 import logging
 import argparse
-
-# external
-from PyQt4 import QtGui
+import multiprocessing
 
 # internal
+# PyQt4 and the main window are imported by main() so --import-times can
+# time them. startup is imported first so its clock starts as early as
+# possible.
+from cutiestix import startup
 from cutiestix import version
-from cutiestix import window
+from cutiestix import tracing
+from cutiestix import settings
 
 
 # Module-level logger
@@ -28,6 +31,20 @@ def _get_argparser():
     desc = "cutiestix v%s" % (version.__version__)
     parser = argparse.ArgumentParser(description=desc)
 
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=settings.TRACE_FILENAME,
+        help="Write a Trace Event Format timeline of validation runs to FILE."
+    )
+
+    parser.add_argument(
+        "--import-times",
+        action="store_true",
+        help="Print module import times and startup milestones to stderr "
+             "once the main window has been painted."
+    )
+
     parser.add_argument(
         "--log-level",
         default="INFO",
@@ -38,7 +55,19 @@ def _get_argparser():
     return parser
 
 
+def _report_startup(timer):
+    """Mark the first paint and write the startup.ImportTimer `timer`
+    report and the startup milestones to stderr.
+    """
+    startup.mark("first paint")
+    timer.uninstall()
+    sys.stderr.write(timer.report() + "\n\n" + startup.report() + "\n")
+
+
 def main():
+    # Required for validation worker processes in frozen Windows builds.
+    multiprocessing.freeze_support()
+
     # Parse the commandline args
     parser = _get_argparser()
     args = parser.parse_args()
@@ -46,14 +75,39 @@ def main():
     # Initialize logging
     init_logging(args.log_level)
 
+    # Start tracing if requested
+    settings.TRACE_FILENAME = args.trace
+
+    if settings.TRACE_FILENAME:
+        tracing.start(settings.TRACE_FILENAME)
+
+    # Time the GUI imports if requested
+    timer = startup.ImportTimer() if args.import_times else None
+
+    if timer is not None:
+        timer.install()
+
+    from PyQt4 import QtGui
+    from cutiestix import window
+    from cutiestix import widgets
+    startup.mark("imports")
+
     # Launch the UI
     LOG.debug("Launching ui")
     app = QtGui.QApplication(sys.argv)
     mainwindow = window.MainWindow()
+    startup.mark("window")
+
+    if timer is not None:
+        painted = widgets.FirstPaintFilter(mainwindow)
+        painted.SIGNAL_PAINTED.connect(lambda: _report_startup(timer))
+
     mainwindow.show()
 
     # Wait for it to exit.
-    sys.exit(app.exec_())
+    status = app.exec_()
+    tracing.stop()
+    sys.exit(status)
 
 
 if __name__ == '__main__':
@@ -44,7 +44,7 @@ setuptools.setup(
     url='https://github.com/bworrell',
     version=get_version(),
     packages=setuptools.find_packages(),
-    scripts=['scripts/run-cutiestix.py'],
+    scripts=['scripts/run-cutiestix.py', 'scripts/cutiestix-validate.py'],
     include_package_data=True,
     install_requires=install_requires,
     extras_require=extras_require,